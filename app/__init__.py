@@ -17,6 +17,18 @@ login_manager = LoginManager()
 
 from app.main.helpers.services import parse_document_upload_time
 from app.main.helpers.frameworks import question_references
+from app.main.helpers.users import init_user_loader
+from app.assets import init_static_assets
+from app.audit import init_audit
+from app.compression import init_compression
+from app.metrics import init_metrics
+from app.outbox import init_outbox
+from app.profiling import init_profiling
+from app.sessions import init_sessions
+from app.status.probes import init_status_prober
+from app.templating import (
+    init_bytecode_cache, init_fragment_cache, init_precompiled_templates, warm_up_templates
+)
 
 
 def create_app(config_name):
@@ -31,6 +43,9 @@ def create_app(config_name):
         data_api_client=data_api_client,
         login_manager=login_manager,
     )
+    init_sessions(application)
+    init_bytecode_cache(application)
+    init_fragment_cache(application)
 
     from .main import main as main_blueprint
     from .status import status as status_blueprint
@@ -47,6 +62,15 @@ def create_app(config_name):
     application.add_template_filter(parse_document_upload_time)
 
     init_frontend_app(application, data_api_client, login_manager)
+    init_user_loader(login_manager, data_api_client)
+    init_precompiled_templates(application)
+    init_static_assets(application)
+    init_compression(application)
+    init_outbox(application)
+    init_audit(application, data_api_client)
+    init_status_prober(application)
+    init_metrics(application, data_api_client)
+    init_profiling(application)
 
     @application.before_request
     def check_csrf_token():
@@ -60,4 +84,7 @@ def create_app(config_name):
             'generic_contact_email': application.config['GENERIC_CONTACT_EMAIL'],
         }
 
+    if application.config['DM_TEMPLATE_WARM_UP']:
+        warm_up_templates(application)
+
     return application
@@ -0,0 +1,194 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from flask import abort, current_app, request, send_file
+from flask.helpers import safe_join
+from flask_script import Manager
+
+
+# Static files are precompressed and given content-hashed names at build time:
+# $ python application.py assets compress
+#
+# Every file under app/static gets a copy named after its content (stylesheets/application-<hash>.css)
+# and, for text files, .gz (and, if the brotli package is installed, .br) siblings. manifest.json maps
+# each original path to its hashed name. When the manifest exists, pages link to the hashed names,
+# which are served with far-future immutable cache headers, and the smallest encoding the browser
+# accepts is streamed from disk.
+
+MANIFEST_FILENAME = 'manifest.json'
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.map', '.txt', '.html')
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+ENCODED_SUFFIXES = tuple(suffix for _, suffix in ENCODINGS)
+HASH_LENGTH = 12
+
+
+class HashedAssets(object):
+    """Replaces dmutils' asset_fingerprinter in templates with links to the content-hashed files."""
+    def __init__(self, asset_root, manifest):
+        self.asset_root = asset_root
+        self.manifest = manifest
+        self.hashed = set(manifest.values())
+
+    def get_url(self, asset_path):
+        return self.asset_root + self.manifest.get(asset_path, asset_path)
+
+
+def hashed_name(path, digest):
+    root, ext = os.path.splitext(path)
+    return '{}-{}{}'.format(root, digest[:HASH_LENGTH], ext)
+
+
+def _file_digest(path):
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _gzip(source, target):
+    with open(source, 'rb') as f_in:
+        f_out = gzip.GzipFile(target, 'wb', compresslevel=9, mtime=0)
+        try:
+            shutil.copyfileobj(f_in, f_out)
+        finally:
+            f_out.close()
+
+
+def _brotli(source, target):
+    with open(source, 'rb') as f_in, open(target, 'wb') as f_out:
+        f_out.write(brotli.compress(f_in.read()))
+
+
+def _compressors():
+    compressors = [('.gz', _gzip)]
+    if brotli is not None:
+        compressors.insert(0, ('.br', _brotli))
+    return compressors
+
+
+def _compress(path):
+    """Writes the compressed siblings of `path`, keeping only those smaller than the original."""
+    for suffix, compressor in _compressors():
+        compressor(path, path + suffix)
+        if os.path.getsize(path + suffix) >= os.path.getsize(path):
+            os.remove(path + suffix)
+
+
+def _load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, MANIFEST_FILENAME)) as f:
+            return json.load(f)
+    except IOError:
+        return None
+
+
+def _source_files(static_folder, previous_manifest):
+    generated = set(previous_manifest.values()) if previous_manifest else set()
+    for dirpath, dirnames, filenames in os.walk(static_folder):
+        for filename in filenames:
+            path = os.path.relpath(os.path.join(dirpath, filename), static_folder).replace(os.sep, '/')
+            if path == MANIFEST_FILENAME or path in generated or path.endswith(ENCODED_SUFFIXES):
+                continue
+            yield path
+
+
+def build_assets(static_folder):
+    """Writes hashed copies, compressed siblings and the manifest for the files in `static_folder`."""
+    manifest = {}
+    for path in sorted(_source_files(static_folder, _load_manifest(static_folder))):
+        source = os.path.join(static_folder, path)
+        manifest[path] = hashed_name(path, _file_digest(source))
+        target = os.path.join(static_folder, manifest[path])
+        shutil.copyfile(source, target)
+
+        if path.endswith(COMPRESSIBLE_EXTENSIONS):
+            _compress(source)
+            for suffix in ENCODED_SUFFIXES:
+                if os.path.exists(source + suffix):
+                    shutil.copyfile(source + suffix, target + suffix)
+
+    with open(os.path.join(static_folder, MANIFEST_FILENAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    return manifest
+
+
+def send_static_asset(filename):
+    path = safe_join(current_app.static_folder, filename)
+    if not os.path.isfile(path):
+        abort(404)
+
+    encoding = None
+    for name, suffix in ENCODINGS:
+        if request.accept_encodings[name] and os.path.isfile(path + suffix):
+            encoding, path = name, path + suffix
+            break
+
+    assets = current_app.extensions.get('hashed_assets')
+    immutable = assets is not None and filename in assets.hashed
+    max_age = current_app.config['DM_STATIC_IMMUTABLE_MAX_AGE'] if immutable else \
+        current_app.get_send_file_max_age(filename)
+
+    # send_file streams the file from disk, it is never read into memory as a whole
+    response = send_file(
+        path,
+        mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+        conditional=True,
+        cache_timeout=max_age
+    )
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    if immutable:
+        response.headers['Cache-Control'] = 'public, max-age={}, immutable'.format(max_age)
+
+    return response
+
+
+def init_static_assets(app):
+    """Serves static files through `send_static_asset`, linking to hashed names if the manifest was built."""
+    app.view_functions['static'] = send_static_asset
+
+    manifest = _load_manifest(app.static_folder)
+    if manifest is None:
+        return
+
+    assets = HashedAssets(app.static_url_path + '/', manifest)
+    app.extensions['hashed_assets'] = assets
+
+    @app.context_processor
+    def inject_hashed_assets():
+        return {'asset_fingerprinter': assets}
+
+
+def compress():
+    """Build hashed copies and .gz/.br siblings of the static files, and the manifest that maps them."""
+    manifest = build_assets(current_app.static_folder)
+    current_app.logger.info(
+        'Built {count} static assets in {folder}',
+        extra={'count': len(manifest), 'folder': current_app.static_folder}
+    )
+
+
+def init_manager(manager):
+    """Adds static asset management commands to the Flask Script manager.
+
+    These can be run from the command line.
+    """
+    sub_manager = Manager(
+        description='Commands for managing static assets',
+        usage='Run "python application.py assets -?" to see subcommand list'
+    )
+
+    sub_manager.command(compress)
+    manager.add_command('assets', sub_manager)
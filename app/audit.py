@@ -0,0 +1,265 @@
+import atexit
+import collections
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import six
+from flask import current_app
+
+from dmapiclient import APIError
+from dmapiclient.audit import AuditTypes
+
+from app.workers import Worker, WorkerHandle
+
+
+# Audit events are queued in memory and sent to the Data API by a background thread, so requests that record one
+# don't wait for the API. The thread sends whatever is queued as soon as it starts, then every DM_AUDIT_POLL_INTERVAL
+# seconds or when an event is queued.
+#
+# Events about the same object are sent in the order they were created: if one fails, later events about that
+# object wait for it to be retried. Events that still fail after DM_AUDIT_MAX_ATTEMPTS are logged and dropped.
+#
+# Up to DM_AUDIT_BUFFER_SIZE events are kept in memory. Once that is full, events are appended to the spill file at
+# DM_AUDIT_SPILL_PATH, and sent from there once the memory buffer has emptied. Events still queued when the process
+# exits are written to the spill file too, and sent when the app next starts. Without a spill file,
+# DM_AUDIT_OVERFLOW decides what happens to events that don't fit: 'inline' sends them during the request, and
+# 'drop' logs and drops them, so no more than DM_AUDIT_BUFFER_SIZE events are ever lost. Processes can share a spill
+# file.
+#
+# With DM_AUDIT_ASYNC off, events are sent during the request as before.
+
+
+def _encode(event):
+    return dict(event, audit_type=event['audit_type'].value)
+
+
+def _decode(event):
+    return dict(event, audit_type=AuditTypes(event['audit_type']))
+
+
+class AuditSink(object):
+
+    def __init__(self, api_client, logger, buffer_size=1000, batch_size=50, spill_path=None, overflow='inline',
+                 max_attempts=5, retry_delay=10, timer=time.time):
+        self._api_client = api_client
+        self._logger = logger
+        self._buffer_size = buffer_size
+        self._batch_size = batch_size
+        self._spill_path = spill_path
+        self._overflow = overflow
+        self._max_attempts = max_attempts
+        self._retry_delay = retry_delay
+        self._timer = timer
+
+        self._entries = collections.deque()
+        self._lock = threading.Lock()
+        self.dropped = 0
+        self.wake = threading.Event()
+
+    def put(self, event):
+        """Queues an audit event, with the same arguments as `DataAPIClient.create_audit_event`."""
+        entry = {'event': _encode(event), 'attempts': 0, 'retry_at': 0}
+        with self._lock:
+            # Once events have been spilled, newer ones go after them
+            if len(self._entries) < self._buffer_size and not self._spilled():
+                self._entries.append(entry)
+                queued = True
+            else:
+                queued = self._spill([entry])
+
+        if queued:
+            self.wake.set()
+        elif self._overflow == 'inline':
+            self._api_client.create_audit_event(**event)
+        else:
+            self._drop(entry, 'audit queue is full')
+
+    def _drop(self, entry, reason):
+        self.dropped += 1
+        self._logger.error(
+            'Audit event dropped: {reason}, audit_type: {audit_type}, object_id: {object_id}',
+            extra={
+                'reason': reason,
+                'audit_type': entry['event']['audit_type'],
+                'object_id': entry['event'].get('object_id'),
+            }
+        )
+
+    def _spilled(self):
+        return bool(self._spill_path) and os.path.exists(self._spill_path) and os.path.getsize(self._spill_path) > 0
+
+    @contextmanager
+    def _spill_file_lock(self):
+        with open(self._spill_path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_spill_file(self):
+        if not os.path.exists(self._spill_path):
+            return []
+        with open(self._spill_path) as spill_file:
+            return [line for line in spill_file if line.strip()]
+
+    def _write_spill_file(self, lines):
+        temporary_path = self._spill_path + '.tmp'
+        with open(temporary_path, 'w') as spill_file:
+            spill_file.writelines(lines)
+            spill_file.flush()
+            os.fsync(spill_file.fileno())
+        os.rename(temporary_path, self._spill_path)
+
+    def _spill(self, entries, before=False):
+        """Writes entries to the spill file, after what is already there unless `before` is set."""
+        if not self._spill_path:
+            return False
+
+        lines = [json.dumps(entry) + '\n' for entry in entries]
+        try:
+            with self._spill_file_lock():
+                if before:
+                    self._write_spill_file(lines + self._read_spill_file())
+                else:
+                    with open(self._spill_path, 'a') as spill_file:
+                        spill_file.writelines(lines)
+                        spill_file.flush()
+                        os.fsync(spill_file.fileno())
+        except (IOError, OSError):
+            self._logger.exception('Could not write to audit spill file')
+            return False
+
+        return True
+
+    def _unspill(self):
+        """Moves as many spilled events as fit into the memory buffer."""
+        with self._spill_file_lock():
+            lines = self._read_spill_file()
+            if lines:
+                self._write_spill_file(lines[self._buffer_size:])
+
+        self._entries.extend(json.loads(line) for line in lines[:self._buffer_size])
+
+    def flush(self):
+        """Sends up to `batch_size` queued events. Returns the number sent."""
+        with self._lock:
+            if not self._entries and self._spilled():
+                self._unspill()
+            batch = [self._entries.popleft() for _ in range(min(self._batch_size, len(self._entries)))]
+
+        now = self._timer()
+        held_objects = set()
+        held = []
+        sent = 0
+        remaining = collections.deque(batch)
+        try:
+            while remaining:
+                entry = remaining[0]
+                event = entry['event']
+                object_key = (event.get('object_type'), event.get('object_id'))
+                if object_key in held_objects or entry['retry_at'] > now:
+                    held_objects.add(object_key)
+                    held.append(remaining.popleft())
+                    continue
+
+                try:
+                    self._api_client.create_audit_event(**_decode(event))
+                    remaining.popleft()
+                    sent += 1
+                except Exception as e:
+                    # Every failure counts as an attempt, so an event that can never be sent is eventually dropped
+                    remaining.popleft()
+                    entry['attempts'] += 1
+                    if entry['attempts'] >= self._max_attempts:
+                        self._drop(entry, six.text_type(e) if isinstance(e, APIError) else repr(e))
+                        continue
+                    entry['retry_at'] = now + self._retry_delay * 2 ** (entry['attempts'] - 1)
+                    held_objects.add(object_key)
+                    held.append(entry)
+        finally:
+            # Events not sent, including any left when something else interrupts the batch, go back to the front
+            with self._lock:
+                self._entries.extendleft(reversed(held + list(remaining)))
+
+        return sent
+
+    def close(self):
+        """Writes queued events to the spill file, or sends what it can without a spill file."""
+        with self._lock:
+            entries = list(self._entries)
+            if entries and self._spill(entries, before=True):
+                self._entries.clear()
+                return
+
+        while self.flush():
+            pass
+
+
+class AuditWorker(Worker):
+    """Sends queued events every DM_AUDIT_POLL_INTERVAL seconds, or as soon as one is queued."""
+    error_message = 'Sending audit events failed'
+
+    def __init__(self, app, sink):
+        super(AuditWorker, self).__init__(app, 'audit-events', app.config['DM_AUDIT_POLL_INTERVAL'], wake=sink.wake)
+        self.sink = sink
+
+    def work(self):
+        while self.sink.flush():
+            pass
+
+
+class _AuditState(object):
+    def __init__(self, app, sink):
+        self.sink = sink
+        self.worker = WorkerHandle(lambda: AuditWorker(app, sink))
+
+
+def start_worker(app):
+    state = app.extensions.get('audit_events')
+    if state is None:
+        return None
+
+    return state.worker.start()
+
+
+def create_audit_event(api_client, **event):
+    """
+    Queues an audit event, with the same arguments as `api_client.create_audit_event`.
+
+    If audit events aren't queued the event is sent with `api_client` straight away.
+    """
+    app = current_app._get_current_object()
+    state = app.extensions.get('audit_events')
+    if state is None:
+        return api_client.create_audit_event(**event)
+
+    state.sink.put(event)
+    start_worker(app)
+
+
+def init_audit(app, api_client):
+    if not app.config['DM_AUDIT_ASYNC']:
+        return
+
+    sink = AuditSink(
+        api_client,
+        app.logger,
+        buffer_size=app.config['DM_AUDIT_BUFFER_SIZE'],
+        batch_size=app.config['DM_AUDIT_BATCH_SIZE'],
+        spill_path=app.config['DM_AUDIT_SPILL_PATH'],
+        overflow=app.config['DM_AUDIT_OVERFLOW'],
+        max_attempts=app.config['DM_AUDIT_MAX_ATTEMPTS'],
+        retry_delay=app.config['DM_AUDIT_RETRY_DELAY'],
+    )
+    app.extensions['audit_events'] = _AuditState(app, sink)
+    atexit.register(sink.close)
+
+    @app.before_first_request
+    def start_audit_worker():
+        # Sends events spilled by a previous process
+        start_worker(app)
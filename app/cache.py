@@ -0,0 +1,60 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache(object):
+    """
+    A thread-safe, size-bounded cache whose entries expire.
+
+    The least recently used entry is evicted once `maxsize` entries are stored. Entries expire `ttl`
+    seconds after they were set (unless a different ttl is given to `set`); a ttl of None never expires.
+    """
+    def __init__(self, maxsize, ttl=None, timer=time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key, _missing) is not _missing
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or (entry[1] is not None and entry[1] <= self._timer()):
+                self.misses += 1
+                return default
+
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        if self.maxsize <= 0:
+            return
+
+        ttl = self.ttl if ttl is None else ttl
+        expires = self._timer() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries.pop(key, None)
+            while len(self._entries) >= self.maxsize:
+                self._entries.popitem(last=False)
+            self._entries[key] = (value, expires)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_missing = object()
@@ -0,0 +1,75 @@
+import zlib
+
+from flask import request
+
+
+# Responses are gzipped when the browser accepts it and the response is:
+# - of a content type in DM_COMPRESS_MIMETYPES
+# - at least DM_COMPRESS_MIN_SIZE bytes, or streamed
+# - not already encoded (for example precompressed static files) or sent straight from a file
+#
+# Streamed pages are compressed chunk by chunk, flushing after each one, so they still arrive as they render.
+
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def _compressor(level):
+    return zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+
+
+def _compress_stream(chunks, level):
+    compressor = _compressor(level)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if compressed:
+            yield compressed
+
+    yield compressor.flush()
+
+
+def compress(data, level):
+    compressor = _compressor(level)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _should_compress(app, response):
+    if not app.config['DM_COMPRESS_RESPONSES'] or not request.accept_encodings['gzip']:
+        return False
+    if response.status_code < 200 or response.status_code in (204, 304):
+        return False
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return False
+    if response.mimetype not in app.config['DM_COMPRESS_MIMETYPES']:
+        return False
+
+    return response.is_streamed or response.calculate_content_length() >= app.config['DM_COMPRESS_MIN_SIZE']
+
+
+def compress_response(app, response):
+    # The body depends on Accept-Encoding whether or not it ends up compressed
+    if response.mimetype in app.config['DM_COMPRESS_MIMETYPES']:
+        response.vary.add('Accept-Encoding')
+
+    if not _should_compress(app, response):
+        return response
+
+    level = app.config['DM_COMPRESS_LEVEL']
+    if response.is_streamed:
+        response.response = _compress_stream(response.iter_encoded(), level)
+        response.headers.pop('Content-Length', None)
+    else:
+        response.set_data(compress(response.get_data(), level))
+
+    response.headers['Content-Encoding'] = 'gzip'
+    # The compressed body is a different representation, so a strong ETag no longer applies to it
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+    return response
+
+
+def init_compression(app):
+    @app.after_request
+    def compress_after_request(response):
+        return compress_response(app, response)
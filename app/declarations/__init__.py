@@ -0,0 +1,169 @@
+import json
+import logging
+import multiprocessing
+import sys
+from itertools import islice
+
+from flask_script import Manager
+
+from dmapiclient import APIError
+
+from app import data_api_client
+from app.main import content_loader
+from app.main.helpers.validation import get_validator
+
+
+# Re-validates every supplier declaration for a framework against VALIDATORS, outside the web request flow.
+# Run this when a framework closes to find declarations whose stored status does not match their answers.
+#
+# Declarations are either fetched from the API:
+# $ python application.py declarations validate g-cloud-8 > /tmp/declaration-report.jsonl
+#
+# or read from a JSONL export with one {"supplierCode": ..., "declaration": {...}} object per line:
+# $ python application.py declarations validate g-cloud-8 --source=/tmp/declarations.jsonl
+#
+# The report is written as it goes, one JSON object per line for each supplier whose declaration has
+# errors or an inconsistent status.  Work is spread over a process pool and handed out a batch at a time,
+# so memory use does not depend on the number of declarations.
+#
+# Run this for more docs:
+# $ python application.py declarations -?
+
+_worker_state = {}
+
+
+def _init_worker(framework_slug):
+    _worker_state['framework'] = {'slug': framework_slug}
+    _worker_state['content'] = content_loader.get_manifest(framework_slug, 'declaration')
+
+
+def validate_declaration(framework, content, supplier_code, declaration):
+    """Validate a single declaration.
+
+    Returns a report entry if the declaration has errors or its status is inconsistent with its answers,
+    otherwise None. Errors are the messages the declaration pages would show, keyed by question, and decide the
+    expected status the same way saving a declaration page does.
+    """
+    if not declaration:
+        return None
+
+    errors = dict(
+        (question_id, error['message'])
+        for question_id, error in get_validator(framework, content, declaration).get_error_messages()
+    )
+    status = declaration.get('status')
+    expected_status = 'started' if errors else 'complete'
+    if not errors and status == expected_status:
+        return None
+
+    return {
+        'supplierCode': supplier_code,
+        'status': status,
+        'expectedStatus': expected_status,
+        'errors': errors,
+    }
+
+
+def _validate_item(item):
+    """Pool task: an item is either a supplier code to fetch from the API or a line of a JSONL export."""
+    framework_slug = _worker_state['framework']['slug']
+    try:
+        if isinstance(item, int):
+            supplier_code = item
+            try:
+                declaration = data_api_client.get_supplier_declaration(supplier_code, framework_slug)['declaration']
+            except APIError as e:
+                if e.status_code == 404:
+                    return None
+                raise
+        else:
+            record = json.loads(item)
+            supplier_code = record.get('supplierCode')
+            declaration = record.get('declaration')
+
+        return validate_declaration(
+            _worker_state['framework'], _worker_state['content'], supplier_code, declaration
+        )
+    except Exception as e:
+        return {'item': item, 'failure': '{}: {}'.format(type(e).__name__, e)}
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _api_supplier_codes(framework_slug):
+    for supplier_code in data_api_client.get_interested_suppliers(framework_slug)['interestedSuppliers']:
+        yield int(supplier_code)
+
+
+def _export_lines(source):
+    for line in source:
+        if line.strip():
+            yield line
+
+
+def validate(framework_slug, source=None, output=None, processes=None, chunksize=50):
+    """
+    Validate every supplier declaration for a framework and write a JSONL report of the problems found.
+
+    Declarations are read from the JSONL export at `source` if given, otherwise fetched from the API.
+    The report is written to `output` (default stdout). `processes` defaults to the number of CPUs;
+    use 1 to validate in the current process.
+    """
+    processes = int(processes) if processes else multiprocessing.cpu_count()
+    chunksize = int(chunksize)
+
+    source_file = open(source) if source else None
+    sink = open(output, 'w') if output else sys.stdout
+    items = _export_lines(source_file) if source_file else _api_supplier_codes(framework_slug)
+
+    pool = multiprocessing.Pool(processes, _init_worker, (framework_slug,)) if processes > 1 else None
+    if pool is None:
+        _init_worker(framework_slug)
+
+    summary = {'checked': 0, 'invalid': 0, 'failed': 0}
+    try:
+        # Only one batch is in flight at a time; Pool.imap would otherwise read the whole input up front.
+        for batch in _batches(items, processes * chunksize):
+            results = pool.imap(_validate_item, batch, chunksize) if pool else (_validate_item(i) for i in batch)
+            for result in results:
+                summary['checked'] += 1
+                if result is None:
+                    continue
+                summary['failed' if 'failure' in result else 'invalid'] += 1
+                sink.write(json.dumps(result, sort_keys=True))
+                sink.write('\n')
+            sink.flush()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if source_file is not None:
+            source_file.close()
+        if sink is not sys.stdout:
+            sink.close()
+
+    logging.info('Validated {checked} {framework_slug} declarations: {invalid} invalid, {failed} failed'.format(
+        framework_slug=framework_slug, **summary
+    ))
+    return summary
+
+
+def init_manager(manager):
+    """Adds declaration management commands to the Flask Script manager.
+
+    These can be run from the command line.
+    """
+    sub_manager = Manager(
+        description='Commands for managing supplier declarations',
+        usage='Run "python application.py declarations -?" to see subcommand list'
+    )
+
+    sub_manager.command(validate)
+    manager.add_command('declarations', sub_manager)
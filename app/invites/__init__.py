@@ -1,16 +1,27 @@
+from __future__ import print_function
+
 import csv
+import gzip
+import io
 import json
 import logging
+import os
 import requests
 import sys
+import threading
+import time
 
+import six
+from contextlib import contextmanager
 from flask import current_app, render_template, url_for
+from six.moves import queue
 from flask_script import Manager
 
 from dmapiclient import HTTPError
 from dmutils.email import EmailError, send_email
 
 from app import data_api_client
+from app.main.helpers.services import get_page_number
 from app.main.helpers.users import generate_supplier_invitation_token
 
 
@@ -26,8 +37,14 @@ from app.main.helpers.users import generate_supplier_invitation_token
 # After that, this will produce a list of suppliers who haven't received invites:
 # $ python application.py supplier_invites list_candidates > /tmp/invites
 #
+# The lists are written as each page comes back from the API, and can be gzipped with --gzip.
+#
 # And this will send the invites:
-# $ python application.py supplier_invites send < /tmp/invites
+# $ python application.py supplier_invites send --checkpoint /tmp/invites.sent < /tmp/invites
+#
+# Invites are sent by DM_SUPPLIER_INVITE_WORKERS threads, at no more than DM_SUPPLIER_INVITE_RATE emails a second
+# between them (--workers and --rate override these).  Every invite sent is written to the checkpoint file, so if the
+# mailout stops part way through, running the same command again sends only the invites that weren't sent.
 #
 # The invite list ultimately comes from data entered into a spreadsheet, so it's a good idea to check the list for
 # obvious errors.  Before doing a live mailout, you can also test sending using the Example Pty Ltd supplier.
@@ -41,6 +58,15 @@ def send_supplier_invite(name, email_address, supplier_code, supplier_name):
 
     Raises EmailError if failed to send, or HTTPError if logging failed.
     """
+    send_supplier_invite_email(name, email_address, supplier_code, supplier_name)
+    record_supplier_invite(email_address, supplier_code)
+
+
+def send_supplier_invite_email(name, email_address, supplier_code, supplier_name):
+    """Send invite email to new supplier from Marketplace admin.
+
+    Raises EmailError if failed to send.
+    """
     token = generate_supplier_invitation_token(name, email_address, supplier_code, supplier_name)
     activation_url = url_for(
         'main.create_user',
@@ -62,12 +88,180 @@ def send_supplier_invite(name, email_address, supplier_code, supplier_name):
         current_app.config['DM_GENERIC_NOREPLY_EMAIL'],
         current_app.config['DM_GENERIC_ADMIN_NAME']
     )
+
+
+def record_supplier_invite(email_address, supplier_code):
+    """Record invite in API's log.
+
+    Raises HTTPError if logging failed.
+    """
     data_api_client.record_supplier_invite(
         supplier_code=supplier_code,
         email_address=email_address
     )
 
 
+class RateLimiter(object):
+    """Spaces out calls to `wait` so that, across all threads, no more than `rate` return each second."""
+
+    def __init__(self, rate, timer=time.time, sleep=time.sleep):
+        self._interval = 1.0 / rate if rate else 0
+        self._timer = timer
+        self._sleep = sleep
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = self._timer()
+            start = max(now, self._next)
+            self._next = start + self._interval
+
+        if start > now:
+            self._sleep(start - now)
+
+
+class Checkpoint(object):
+    """
+    File listing the invites that have been emailed and recorded, one JSON list per line.
+
+    Invites that were emailed but not recorded (because the API failed) are only recorded when sent again.
+    """
+
+    EMAILED = 'emailed'
+    RECORDED = 'recorded'
+
+    def __init__(self, path=None):
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._file = None
+        if not path:
+            return
+
+        if os.path.exists(path):
+            with open(path) as checkpoint_file:
+                for line in checkpoint_file:
+                    if line.strip():
+                        stage, email_address, supplier_code = json.loads(line)
+                        self._stages[(email_address, supplier_code)] = stage
+        self._file = open(path, 'a')
+
+    def stage(self, email_address, supplier_code):
+        return self._stages.get((email_address, supplier_code))
+
+    def save(self, stage, email_address, supplier_code):
+        with self._lock:
+            self._stages[(email_address, supplier_code)] = stage
+            if self._file is not None:
+                self._file.write(json.dumps([stage, email_address, supplier_code]) + '\n')
+                self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class SendSummary(object):
+
+    def __init__(self, timer=time.time):
+        self.sent = 0
+        self.recorded = 0
+        self.skipped = 0
+        self.failed = 0
+        self._timer = timer
+        self._started = timer()
+        self._lock = threading.Lock()
+
+    def add(self, outcome):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def __str__(self):
+        elapsed = self._timer() - self._started
+        return (
+            'Sent {} invites in {:.1f}s ({:.1f} a second). '
+            'Recorded {} sent before, skipped {} already done, {} failed.'
+        ).format(
+            self.sent, elapsed, self.sent / elapsed if elapsed else 0, self.recorded, self.skipped, self.failed
+        )
+
+
+def _send_invite(supplier_record, checkpoint, rate_limiter, summary):
+    name, email_address, supplier_code, supplier_name = supplier_record
+    supplier_code = int(supplier_code)
+    emailed = checkpoint.stage(email_address, supplier_code) == Checkpoint.EMAILED
+    try:
+        if not emailed:
+            rate_limiter.wait()
+            send_supplier_invite_email(name, email_address, supplier_code, supplier_name)
+            checkpoint.save(Checkpoint.EMAILED, email_address, supplier_code)
+        record_supplier_invite(email_address, supplier_code)
+        checkpoint.save(Checkpoint.RECORDED, email_address, supplier_code)
+        summary.add('recorded' if emailed else 'sent')
+    except EmailError:
+        logging.error('Failed to send invitation email to {}'.format(supplier_record))
+        summary.add('failed')
+    except HTTPError:
+        logging.error('Failed to record invite for {}'.format(supplier_record))
+        summary.add('failed')
+    except Exception:
+        logging.exception('Failed to invite {}'.format(supplier_record))
+        summary.add('failed')
+
+
+def _invite_worker(app, invite_queue, checkpoint, rate_limiter, summary):
+    with app.app_context():
+        while True:
+            supplier_record = invite_queue.get()
+            if supplier_record is None:
+                return
+            _send_invite(supplier_record, checkpoint, rate_limiter, summary)
+
+
+def iter_results(list_page):
+    """
+    Yields the results of a paginated API listing, fetching each page when the last one runs out.
+
+    Listings that aren't paginated (with no `links.next`) are fetched in one go.
+    """
+    response = list_page()
+    while True:
+        for result in response['results']:
+            yield result
+
+        page = get_page_number(response.get('links', {}).get('next'))
+        if page is None:
+            return
+        response = list_page(page=page)
+
+
+def unique_contacts(contact_list):
+    """Leaves out contacts repeated for a supplier, ignoring the case of email addresses."""
+    seen = set()
+    for candidate in contact_list:
+        key = (candidate['contact']['email'].lower(), candidate['supplierCode'])
+        if key not in seen:
+            seen.add(key)
+            yield candidate
+
+
+@contextmanager
+def csv_sink(sink, compress=False):
+    """The file to write CSV to, gzipping it into `sink` if `compress` is set."""
+    if not compress:
+        yield sink
+        sink.flush()
+        return
+
+    compressed = gzip.GzipFile(fileobj=getattr(sink, 'buffer', sink), mode='wb')
+    output = io.TextIOWrapper(compressed, newline='', write_through=True) if six.PY3 else compressed
+    try:
+        yield output
+    finally:
+        output.close()
+        sink.flush()
+
+
 def format_potential_invites(contact_list, sink=sys.stdout):
     """
     Formats json contact/supplier info as CSV.
@@ -84,7 +278,12 @@ def format_potential_invites(contact_list, sink=sys.stdout):
         output.writerow((name, email_address, supplier_code, supplier_name))
 
 
-def send(source=sys.stdin):
+def export_potential_invites(list_page, sink, compress=False):
+    with csv_sink(sink, compress) as output:
+        format_potential_invites(unique_contacts(iter_results(list_page)), output)
+
+
+def send(source=sys.stdin, workers=None, rate=None, checkpoint=None):
     """
     Read CSV list of suppliers to be invited and send invites.
 
@@ -92,35 +291,57 @@ def send(source=sys.stdin):
     E.g.:
     Me,me@example.com,123,Example Supplier
     Someone Else,someone.else@example.com,456,Another Example Supplier
+
+    Invites listed in the checkpoint file are skipped, and invites sent are added to it.
     """
-    for supplier_record in csv.reader(source):
-        name, email_address, supplier_code, supplier_name = supplier_record
-        try:
-            send_supplier_invite(name, email_address, int(supplier_code), supplier_name)
-        except EmailError as e:
-            logging.error('Failed to send invitation email to {}'.format(supplier_record))
-        except HTTPError as e:
-            logging.error('Failed to record invite for {}'.format(supplier_record))
+    app = current_app._get_current_object()
+    workers = int(workers or app.config['DM_SUPPLIER_INVITE_WORKERS'])
+    rate_limiter = RateLimiter(float(rate or app.config['DM_SUPPLIER_INVITE_RATE']))
+    checkpoint = Checkpoint(checkpoint)
+    summary = SendSummary()
+
+    invite_queue = queue.Queue(maxsize=workers * 2)
+    threads = [
+        threading.Thread(target=_invite_worker, args=(app, invite_queue, checkpoint, rate_limiter, summary))
+        for _ in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        for supplier_record in csv.reader(source):
+            name, email_address, supplier_code, supplier_name = supplier_record
+            if checkpoint.stage(email_address, int(supplier_code)) == Checkpoint.RECORDED:
+                summary.add('skipped')
+            else:
+                invite_queue.put(supplier_record)
+    finally:
+        for _ in threads:
+            invite_queue.put(None)
+        for thread in threads:
+            thread.join()
+        checkpoint.close()
+
+    print(summary, file=sys.stderr)
+    return summary
 
 
-def list_candidates(sink=sys.stdout):
+def list_candidates(sink=sys.stdout, gzip=False):
     """
     Output list of candidates for supplier account invites as CSV list.
 
     The format is the same as for send_supplier_invites.
     """
-    response = data_api_client.list_supplier_account_invite_candidates()
-    format_potential_invites(response['results'], sink)
+    export_potential_invites(data_api_client.list_supplier_account_invite_candidates, sink, gzip)
 
 
-def list_unclaimed(sink=sys.stdout):
+def list_unclaimed(sink=sys.stdout, gzip=False):
     """
     Output list of unclaimed invitees in CSV format for resending invites.
 
     The format is the same as for send_supplier_invites.
     """
-    response = data_api_client.list_unclaimed_supplier_account_invites()
-    format_potential_invites(response['results'], sink)
+    export_potential_invites(data_api_client.list_unclaimed_supplier_account_invites, sink, gzip)
 
 
 def init_manager(manager):
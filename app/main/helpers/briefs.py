@@ -7,7 +7,10 @@ from flask import abort, current_app, render_template
 from flask_login import current_user
 
 from dmapiclient.audit import AuditTypes
-from dmutils.email import send_email, EmailError
+from dmutils.email import EmailError
+
+from app.audit import create_audit_event
+from app.outbox import send_email
 
 
 def get_brief(data_api_client, brief_id, allowed_statuses=None):
@@ -62,7 +65,8 @@ def send_brief_clarification_question(data_api_client, brief, clarification_ques
 
         abort(503, "Clarification question email failed to send")
 
-    data_api_client.create_audit_event(
+    create_audit_event(
+        data_api_client,
         audit_type=AuditTypes.send_clarification_question,
         user=current_user.email_address,
         object_type="briefs",
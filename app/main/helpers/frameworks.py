@@ -7,6 +7,9 @@ from flask_login import current_user
 from dmapiclient import APIError
 from dmutils import s3
 
+from ...metrics import timed_client
+from .services import DRAFT_STATUS, COMPLETE_STATUS
+
 
 def get_framework(client, framework_slug, allowed_statuses=None):
     if allowed_statuses is None:
@@ -137,22 +140,12 @@ def get_frameworks_by_status(frameworks, status, extra_condition=False):
     ]
 
 
-def count_drafts_by_lot(drafts, lotSlug):
-    return len([
-        draft for draft in drafts if draft['lotSlug'] == lotSlug
-    ])
-
-
-def get_statuses_for_lot(
-    has_one_service_limit,
-    drafts_count,
-    complete_drafts_count,
-    declaration_status,
-    framework_status,
-    lot_name,
-    unit,
-    unit_plural
-):
+def get_statuses_for_lot(lot, drafts, declaration_status, framework_status):
+    """Returns the status messages for a lot, given the supplier's `DraftsByLot` for the framework."""
+    drafts_count = drafts.count(lot['slug'], DRAFT_STATUS)
+    complete_drafts_count = drafts.count(lot['slug'], COMPLETE_STATUS)
+    has_one_service_limit = lot['oneServiceLimit']
+    lot_name, unit, unit_plural = lot['name'], lot['unitSingular'], lot['unitPlural']
 
     if not drafts_count and not complete_drafts_count:
         return []
@@ -267,7 +260,7 @@ def get_status_for_multi_service_lot_and_service_type(
 
 
 def countersigned_framework_agreement_exists_in_bucket(framework_slug, bucket):
-    agreements_bucket = s3.S3(bucket)
+    agreements_bucket = timed_client('s3', s3.S3(bucket))
     countersigned_path = get_agreement_document_path(
         framework_slug, current_user.supplier_code, COUNTERSIGNED_AGREEMENT_FILENAME)
     return agreements_bucket.path_exists(countersigned_path)
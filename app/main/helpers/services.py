@@ -1,9 +1,14 @@
 import re
+from collections import namedtuple
 from datetime import datetime
 from flask import abort, current_app
 from flask_login import current_user
 
 from dmapiclient import APIError
+from dmcontent.formats import format_service_price
+
+from app.cache import TTLCache
+from .validation import get_manifest_version
 
 try:
     import urlparse
@@ -11,7 +16,39 @@ except ImportError:
     import urllib.parse as urlparse
 
 
-def get_drafts(apiclient, framework_slug):
+DRAFT_STATUS = 'not-submitted'
+COMPLETE_STATUS = 'submitted'
+
+
+class DraftsByLot(object):
+    """
+    A supplier's drafts for a framework, grouped by lot and status in a single pass.
+
+    Only drafts that are not submitted yet or are complete (submitted) are kept. Every list keeps the
+    order the drafts were given in.
+    """
+    def __init__(self, drafts):
+        self._by_status = {DRAFT_STATUS: [], COMPLETE_STATUS: []}
+        self._by_lot_and_status = {}
+        for draft in drafts:
+            if draft['status'] not in self._by_status:
+                continue
+            self._by_status[draft['status']].append(draft)
+            self._by_lot_and_status.setdefault((draft['lotSlug'], draft['status']), []).append(draft)
+
+    def with_status(self, status):
+        return self._by_status[status]
+
+    def for_lot(self, lot_slug, status):
+        return self._by_lot_and_status.get((lot_slug, status), [])
+
+    def count(self, lot_slug, status=None):
+        if status is None:
+            return len(self.for_lot(lot_slug, DRAFT_STATUS)) + len(self.for_lot(lot_slug, COMPLETE_STATUS))
+        return len(self.for_lot(lot_slug, status))
+
+
+def get_drafts_by_lot(apiclient, framework_slug):
     try:
         drafts = apiclient.find_draft_services(
             current_user.supplier_code,
@@ -21,18 +58,12 @@ def get_drafts(apiclient, framework_slug):
     except APIError as e:
         abort(e.status_code)
 
-    complete_drafts = [draft for draft in drafts if draft['status'] == 'submitted']
-    drafts = [draft for draft in drafts if draft['status'] == 'not-submitted']
-
-    return drafts, complete_drafts
+    return DraftsByLot(drafts)
 
 
 def get_lot_drafts(apiclient, framework_slug, lot_slug):
-    drafts, complete_drafts = get_drafts(apiclient, framework_slug)
-    return (
-        [draft for draft in drafts if draft['lotSlug'] == lot_slug],
-        [draft for draft in complete_drafts if draft['lotSlug'] == lot_slug]
-    )
+    drafts = get_drafts_by_lot(apiclient, framework_slug)
+    return drafts.for_lot(lot_slug, DRAFT_STATUS), drafts.for_lot(lot_slug, COMPLETE_STATUS)
 
 
 def count_unanswered_questions(service_attributes):
@@ -47,6 +78,38 @@ def count_unanswered_questions(service_attributes):
     return unanswered_required, unanswered_optional
 
 
+DraftSummary = namedtuple('DraftSummary', ['sections', 'price_string', 'unanswered_required', 'unanswered_optional'])
+
+
+def _draft_summary_cache():
+    cache = current_app.extensions.get('draft_summaries')
+    if cache is None:
+        cache = current_app.extensions['draft_summaries'] = TTLCache(current_app.config['DM_DRAFT_SUMMARY_CACHE_SIZE'])
+    return cache
+
+
+def get_draft_summary(content, draft):
+    """
+    Returns the summary sections, price and unanswered question counts for a draft service.
+
+    `content` is the unfiltered edit_submission manifest. Summaries only depend on the draft and the manifest,
+    so they are cached by draft id, `updatedAt` and manifest version, least recently used first out.
+    """
+    key = None
+    if draft.get('id') and draft.get('updatedAt'):
+        key = (draft['id'], draft['updatedAt'], get_manifest_version(content))
+        summary = _draft_summary_cache().get(key)
+        if summary is not None:
+            return summary
+
+    sections = content.filter(draft).summary(draft)
+    summary = DraftSummary(sections, format_service_price(draft), *count_unanswered_questions(sections))
+    if key is not None:
+        _draft_summary_cache().set(key, summary)
+
+    return summary
+
+
 def is_service_associated_with_supplier(service):
     return service.get('supplierCode') == current_user.supplier_code
 
@@ -59,6 +122,15 @@ def get_signed_document_url(uploader, document_path):
         return url._replace(netloc=base_url.netloc, scheme=base_url.scheme).geturl()
 
 
+def get_page_number(link):
+    """Returns the page number an API pagination link points to, or None if there is no link."""
+    if not link:
+        return None
+
+    page = urlparse.parse_qs(urlparse.urlparse(link).query).get('page')
+    return int(page[0]) if page else None
+
+
 def parse_document_upload_time(data):
     match = re.search("(\d{4}-\d{2}-\d{2}-\d{2}\d{2})\..{2,3}$", data)
     if match:
@@ -1,6 +1,23 @@
-from flask import current_app
+import binascii
+import calendar
+import os
+import time
+
+import flask_login
+import six
+from flask import current_app, session
+from itsdangerous import BadData, URLSafeTimedSerializer
 
 from dmutils.email import decode_token, generate_token, InvalidToken, ONE_DAY_IN_SECONDS
+from dmutils.user import User
+
+from app.cache import TTLCache
+from app.sessions import regenerate_session
+
+# Identifies the login a session belongs to, so users cached for one login aren't used for the next
+USER_VERSION_KEY = 'user_version'
+
+SUPPLIER_INVITE_TOKEN_MAX_AGE = 7*ONE_DAY_IN_SECONDS
 
 
 def generate_supplier_invitation_token(name, email_address, supplier_code, supplier_name):
@@ -14,13 +31,131 @@ def generate_supplier_invitation_token(name, email_address, supplier_code, suppl
     return token
 
 
+def _invite_token_cache():
+    cache = current_app.extensions.get('invite_tokens')
+    if cache is None:
+        cache = current_app.extensions['invite_tokens'] = TTLCache(current_app.config['DM_INVITE_TOKEN_CACHE_SIZE'])
+    return cache
+
+
+def _invitation_token_expires_in(token):
+    """Seconds until a valid invitation token expires, or None if its timestamp can't be read."""
+    serializer = URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
+    try:
+        _, issued_at = serializer.loads(
+            token, salt=current_app.config['SUPPLIER_INVITE_TOKEN_SALT'], return_timestamp=True
+        )
+    except BadData:
+        return None
+    return calendar.timegm(issued_at.utctimetuple()) + SUPPLIER_INVITE_TOKEN_MAX_AGE - time.time()
+
+
 def decode_supplier_invitation_token(token):
+    """
+    Returns the data in an invitation token, raising InvalidToken if it isn't valid.
+
+    Invite links are opened again and again, so decoded tokens are cached until the token expires.
+    """
+    data = _invite_token_cache().get(token)
+    if data is not None:
+        return dict(data)
+
     data = decode_token(
         token,
         current_app.config['SECRET_KEY'],
         current_app.config['SUPPLIER_INVITE_TOKEN_SALT'],
-        7*ONE_DAY_IN_SECONDS
+        SUPPLIER_INVITE_TOKEN_MAX_AGE
     )
     if not set(('name', 'emailAddress', 'supplierCode', 'supplierName')).issubset(set(data.keys())):
         raise InvalidToken
+
+    expires_in = _invitation_token_expires_in(token)
+    if expires_in is not None and expires_in > 0:
+        _invite_token_cache().set(token, dict(data), ttl=expires_in)
     return data
+
+
+def get_invited_user(data_api_client, email_address):
+    """
+    Returns the user, if there is one, with the email address an invitation was sent to.
+
+    The answer is cached for DM_INVITED_USER_CACHE_TTL seconds, unless `forget_invited_user` is called when the
+    user is created.
+    """
+    cache = _invite_token_cache()
+    key = ('user', email_address.lower())
+    cached = cache.get(key)
+    if cached is not None:
+        return cached[0]
+
+    user_json = data_api_client.get_user(email_address=email_address)
+    cache.set(key, (user_json,), ttl=current_app.config['DM_INVITED_USER_CACHE_TTL'])
+    return user_json
+
+
+def forget_invited_user(email_address):
+    _invite_token_cache().delete(('user', email_address.lower()))
+
+
+def _user_cache():
+    cache = current_app.extensions.get('users')
+    if cache is None:
+        cache = current_app.extensions['users'] = TTLCache(
+            current_app.config['DM_USER_CACHE_SIZE'], ttl=current_app.config['DM_USER_CACHE_TTL']
+        )
+    return cache
+
+
+def _new_user_version():
+    return binascii.hexlify(os.urandom(8)).decode('ascii')
+
+
+def load_user(data_api_client, user_id):
+    """
+    Loads the logged in user for Flask-Login.
+
+    Users are cached for DM_USER_CACHE_TTL seconds by user ID and session version, so most requests don't fetch
+    the user from the API. A session gets a new version when someone logs in with it, and each session of a user
+    has its own cache entry.
+
+    A cached user is only dropped when it expires, when `forget_user` is called, or when the session logs in again.
+    Logging out happens in another frontend app, so it doesn't clear this cache. Each process has its own cache, and
+    `forget_user` only clears the cache of the process it is called in, so other processes can use a deactivated or
+    changed user for up to DM_USER_CACHE_TTL seconds.
+    """
+    if not current_app.config['DM_USER_CACHE_TTL']:
+        return User.load_user(data_api_client, user_id)
+
+    version = session.get(USER_VERSION_KEY)
+    if version is None:
+        version = session[USER_VERSION_KEY] = _new_user_version()
+
+    user_id = six.text_type(user_id)
+    cached = _user_cache().get((user_id, version))
+    if cached is not None and cached[0] > _user_cache().get(('forgotten', user_id), 0):
+        return cached[1]
+
+    user = User.load_user(data_api_client, user_id)
+    if user is not None:
+        _user_cache().set((user_id, version), (time.time(), user))
+    return user
+
+
+def forget_user(user_id):
+    """Stops cached copies of a user being used, for example because they have been deactivated."""
+    # Every session's copy loaded before now is ignored. Those have all expired once the marker does.
+    _user_cache().set(('forgotten', six.text_type(user_id)), time.time())
+
+
+def login_user(user):
+    forget_user(user.get_id())
+    regenerate_session()
+    session[USER_VERSION_KEY] = _new_user_version()
+    return flask_login.login_user(user)
+
+
+def init_user_loader(login_manager, data_api_client):
+    """Replaces the user loader set up by `init_frontend_app` with one that caches users."""
+    @login_manager.user_loader
+    def load_cached_user(user_id):
+        return load_user(data_api_client, user_id)
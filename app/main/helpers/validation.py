@@ -1,10 +1,27 @@
-from functools import reduce
-from operator import add
+from collections import namedtuple
 import re
 import six
-from werkzeug.datastructures import ImmutableOrderedMultiDict
+from werkzeug.datastructures import ImmutableDict, ImmutableOrderedMultiDict
 
 EMAIL_REGEX = r'^[^@^\s]+@[^@^\.^\s]+(\.[^@^\.^\s]+)+$'
+EMAIL_PATTERN = re.compile(EMAIL_REGEX)
+
+CHARACTER_LIMITED_QUESTION_TYPES = frozenset(['text', 'textbox_large'])
+
+ValidationRules = namedtuple('ValidationRules', [
+    'field_order',
+    'field_positions',
+    'character_limited_fields',
+    'email_fields',
+    'number_string_patterns',
+    'default_required_fields',
+    'conditional_requirements',
+])
+
+Condition = namedtuple('Condition', ['kind', 'fields', 'values'])
+ConditionalRequirement = namedtuple('ConditionalRequirement', ['condition', 'fields'])
+
+_validation_rules = {}
 
 
 def get_validator(framework, content, answers):
@@ -15,7 +32,154 @@ def get_validator(framework, content, answers):
         raise ValueError("a framework dictionary must be provided")
     if framework is not None:
         validator_cls = VALIDATORS.get(framework['slug'])
-        return validator_cls(content, answers)
+        rules = get_validation_rules(validator_cls, content) if content is not None else None
+        return validator_cls(content, answers, rules=rules)
+
+
+def get_manifest_version(content):
+    """
+    Identifies the layout of a content manifest.
+
+    Manifests are loaded once per process and never change afterwards, so the ordered section ids are
+    enough to tell two declaration manifests apart without walking every question.
+    """
+    return tuple(section.id for section in content)
+
+
+def get_validation_rules(validator_cls, content):
+    """
+    Returns the compiled rule table for a validator class and content manifest.
+
+    Rule tables are compiled on first use and cached per (validator, manifest version).
+    """
+    key = (validator_cls, get_manifest_version(content))
+    rules = _validation_rules.get(key)
+    if rules is None:
+        rules = _validation_rules[key] = compile_validation_rules(validator_cls, content)
+
+    return rules
+
+
+def compile_validation_rules(validator_cls, content):
+    field_order = tuple(
+        question_id for section in content for question_id in section.get_question_ids()
+    )
+    character_limited_fields = frozenset(
+        question_id for question_id in field_order
+        if content.get_question(question_id).get('type') in CHARACTER_LIMITED_QUESTION_TYPES
+    )
+    number_string_patterns = tuple(
+        (field, re.compile(r'^\d{{{0}}}$'.format(length)))
+        for field, length in validator_cls.number_string_fields or []
+    )
+
+    return ValidationRules(
+        field_order=field_order,
+        field_positions=ImmutableDict((question_id, index) for index, question_id in enumerate(field_order)),
+        character_limited_fields=character_limited_fields,
+        email_fields=frozenset(validator_cls.email_validation_fields or []),
+        number_string_patterns=number_string_patterns,
+        default_required_fields=frozenset(field_order) - frozenset(validator_cls.optional_fields or []),
+        conditional_requirements=ConditionalRequirements(validator_cls.conditionally_required or ()),
+    )
+
+
+def any_answered(*fields):
+    """Met when any of the fields has a truthy answer."""
+    return Condition('any_answered', fields, None)
+
+
+def answered_no(field):
+    """Met when the field has been answered with a falsy value."""
+    return Condition('answered_no', (field,), None)
+
+
+def answer_equals(field, value):
+    return Condition('equals', (field,), value)
+
+
+def answer_is(field, value):
+    """Met when the answer is the given object, e.g. `True` rather than any truthy value."""
+    return Condition('is', (field,), value)
+
+
+def answer_in(field, values):
+    return Condition('in', (field,), tuple(values))
+
+
+def answer_contains_any(field, values):
+    """Met when a (list or string) answer contains any of the values."""
+    return Condition('contains_any', (field,), tuple(values))
+
+
+def all_of(*conditions):
+    return Condition('all_of', (), conditions)
+
+
+def required_if(condition, *fields):
+    return ConditionalRequirement(condition, frozenset(fields))
+
+
+def compile_condition(condition):
+    """Turns a condition into a predicate taking the answers dictionary."""
+    kind, fields, values = condition
+    if kind == 'all_of':
+        predicates = tuple(compile_condition(sub_condition) for sub_condition in values)
+        return lambda answers: all(predicate(answers) for predicate in predicates)
+    if kind == 'any_answered':
+        return lambda answers: any(answers.get(field) for field in fields)
+
+    field = fields[0]
+    if kind == 'answered_no':
+        return lambda answers: field in answers and not answers[field]
+    if kind == 'equals':
+        return lambda answers: answers.get(field) == values
+    if kind == 'is':
+        return lambda answers: answers.get(field) is values
+    if kind == 'in':
+        return lambda answers: answers.get(field) in values
+    if kind == 'contains_any':
+        return lambda answers: bool(answers.get(field)) and any(value in answers[field] for value in values)
+
+    raise ValueError("unknown condition {}".format(kind))
+
+
+class ConditionalRequirements(object):
+    """
+    Evaluates a validator's conditionally required fields against a set of answers.
+
+    `any_answered` rules, which make up most of the declaration rules, are indexed by the field that
+    triggers them so evaluating them only looks at the answers that were given. Everything else is
+    compiled into a predicate.
+    """
+    def __init__(self, rules):
+        triggers = {}
+        predicates = []
+        for condition, fields in rules:
+            if condition.kind == 'any_answered':
+                for trigger_field in condition.fields:
+                    triggers[trigger_field] = triggers.get(trigger_field, frozenset()) | fields
+            else:
+                predicates.append((compile_condition(condition), fields))
+
+        self.triggers = ImmutableDict(triggers)
+        self.trigger_fields = frozenset(self.triggers)
+        self.predicates = tuple(predicates)
+
+    def required_fields(self, answers):
+        required = set()
+        if not answers:
+            return required
+
+        for field in self.trigger_fields.intersection(answers):
+            if answers[field]:
+                required |= self.triggers[field]
+
+        for predicate, fields in self.predicates:
+            if predicate(answers):
+                required |= fields
+
+        return required
 
 
 class DeclarationValidator(object):
@@ -23,30 +187,42 @@ class DeclarationValidator(object):
     number_string_fields = []
     character_limit = None
     optional_fields = set([])
+    conditionally_required = ()
 
-    def __init__(self, content, answers):
+    def __init__(self, content, answers, rules=None):
         self.content = content
         self.answers = answers
+        self._rules = rules
+
+    @property
+    def rules(self):
+        if self._rules is None:
+            self._rules = get_validation_rules(type(self), self.content)
+        return self._rules
 
     def get_error_messages_for_page(self, section):
         all_errors = self.get_error_messages()
-        page_ids = section.get_question_ids()
+        page_ids = set(section.get_question_ids())
         page_errors = ImmutableOrderedMultiDict(filter(lambda err: err[0] in page_ids, all_errors))
         return page_errors
 
     def get_error_messages(self):
         raw_errors_map = self.errors()
+        field_positions = self.rules.field_positions
         errors_map = list()
-        for question_id in self.all_fields():
-            if question_id in raw_errors_map:
-                question_number = self.content.get_question(question_id).get('number')
-                validation_message = self.get_error_message(question_id, raw_errors_map[question_id])
-                errors_map.append((question_id, {
-                    'input_name': question_id,
-                    'question': "Question {}".format(question_number)
-                    if question_number else self.content.get_question(question_id).get('question'),
-                    'message': validation_message,
-                }))
+        for question_id in sorted(
+            (question_id for question_id in raw_errors_map if question_id in field_positions),
+            key=field_positions.get
+        ):
+            question = self.content.get_question(question_id)
+            question_number = question.get('number')
+            validation_message = self.get_error_message(question_id, raw_errors_map[question_id])
+            errors_map.append((question_id, {
+                'input_name': question_id,
+                'question': "Question {}".format(question_number)
+                if question_number else question.get('question'),
+                'message': validation_message,
+            }))
 
         return errors_map
 
@@ -62,11 +238,8 @@ class DeclarationValidator(object):
         return default_messages.get(
             message_key, 'There was a problem with the answer to this question')
 
-    def errors(self):
-        raise NotImplementedError("only a subclass should be used")
-
     def all_fields(self):
-        return reduce(add, (section.get_question_ids() for section in self.content))
+        return list(self.rules.field_order)
 
     def fields_with_values(self):
         return set(key for key, value in self.answers.items()
@@ -91,38 +264,38 @@ class DeclarationValidator(object):
 
     def character_limit_errors(self):
         errors_map = {}
-        for question_id in self.all_fields():
-            if self.content.get_question(question_id).get('type') in ['text', 'textbox_large']:
-                answer = self.answers.get(question_id) or ''
-                if self.character_limit is not None and len(answer) > self.character_limit:
-                    errors_map[question_id] = "under_character_limit"
+        if self.character_limit is None:
+            return errors_map
+
+        for question_id in self.rules.character_limited_fields.intersection(self.answers):
+            answer = self.answers.get(question_id) or ''
+            if len(answer) > self.character_limit:
+                errors_map[question_id] = "under_character_limit"
 
         return errors_map
 
     def formatting_errors(self, answers):
         errors_map = {}
-        if self.email_validation_fields is not None and len(self.email_validation_fields) > 0:
-            for field in self.email_validation_fields:
-                if self.answers.get(field) is None or not re.match(EMAIL_REGEX, self.answers.get(field, '')):
-                    errors_map[field] = 'invalid_format'
-
-        if self.number_string_fields is not None and len(self.number_string_fields) > 0:
-            for field, length in self.number_string_fields:
-                if self.answers.get(field) is None or not re.match(
-                        '^\d{{{0}}}$'.format(length), self.answers.get(field, '')
-                ):
-                    errors_map[field] = 'invalid_format'
+        for field in self.rules.email_fields:
+            if self.answers.get(field) is None or not EMAIL_PATTERN.match(self.answers.get(field, '')):
+                errors_map[field] = 'invalid_format'
+
+        for field, pattern in self.rules.number_string_patterns:
+            if self.answers.get(field) is None or not pattern.match(self.answers.get(field, '')):
+                errors_map[field] = 'invalid_format'
         return errors_map
 
     def get_required_fields(self):
         try:
-            req_fields = self.required_fields
+            req_fields = set(self.required_fields)
         except AttributeError:
-            req_fields = set(self.all_fields())
+            req_fields = set(self.rules.default_required_fields)
+        else:
+            #  Remove optional fields
+            if self.optional_fields is not None:
+                req_fields -= set(self.optional_fields)
 
-        #  Remove optional fields
-        if self.optional_fields is not None:
-            req_fields -= set(self.optional_fields)
+        req_fields |= self.rules.conditional_requirements.required_fields(self.answers)
 
         return req_fields
 
@@ -138,42 +311,28 @@ class G7Validator(DeclarationValidator):
     ])
     email_validation_fields = set(['SQ1-1o', 'SQ1-2b'])
     character_limit = 5000
-
-    def get_required_fields(self):
-        req_fields = super(G7Validator, self).get_required_fields()
-
+    conditionally_required = (
         #  If you answered other to question 19 (trading status)
-        if self.answers.get('SQ1-1ci') == 'other (please specify)':
-            req_fields.add('SQ1-1cii')
-
+        required_if(answer_equals('SQ1-1ci', 'other (please specify)'), 'SQ1-1cii'),
         #  If you answered yes to question 27 (non-UK business registered in EU)
-        if self.answers.get('SQ1-1i-i', False):
-            req_fields.add('SQ1-1i-ii')
-
+        required_if(any_answered('SQ1-1i-i'), 'SQ1-1i-ii'),
         #  If you answered 'licensed' or 'a member of a relevant organisation' in question 29
-        answer_29 = self.answers.get('SQ1-1j-i', [])
-        if answer_29 and len(answer_29) > 0 and \
-                ('licensed' in answer_29 or 'a member of a relevant organisation' in answer_29):
-                req_fields.add('SQ1-1j-ii')
-
+        required_if(
+            answer_contains_any('SQ1-1j-i', ['licensed', 'a member of a relevant organisation']), 'SQ1-1j-ii'
+        ),
         # If you answered yes to either question 53 or 54 (tax returns)
-        if self.answers.get('SQ4-1a', False) or self.answers.get('SQ4-1b', False):
-            req_fields.add('SQ4-1c')
-
+        required_if(any_answered('SQ4-1a', 'SQ4-1b'), 'SQ4-1c'),
         # If you answered Yes to questions 39 - 51 (discretionary exclusion)
-        dependent_fields = [
-            'SQ2-2a', 'SQ3-1a', 'SQ3-1b', 'SQ3-1c', 'SQ3-1d', 'SQ3-1e', 'SQ3-1f', 'SQ3-1g',
-            'SQ3-1h-i', 'SQ3-1h-ii', 'SQ3-1i-i', 'SQ3-1i-ii', 'SQ3-1j'
-        ]
-        if any(self.answers.get(field) for field in dependent_fields):
-            req_fields.add('SQ3-1k')
-
+        required_if(
+            any_answered(
+                'SQ2-2a', 'SQ3-1a', 'SQ3-1b', 'SQ3-1c', 'SQ3-1d', 'SQ3-1e', 'SQ3-1f', 'SQ3-1g',
+                'SQ3-1h-i', 'SQ3-1h-ii', 'SQ3-1i-i', 'SQ3-1i-ii', 'SQ3-1j'
+            ),
+            'SQ3-1k'
+        ),
         # If you answered No to question 26 (established in the UK)
-        if 'SQ5-2a' in self.answers and not self.answers['SQ5-2a']:
-            req_fields.add('SQ1-1i-i')
-            req_fields.add('SQ1-1j-i')
-
-        return req_fields
+        required_if(answered_no('SQ5-2a'), 'SQ1-1i-i', 'SQ1-1j-i'),
+    )
 
 
 class DOSValidator(DeclarationValidator):
@@ -185,44 +344,39 @@ class DOSValidator(DeclarationValidator):
     ])
     email_validation_fields = set(["contactEmailContractNotice", "primaryContactEmail"])
     character_limit = 5000
-
-    def get_required_fields(self):
-        req_fields = super(DOSValidator, self).get_required_fields()
-
-        dependent_fields = {
-            # If you responded yes to any of questions 22 to 34
-            "mitigatingFactors": [
+    conditionally_required = (
+        # If you responded yes to any of questions 22 to 34
+        required_if(
+            any_answered(
                 'misleadingInformation', 'confidentialInformation', 'influencedContractingAuthority',
                 'witheldSupportingDocuments', 'seriousMisrepresentation', 'significantOrPersistentDeficiencies',
-                'distortedCompetition', 'conflictOfInterest', 'distortedCompetition', 'graveProfessionalMisconduct',
+                'distortedCompetition', 'conflictOfInterest', 'graveProfessionalMisconduct',
                 'bankrupt', 'environmentalSocialLabourLaw', 'taxEvasion'
-            ],
-            # If you responded yes to either 36 or 37
-            "mitigatingFactors2": [
-                "unspentTaxConvictions", "GAAR"
-            ],
-        }
-        for target_field, fields in dependent_fields.items():
-            if any(self.answers.get(field) for field in fields):
-                req_fields.add(target_field)
-
+            ),
+            'mitigatingFactors'
+        ),
+        # If you responded yes to either 36 or 37
+        required_if(any_answered('unspentTaxConvictions', 'GAAR'), 'mitigatingFactors2'),
         # Describe your trading status
-        if self.answers.get('tradingStatus') == "other (please specify)":
-            req_fields.add('tradingStatusOther')
-
+        required_if(answer_equals('tradingStatus', 'other (please specify)'), 'tradingStatusOther'),
         # If your company was not established in the UK
-        if self.answers.get('establishedInTheUK') is False:
-            req_fields.add('appropriateTradeRegisters')
-            # If yes to appropriate trade registers
-            if self.answers.get('appropriateTradeRegisters') is True:
-                req_fields.add('appropriateTradeRegistersNumber')
-
-            req_fields.add('licenceOrMemberRequired')
-            # If not 'none of the above' to licenceOrMemberRequired
-            if self.answers.get('licenceOrMemberRequired') in ['licensed', 'a member of a relevant organisation']:
-                req_fields.add('licenceOrMemberRequiredDetails')
-
-        return req_fields
+        required_if(
+            answer_is('establishedInTheUK', False), 'appropriateTradeRegisters', 'licenceOrMemberRequired'
+        ),
+        # If yes to appropriate trade registers
+        required_if(
+            all_of(answer_is('establishedInTheUK', False), answer_is('appropriateTradeRegisters', True)),
+            'appropriateTradeRegistersNumber'
+        ),
+        # If not 'none of the above' to licenceOrMemberRequired
+        required_if(
+            all_of(
+                answer_is('establishedInTheUK', False),
+                answer_in('licenceOrMemberRequired', ['licensed', 'a member of a relevant organisation'])
+            ),
+            'licenceOrMemberRequiredDetails'
+        ),
+    )
 
 
 class G8Validator(DOSValidator):
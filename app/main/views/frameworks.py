@@ -8,8 +8,7 @@ import six
 
 from dmapiclient import APIError
 from dmapiclient.audit import AuditTypes
-from dmutils.email import send_email, EmailError
-from dmcontent.formats import format_service_price
+from dmutils.email import EmailError
 from dmutils.formats import datetimeformat
 from dmutils.forms import render_template_with_csrf
 from dmutils import s3
@@ -20,18 +19,22 @@ from dmutils.documents import (
 )
 
 from ... import data_api_client
+from ...audit import create_audit_event
 from ...main import main, content_loader
+from ...metrics import timed_client
+from ...outbox import send_email, send_batched_email
+from ...templating import conditional_response, page_etag, stream_template, stream_template_with_csrf
 from ..helpers import hash_email, login_required
 from ..helpers.frameworks import (
     get_declaration_status, get_last_modified_from_first_matching_file, register_interest_in_framework,
     get_supplier_on_framework_from_info, get_declaration_status_from_info, get_supplier_framework_info,
-    get_framework, get_framework_and_lot, count_drafts_by_lot, get_statuses_for_lot,
+    get_framework, get_framework_and_lot, get_statuses_for_lot,
     countersigned_framework_agreement_exists_in_bucket, return_supplier_framework_info_if_on_framework_or_abort,
     get_most_recently_uploaded_agreement_file_or_none
 )
 from ..helpers.validation import get_validator
 from ..helpers.services import (
-    get_signed_document_url, get_drafts, get_lot_drafts, count_unanswered_questions
+    get_signed_document_url, get_drafts_by_lot, get_lot_drafts, get_draft_summary, DRAFT_STATUS, COMPLETE_STATUS
 )
 from ..forms.frameworks import SignerDetailsForm, ContractReviewForm
 
@@ -48,7 +51,7 @@ def framework_dashboard(framework_slug):
 
         try:
             email_body = render_template('emails/{}_application_started.html'.format(framework_slug))
-            send_email(
+            send_batched_email(
                 [user['emailAddress'] for user in supplier_users['users'] if user['active']],
                 email_body,
                 'You have started your {} application'.format(framework['name']),
@@ -62,7 +65,8 @@ def framework_dashboard(framework_slug):
                 extra={'error': six.text_type(e), 'supplier_code': current_user.supplier_code}
             )
 
-    drafts, complete_drafts = get_drafts(data_api_client, framework_slug)
+    drafts_by_lot = get_drafts_by_lot(data_api_client, framework_slug)
+    drafts, complete_drafts = drafts_by_lot.with_status(DRAFT_STATUS), drafts_by_lot.with_status(COMPLETE_STATUS)
 
     supplier_framework_info = get_supplier_framework_info(data_api_client, framework_slug)
     declaration_status = get_declaration_status_from_info(supplier_framework_info)
@@ -72,7 +76,8 @@ def framework_dashboard(framework_slug):
     if declaration_status == 'unstarted' and framework['status'] == 'live':
         abort(404)
 
-    key_list = s3.S3(current_app.config['DM_COMMUNICATIONS_BUCKET']).list(framework_slug, load_timestamps=True)
+    communications_bucket = timed_client('s3', s3.S3(current_app.config['DM_COMMUNICATIONS_BUCKET']))
+    key_list = communications_bucket.list(framework_slug, load_timestamps=True)
     key_list.reverse()
 
     first_page = content_loader.get_manifest(
@@ -87,7 +92,9 @@ def framework_dashboard(framework_slug):
         countersigned_agreement_file = COUNTERSIGNED_AGREEMENT_FILENAME
 
     application_made = supplier_is_on_framework or (len(complete_drafts) > 0 and declaration_status == 'complete')
-    lots_with_completed_drafts = [lot for lot in framework['lots'] if count_drafts_by_lot(complete_drafts, lot['slug'])]
+    lots_with_completed_drafts = [
+        lot for lot in framework['lots'] if drafts_by_lot.count(lot['slug'], COMPLETE_STATUS)
+    ]
 
     last_modified = {
         'supplier_pack': get_last_modified_from_first_matching_file(
@@ -99,41 +106,56 @@ def framework_dashboard(framework_slug):
     }
 
     # if supplier has returned agreement for framework with framework_agreement_version, show contract_submitted page
-    if supplier_is_on_framework and framework['frameworkAgreementVersion'] and supplier_framework_info['agreementReturned']:  # noqa
-        agreements_bucket = s3.S3(current_app.config['DM_AGREEMENTS_BUCKET'])
+    contract_submitted = bool(
+        supplier_is_on_framework and framework['frameworkAgreementVersion'] and
+        supplier_framework_info['agreementReturned']
+    )
+    signature_page = None
+    if contract_submitted:
+        agreements_bucket = timed_client('s3', s3.S3(current_app.config['DM_AGREEMENTS_BUCKET']))
         signature_page = get_most_recently_uploaded_agreement_file_or_none(agreements_bucket, framework_slug)
 
+    def render():
+        if contract_submitted:
+            return render_template(
+                "frameworks/contract_submitted.html",
+                framework=framework,
+                framework_live_date=content_loader.get_message(framework_slug, 'dates')['framework_live_date'],
+                document_name='{}.{}'.format(SIGNED_AGREEMENT_PREFIX, signature_page['ext']),
+                supplier_framework=supplier_framework_info,
+                supplier_pack_filename=supplier_pack_filename,
+                last_modified=last_modified
+            ), 200
+
         return render_template(
-            "frameworks/contract_submitted.html",
+            "frameworks/dashboard.html",
+            application_made=application_made,
+            completed_lots=tuple(
+                dict(lot, complete_count=drafts_by_lot.count(lot['slug'], COMPLETE_STATUS))
+                for lot in lots_with_completed_drafts
+            ),
+            counts={
+                "draft": len(drafts),
+                "complete": len(complete_drafts)
+            },
+            dates=content_loader.get_message(framework_slug, 'dates'),
+            declaration_status=declaration_status,
+            first_page_of_declaration=first_page,
             framework=framework,
-            framework_live_date=content_loader.get_message(framework_slug, 'dates')['framework_live_date'],
-            document_name='{}.{}'.format(SIGNED_AGREEMENT_PREFIX, signature_page['ext']),
-            supplier_framework=supplier_framework_info,
+            last_modified=last_modified,
+            supplier_is_on_framework=supplier_is_on_framework,
             supplier_pack_filename=supplier_pack_filename,
-            last_modified=last_modified
+            result_letter_filename=result_letter_filename,
+            countersigned_agreement_file=countersigned_agreement_file
         ), 200
 
-    return render_template(
-        "frameworks/dashboard.html",
-        application_made=application_made,
-        completed_lots=tuple(
-            dict(lot, complete_count=count_drafts_by_lot(complete_drafts, lot['slug']))
-            for lot in lots_with_completed_drafts
-        ),
-        counts={
-            "draft": len(drafts),
-            "complete": len(complete_drafts)
-        },
-        dates=content_loader.get_message(framework_slug, 'dates'),
-        declaration_status=declaration_status,
-        first_page_of_declaration=first_page,
-        framework=framework,
-        last_modified=last_modified,
-        supplier_is_on_framework=supplier_is_on_framework,
-        supplier_pack_filename=supplier_pack_filename,
-        result_letter_filename=result_letter_filename,
-        countersigned_agreement_file=countersigned_agreement_file
-    ), 200
+    return conditional_response(
+        page_etag([
+            framework, drafts, complete_drafts, supplier_framework_info, last_modified,
+            countersigned_agreement_file, signature_page
+        ]),
+        render
+    )
 
 
 @main.route('/frameworks/<framework_slug>/submissions', methods=['GET'])
@@ -141,7 +163,8 @@ def framework_dashboard(framework_slug):
 def framework_submission_lots(framework_slug):
     framework = get_framework(data_api_client, framework_slug)
 
-    drafts, complete_drafts = get_drafts(data_api_client, framework_slug)
+    drafts_by_lot = get_drafts_by_lot(data_api_client, framework_slug)
+    drafts, complete_drafts = drafts_by_lot.with_status(DRAFT_STATUS), drafts_by_lot.with_status(COMPLETE_STATUS)
     declaration_status = get_declaration_status(data_api_client, framework_slug)
     application_made = len(complete_drafts) > 0 and declaration_status == 'complete'
     if framework['status'] not in ["open", "pending", "standstill"]:
@@ -149,11 +172,6 @@ def framework_submission_lots(framework_slug):
     if framework['status'] == 'pending' and not application_made:
         abort(404)
 
-    lots = [
-        dict(lot,
-             draft_count=count_drafts_by_lot(drafts, lot['slug']),
-             complete_count=count_drafts_by_lot(complete_drafts, lot['slug']))
-        for lot in framework['lots']]
     lot_question = {
         option["value"]: option
         for option in content_loader.get_question(framework_slug, 'services', 'lot')['options']
@@ -162,26 +180,17 @@ def framework_submission_lots(framework_slug):
         "title": lot_question[lot['slug']]['label'] if framework["status"] == "open" else lot["name"],
         'body': lot_question[lot['slug']]['description'],
         "link": url_for('.framework_submission_services', framework_slug=framework_slug, lot_slug=lot['slug']),
-        "statuses": get_statuses_for_lot(
-            lot['oneServiceLimit'],
-            lot['draft_count'],
-            lot['complete_count'],
-            declaration_status,
-            framework['status'],
-            lot['name'],
-            lot['unitSingular'],
-            lot['unitPlural']
-        ),
-    } for lot in lots if framework["status"] == "open" or (lot['draft_count'] + lot['complete_count']) > 0]
+        "statuses": get_statuses_for_lot(lot, drafts_by_lot, declaration_status, framework['status']),
+    } for lot in framework['lots'] if framework["status"] == "open" or drafts_by_lot.count(lot['slug']) > 0]
 
-    return render_template(
+    return stream_template(
         "frameworks/submission_lots.html",
         complete_drafts=list(reversed(complete_drafts)),
         drafts=list(reversed(drafts)),
         declaration_status=declaration_status,
         framework=framework,
         lots=lots,
-    ), 200
+    )
 
 
 @main.route('/frameworks/<framework_slug>/submissions/<lot_slug>', methods=['GET'])
@@ -206,18 +215,16 @@ def framework_submission_services(framework_slug, lot_slug):
                     framework_slug=framework_slug, lot_slug=lot_slug, service_id=draft['id'])
         )
 
+    content = content_loader.get_manifest(framework_slug, 'edit_submission')
     for draft in chain(drafts, complete_drafts):
-        draft['priceString'] = format_service_price(draft)
-        content = content_loader.get_manifest(framework_slug, 'edit_submission').filter(draft)
-        sections = content.summary(draft)
-
-        unanswered_required, unanswered_optional = count_unanswered_questions(sections)
+        summary = get_draft_summary(content, draft)
         draft.update({
-            'unanswered_required': unanswered_required,
-            'unanswered_optional': unanswered_optional,
+            'priceString': summary.price_string,
+            'unanswered_required': summary.unanswered_required,
+            'unanswered_optional': summary.unanswered_optional,
         })
 
-    return render_template_with_csrf(
+    return stream_template_with_csrf(
         "frameworks/services.html",
         complete_drafts=list(reversed(complete_drafts)),
         drafts=list(reversed(drafts)),
@@ -316,7 +323,7 @@ def framework_supplier_declaration(framework_slug, section_id=None):
 @main.route('/frameworks/<framework_slug>/files/<path:filepath>', methods=['GET'])
 @login_required
 def download_supplier_file(framework_slug, filepath):
-    uploader = s3.S3(current_app.config['DM_COMMUNICATIONS_BUCKET'])
+    uploader = timed_client('s3', s3.S3(current_app.config['DM_COMMUNICATIONS_BUCKET']))
     url = get_signed_document_url(uploader, "{}/communications/{}".format(framework_slug, filepath))
     if not url:
         abort(404)
@@ -331,7 +338,7 @@ def download_agreement_file(framework_slug, document_name):
     if supplier_framework_info is None or not supplier_framework_info.get("declaration"):
         abort(404)
 
-    agreements_bucket = s3.S3(current_app.config['DM_AGREEMENTS_BUCKET'])
+    agreements_bucket = timed_client('s3', s3.S3(current_app.config['DM_AGREEMENTS_BUCKET']))
     path = get_agreement_document_path(framework_slug, current_user.supplier_code, document_name)
     url = get_signed_url(agreements_bucket, path, current_app.config['DM_ASSETS_URL'])
     if not url:
@@ -350,7 +357,7 @@ def framework_updates(framework_slug, error_message=None, default_textbox_value=
                                    'user_id': current_user.id,
                                    'supplier_code': current_user.supplier_code})
 
-    communications_bucket = s3.S3(current_app.config['DM_COMMUNICATIONS_BUCKET'])
+    communications_bucket = timed_client('s3', s3.S3(current_app.config['DM_COMMUNICATIONS_BUCKET']))
     file_list = communications_bucket.list('{}/communications/updates/'.format(framework_slug), load_timestamps=True)
     files = {
         'communications': [],
@@ -474,7 +481,8 @@ def framework_updates_email_clarification_question(framework_slug):
         # Zendesk will handle this instead
         audit_type = AuditTypes.send_application_question
 
-    data_api_client.create_audit_event(
+    create_audit_event(
+        data_api_client,
         audit_type=audit_type,
         user=current_user.email_address,
         object_type="suppliers",
@@ -498,9 +506,9 @@ def framework_agreement(framework_slug):
 
     # if there's a frameworkAgreementVersion key, it means we're on G-Cloud 8 or higher
     if framework.get('frameworkAgreementVersion'):
-        drafts, complete_drafts = get_drafts(data_api_client, framework_slug)
+        drafts_by_lot = get_drafts_by_lot(data_api_client, framework_slug)
         lots_with_completed_drafts = [
-            lot for lot in framework['lots'] if count_drafts_by_lot(complete_drafts, lot['slug'])
+            lot for lot in framework['lots'] if drafts_by_lot.count(lot['slug'], COMPLETE_STATUS)
         ]
 
         return render_template(
@@ -544,7 +552,7 @@ def upload_framework_agreement(framework_slug):
             agreement_filename=AGREEMENT_FILENAME
         )
 
-    agreements_bucket = s3.S3(current_app.config['DM_AGREEMENTS_BUCKET'])
+    agreements_bucket = timed_client('s3', s3.S3(current_app.config['DM_AGREEMENTS_BUCKET']))
     extension = get_extension(request.files['agreement'].filename)
 
     path = get_agreement_document_path(
@@ -650,7 +658,7 @@ def signer_details(framework_slug):
 def signature_upload(framework_slug):
     framework = get_framework(data_api_client, framework_slug)
     return_supplier_framework_info_if_on_framework_or_abort(data_api_client, framework_slug)
-    agreements_bucket = s3.S3(current_app.config['DM_AGREEMENTS_BUCKET'])
+    agreements_bucket = timed_client('s3', s3.S3(current_app.config['DM_AGREEMENTS_BUCKET']))
     signature_page = get_most_recently_uploaded_agreement_file_or_none(agreements_bucket, framework_slug)
     upload_error = None
 
@@ -680,7 +688,8 @@ def signature_upload(framework_slug):
 
             session['signature_page'] = request.files['signature_page'].filename
 
-            data_api_client.create_audit_event(
+            create_audit_event(
+                data_api_client,
                 audit_type=AuditTypes.upload_signed_agreement,
                 user=current_user.email_address,
                 object_type="suppliers",
@@ -707,7 +716,7 @@ def signature_upload(framework_slug):
 def contract_review(framework_slug):
     framework = get_framework(data_api_client, framework_slug)
     supplier_framework = return_supplier_framework_info_if_on_framework_or_abort(data_api_client, framework_slug)
-    agreements_bucket = s3.S3(current_app.config['DM_AGREEMENTS_BUCKET'])
+    agreements_bucket = timed_client('s3', s3.S3(current_app.config['DM_AGREEMENTS_BUCKET']))
     signature_page = get_most_recently_uploaded_agreement_file_or_none(agreements_bucket, framework_slug)
 
     # if supplier_framework doesn't have a name or a role or the agreement file, then 404
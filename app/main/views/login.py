@@ -2,20 +2,25 @@ from __future__ import absolute_import
 import six
 import flask_featureflags
 
-from flask_login import current_user, login_user
+from flask_login import current_user
 from flask import current_app, flash, make_response, redirect, render_template, request, url_for, abort
 
 from dmapiclient import HTTPError
 from dmapiclient.audit import AuditTypes
 from dmutils.user import User
-from dmutils.email import EmailError, generate_token, hash_email, InvalidToken, send_email
+from dmutils.email import EmailError, generate_token, hash_email, InvalidToken
 from dmutils.forms import render_template_with_csrf
 
 from app import data_api_client
 from app.main import main
 from app.main.forms.auth_forms import EmailAddressForm, CreateUserForm
 from app.main.helpers import login_required
-from app.main.helpers.users import decode_supplier_invitation_token, generate_supplier_invitation_token
+from app.main.helpers.users import (
+    decode_supplier_invitation_token, forget_invited_user, generate_supplier_invitation_token, get_invited_user,
+    login_user
+)
+from app.audit import create_audit_event
+from app.outbox import send_email
 
 
 def get_create_user_data(token):
@@ -45,7 +50,7 @@ def get_create_user_data(token):
 def create_user(token):
     data = get_create_user_data(token)
 
-    user_json = data_api_client.get_user(email_address=data['emailAddress'])
+    user_json = get_invited_user(data_api_client, data['emailAddress'])
 
     if not user_json:
         form = CreateUserForm(name=data['name'])
@@ -82,6 +87,7 @@ def submit_create_user(token):
     if token == 'fake-token':
         return redirect('/')
 
+    forget_invited_user(data['emailAddress'])
     try:
         user = data_api_client.create_user({
             'name': form.name.data,
@@ -152,7 +158,8 @@ def send_invite_user():
                        'email_hash': hash_email(current_user.email_address)})
             abort(503, 'Failed to send user invite reset')
 
-        data_api_client.create_audit_event(
+        create_audit_event(
+            data_api_client,
             audit_type=AuditTypes.invite_user,
             user=current_user.email_address,
             object_type='suppliers',
@@ -1,12 +1,14 @@
 from flask_login import current_user
-from flask import render_template, request, redirect, url_for, abort, flash, current_app
+from flask import request, redirect, url_for, abort, flash, current_app
 import flask_featureflags
 
 from ... import data_api_client
 from ...main import main, content_loader
+from ...metrics import timed_client
+from ...templating import stream_template
 from ..helpers import login_required
-from ..helpers.services import is_service_associated_with_supplier, get_signed_document_url, count_unanswered_questions, \
-    get_next_section_name
+from ..helpers.services import is_service_associated_with_supplier, get_signed_document_url, get_draft_summary, \
+    get_next_section_name, get_page_number
 from ..helpers.frameworks import get_framework_and_lot, get_declaration_status
 
 from dmapiclient import HTTPError
@@ -18,16 +20,39 @@ from dmutils.forms import render_template_with_csrf
 @main.route('/services')
 @login_required
 def list_services():
-    suppliers_services = data_api_client.find_services(supplier_code=current_user.supplier_code)["services"]
-    sorted_services = sorted(
-        suppliers_services,
-        key=lambda service: service['frameworkSlug'],
-        reverse=True
-    )
+    try:
+        page = int(request.args.get('page', 1))
+    except ValueError:
+        abort(400)
+    if page < 1:
+        abort(400)
 
-    return render_template(
+    framework_slug = request.args.get('framework') or None
+    search_kwargs = {'supplier_code': current_user.supplier_code, 'page': page}
+    if framework_slug:
+        search_kwargs['framework'] = framework_slug
+
+    # Only the requested page is fetched and rendered. The API can't be asked for an order, so services are
+    # sorted newest framework first within each page, rather than across all of them as before paging.
+    services = data_api_client.find_services(**search_kwargs)
+    links = services.get('links', {})
+    last_page = get_page_number(links.get('last')) or page
+
+    def page_link(page_number, title):
+        if page_number is None:
+            return None
+        return {
+            'url': url_for('.list_services', page=page_number, framework=framework_slug),
+            'title': title,
+            'label': 'Page {} of {}'.format(page_number, last_page),
+        }
+
+    return stream_template(
         "services/list_services.html",
-        services=sorted_services), 200
+        services=sorted(services["services"], key=lambda service: service['frameworkSlug'], reverse=True),
+        framework_slug=framework_slug,
+        previous_page=page_link(get_page_number(links.get('prev')), 'Previous page'),
+        next_page=page_link(get_page_number(links.get('next')), 'Next page'))
 
 
 #  #######################  EDITING LIVE SERVICES #############################
@@ -327,7 +352,7 @@ def service_submission_document(framework_slug, supplier_code, document_name):
     if current_user.supplier_code != supplier_code:
         abort(404)
 
-    uploader = s3.S3(current_app.config['DM_SUBMISSIONS_BUCKET'])
+    uploader = timed_client('s3', s3.S3(current_app.config['DM_SUBMISSIONS_BUCKET']))
     s3_url = get_signed_document_url(uploader,
                                      "{}/submissions/{}/{}".format(framework_slug, supplier_code, document_name))
     if not s3_url:
@@ -353,11 +378,7 @@ def view_service_submission(framework_slug, lot_slug, service_id):
     if not is_service_associated_with_supplier(draft):
         abort(404)
 
-    content = content_loader.get_manifest(framework['slug'], 'edit_submission').filter(draft)
-
-    sections = content.summary(draft)
-
-    unanswered_required, unanswered_optional = count_unanswered_questions(sections)
+    summary = get_draft_summary(content_loader.get_manifest(framework['slug'], 'edit_submission'), draft)
     delete_requested = True if request.args.get('delete_requested') else False
 
     return render_template_with_csrf(
@@ -368,9 +389,9 @@ def view_service_submission(framework_slug, lot_slug, service_id):
         service_id=service_id,
         service_data=draft,
         last_edit=last_edit,
-        sections=sections,
-        unanswered_required=unanswered_required,
-        unanswered_optional=unanswered_optional,
+        sections=summary.sections,
+        unanswered_required=summary.unanswered_required,
+        unanswered_optional=summary.unanswered_optional,
         can_mark_complete=not validation_errors,
         delete_requested=delete_requested,
         declaration_status=get_declaration_status(data_api_client, framework['slug']),
@@ -447,7 +468,7 @@ def update_section_submission(framework_slug, lot_slug, service_id, section_id,
     errors = None
     update_data = section.get_data(request.form)
 
-    uploader = s3.S3(current_app.config['DM_SUBMISSIONS_BUCKET'])
+    uploader = timed_client('s3', s3.S3(current_app.config['DM_SUBMISSIONS_BUCKET']))
     documents_url = url_for('.dashboard', _external=True) + '/assets/'
     uploaded_documents, document_errors = upload_service_documents(
         uploader, documents_url, draft, request.files, section,
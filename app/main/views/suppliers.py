@@ -8,12 +8,15 @@ import six
 
 from dmapiclient import APIError
 from dmapiclient.audit import AuditTypes
-from dmutils.email import send_email, generate_token, EmailError
+from dmutils.email import generate_token, EmailError
 from dmutils.forms import render_template_with_csrf
 from dmcontent.content_loader import ContentNotFoundError
 
 from ...main import main, content_loader
 from ... import data_api_client
+from ...audit import create_audit_event
+from ...outbox import send_email
+from ...templating import conditional_response, page_etag
 from ..forms.suppliers import (
     EditSupplierForm, EditContactInformationForm, DunsNumberForm, CompaniesHouseNumberForm,
     CompanyContactDetailsForm, CompanyNameForm, EmailAddressForm
@@ -41,42 +44,49 @@ def dashboard():
         framework['frameworkSlug']: framework
         for framework in data_api_client.get_supplier_frameworks(current_user.supplier_code)['frameworkInterest']
     }
+    users = get_current_suppliers_users()
 
-    for framework in all_frameworks:
-        framework.update(
-            supplier_frameworks.get(framework['slug'], {})
-        )
-        dates = {}
-        try:
-            dates = content_loader.get_message(framework['slug'], 'dates')
-        except ContentNotFoundError:
-            pass
-        framework.update({
-            'dates': dates,
-            'deadline': Markup("Deadline: {}".format(dates.get('framework_close_date', ''))),
-            'registered_interest': (framework['slug'] in supplier_frameworks),
-            'made_application': (
-                framework.get('declaration') and
-                framework['declaration'].get('status') == 'complete' and
-                framework.get('complete_drafts_count') > 0
-            ),
-            'needs_to_complete_declaration': (
-                framework.get('onFramework') and
-                framework.get('agreementReturned') is False
+    def render():
+        for framework in all_frameworks:
+            framework.update(
+                supplier_frameworks.get(framework['slug'], {})
             )
-        })
+            dates = {}
+            try:
+                dates = content_loader.get_message(framework['slug'], 'dates')
+            except ContentNotFoundError:
+                pass
+            framework.update({
+                'dates': dates,
+                'deadline': Markup("Deadline: {}".format(dates.get('framework_close_date', ''))),
+                'registered_interest': (framework['slug'] in supplier_frameworks),
+                'made_application': (
+                    framework.get('declaration') and
+                    framework['declaration'].get('status') == 'complete' and
+                    framework.get('complete_drafts_count') > 0
+                ),
+                'needs_to_complete_declaration': (
+                    framework.get('onFramework') and
+                    framework.get('agreementReturned') is False
+                )
+            })
 
-    return render_template_with_csrf(
-        "suppliers/dashboard.html",
-        supplier=supplier,
-        users=get_current_suppliers_users(),
-        frameworks={
-            'coming': get_frameworks_by_status(all_frameworks, 'coming'),
-            'open': get_frameworks_by_status(all_frameworks, 'open'),
-            'pending': get_frameworks_by_status(all_frameworks, 'pending'),
-            'standstill': get_frameworks_by_status(all_frameworks, 'standstill', 'made_application'),
-            'live': get_frameworks_by_status(all_frameworks, 'live', 'services_count')
-        }
+        return render_template_with_csrf(
+            "suppliers/dashboard.html",
+            supplier=supplier,
+            users=users,
+            frameworks={
+                'coming': get_frameworks_by_status(all_frameworks, 'coming'),
+                'open': get_frameworks_by_status(all_frameworks, 'open'),
+                'pending': get_frameworks_by_status(all_frameworks, 'pending'),
+                'standstill': get_frameworks_by_status(all_frameworks, 'standstill', 'made_application'),
+                'live': get_frameworks_by_status(all_frameworks, 'live', 'services_count')
+            }
+        )
+
+    return conditional_response(
+        page_etag([supplier, all_frameworks, supplier_frameworks, users], csrf=True),
+        render
     )
 
 
@@ -397,7 +407,8 @@ def submit_company_summary():
                     'email_hash': hash_email(account_email_address)})
             abort(503, "Failed to send user creation email")
 
-        data_api_client.create_audit_event(
+        create_audit_event(
+            data_api_client,
             audit_type=AuditTypes.invite_user,
             object_type='suppliers',
             object_id=session['email_supplier_code'],
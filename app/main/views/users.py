@@ -5,6 +5,7 @@ from flask import render_template, abort, flash, url_for, redirect, current_app
 from dmutils.forms import render_template_with_csrf
 
 from ..helpers import login_required
+from ..helpers.users import forget_user
 from ...main import main
 from ... import data_api_client
 
@@ -77,6 +78,7 @@ def deactivate_user(user_id):
         abort(404)
 
     data_api_client.update_user(user_id=user_to_deactivate['id'], active=False, updater=current_user.email_address)
+    forget_user(user_to_deactivate['id'])
 
     flash({
         'deactivate_user_name': user_to_deactivate['name'],
@@ -0,0 +1,349 @@
+import binascii
+import bisect
+import functools
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, request
+
+from app.cache import TTLCache
+from app.workers import Worker, WorkerHandle
+
+
+# Request latencies, response codes, calls to the Data API, S3 and email, template render times and cache hits are
+# counted in each process and served from /_metrics in the Prometheus text format.
+#
+# With DM_METRICS_DIR set, each process writes its metrics there every DM_METRICS_WRITE_INTERVAL seconds, and
+# /_metrics adds up the metrics of every process, so any worker can answer for all of them. Files that haven't been
+# written for DM_METRICS_MAX_AGE seconds belong to processes that have exited, and are deleted, which Prometheus sees
+# as a counter reset.
+#
+# Calls to the Data API are timed by wrapping the app's client. Other upstream calls are timed where they are made,
+# with `upstream_call` or `timed_client`.
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+HELP = {
+    'dm_request_duration_seconds': 'Time taken to handle requests, by endpoint',
+    'dm_responses_total': 'Responses sent, by endpoint and status code',
+    'dm_upstream_duration_seconds': 'Time taken by calls to the Data API, S3 and email',
+    'dm_upstream_errors_total': 'Calls to the Data API, S3 and email that raised an error',
+    'dm_template_render_seconds': 'Time taken to render templates',
+    'dm_cache_requests_total': 'Cache lookups, by cache and whether they were hits',
+}
+
+
+def _key(labels):
+    return json.dumps(sorted(labels.items()))
+
+
+class Metrics(object):
+    """Counters and histograms, updated under one lock that is only held to add to them."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, labels, amount=1):
+        key = _key(labels)
+        with self._lock:
+            values = self._counters.setdefault(name, {})
+            values[key] = values.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        key = _key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._histograms.setdefault(name, {})
+            histogram = values.get(key)
+            if histogram is None:
+                histogram = values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': dict((name, dict(values)) for name, values in self._counters.items()),
+                'histograms': dict(
+                    (name, dict((key, [list(h[0]), h[1], h[2]]) for key, h in values.items()))
+                    for name, values in self._histograms.items()
+                ),
+            }
+
+
+def merge_snapshots(snapshots):
+    merged = {'counters': {}, 'histograms': {}}
+    for snapshot in snapshots:
+        for name, values in snapshot['counters'].items():
+            totals = merged['counters'].setdefault(name, {})
+            for key, value in values.items():
+                totals[key] = totals.get(key, 0) + value
+        for name, values in snapshot['histograms'].items():
+            totals = merged['histograms'].setdefault(name, {})
+            for key, (bucket_counts, total, count) in values.items():
+                if key not in totals:
+                    totals[key] = [list(bucket_counts), total, count]
+                else:
+                    histogram = totals[key]
+                    histogram[0] = [a + b for a, b in zip(histogram[0], bucket_counts)]
+                    histogram[1] += total
+                    histogram[2] += count
+    return merged
+
+
+def _format_labels(key, **extra):
+    labels = json.loads(key) + sorted(extra.items())
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in labels
+    ) + '}'
+
+
+def exposition(snapshot, buckets=LATENCY_BUCKETS):
+    """Formats a snapshot in the Prometheus text format."""
+    lines = []
+    for name, values in sorted(snapshot['counters'].items()):
+        lines.append('# HELP {} {}'.format(name, HELP.get(name, name)))
+        lines.append('# TYPE {} counter'.format(name))
+        for key, value in sorted(values.items()):
+            lines.append('{}{} {}'.format(name, _format_labels(key), value))
+
+    for name, values in sorted(snapshot['histograms'].items()):
+        lines.append('# HELP {} {}'.format(name, HELP.get(name, name)))
+        lines.append('# TYPE {} histogram'.format(name))
+        for key, (bucket_counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for upper_bound, bucket_count in zip(buckets + ['+Inf'], bucket_counts):
+                cumulative += bucket_count
+                lines.append('{}_bucket{} {}'.format(name, _format_labels(key, le=upper_bound), cumulative))
+            lines.append('{}_sum{} {}'.format(name, _format_labels(key), total))
+            lines.append('{}_count{} {}'.format(name, _format_labels(key), count))
+
+    return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def upstream_call(service, operation):
+    """Records the time taken by the code it wraps, and any error it raises, as a call to an upstream service."""
+    state = current_app.extensions.get('metrics') if has_app_context() else None
+    if state is None:
+        yield
+        return
+
+    labels = {'service': service, 'operation': operation}
+    start = time.time()
+    try:
+        yield
+    except Exception:
+        state.metrics.increment('dm_upstream_errors_total', labels)
+        raise
+    finally:
+        state.metrics.observe('dm_upstream_duration_seconds', labels, time.time() - start)
+
+
+def timed(service, operation, function):
+    """Wraps `function` so that its calls are recorded as calls to an upstream service."""
+    @functools.wraps(function)
+    def timed_function(*args, **kwargs):
+        with upstream_call(service, operation):
+            return function(*args, **kwargs)
+
+    timed_function.metrics_timed = True
+    return timed_function
+
+
+class _TimedClient(object):
+    def __init__(self, service, client):
+        self._service = service
+        self._client = client
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if name.startswith('_') or not callable(attribute):
+            return attribute
+        return timed(self._service, name, attribute)
+
+
+def timed_client(service, client):
+    """Returns `client`, for example an S3 bucket, with calls to its methods recorded as calls to `service`."""
+    return _TimedClient(service, client)
+
+
+def instrument_data_api_client(data_api_client):
+    for name in dir(data_api_client):
+        method = getattr(data_api_client, name)
+        if name.startswith('_') or name == 'init_app' or not callable(method):
+            continue
+        if not getattr(method, 'metrics_timed', False):
+            setattr(data_api_client, name, timed('data_api', name, method))
+
+
+def instrument_templates(metrics, app):
+    base_template_class = app.jinja_env.template_class
+
+    class TimedTemplate(base_template_class):
+        def render(self, *args, **kwargs):
+            start = time.time()
+            try:
+                return super(TimedTemplate, self).render(*args, **kwargs)
+            finally:
+                metrics.observe('dm_template_render_seconds', {'template': self.name}, time.time() - start)
+
+        def generate(self, *args, **kwargs):
+            # Streamed pages are rendered a chunk at a time, so only the time spent rendering chunks is counted,
+            # not the time spent sending them
+            chunks = super(TimedTemplate, self).generate(*args, **kwargs)
+            elapsed = 0.0
+            try:
+                while True:
+                    start = time.time()
+                    try:
+                        chunk = next(chunks)
+                    except StopIteration:
+                        return
+                    finally:
+                        elapsed += time.time() - start
+                    yield chunk
+            finally:
+                metrics.observe('dm_template_render_seconds', {'template': self.name}, elapsed)
+
+    app.jinja_env.template_class = TimedTemplate
+
+
+def _caches(app):
+    caches = dict((name, cache) for name, cache in app.extensions.items() if isinstance(cache, TTLCache))
+    fragment_cache = getattr(app.jinja_env, 'fragment_cache', None)
+    if fragment_cache is not None:
+        caches['fragments'] = fragment_cache
+    return caches
+
+
+class MetricsWriter(Worker):
+    """Writes this process's metrics to DM_METRICS_DIR every DM_METRICS_WRITE_INTERVAL seconds."""
+    error_message = 'Writing metrics failed'
+
+    def __init__(self, app):
+        super(MetricsWriter, self).__init__(app, 'metrics-writer', app.config['DM_METRICS_WRITE_INTERVAL'])
+
+    def work(self):
+        write_snapshot(self.app)
+
+
+class _MetricsState(object):
+    def __init__(self, app, metrics):
+        self.metrics = metrics
+        self.writer = WorkerHandle(lambda: MetricsWriter(app))
+        self._pid = None
+        self._process_id = None
+
+    @property
+    def process_id(self):
+        """Identifies this process's metrics file. A new process with a reused PID doesn't overwrite an old file."""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._process_id = '{}-{}'.format(self._pid, binascii.hexlify(os.urandom(4)).decode('ascii'))
+        return self._process_id
+
+
+def process_snapshot(app):
+    """This process's metrics, including the hit counts of its caches."""
+    snapshot = app.extensions['metrics'].metrics.snapshot()
+    cache_requests = snapshot['counters'].setdefault('dm_cache_requests_total', {})
+    for name, cache in _caches(app).items():
+        cache_requests[_key({'cache': name, 'result': 'hit'})] = cache.hits
+        cache_requests[_key({'cache': name, 'result': 'miss'})] = cache.misses
+    return snapshot
+
+
+def _snapshot_path(app):
+    return os.path.join(app.config['DM_METRICS_DIR'], 'metrics-{}.json'.format(app.extensions['metrics'].process_id))
+
+
+def write_snapshot(app):
+    path = _snapshot_path(app)
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w') as snapshot_file:
+        json.dump(process_snapshot(app), snapshot_file)
+    os.rename(temporary_path, path)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        # Another process has already removed it
+        pass
+
+
+def all_snapshots(app):
+    """
+    The metrics of this process and, with DM_METRICS_DIR set, of every other process that has written them in the
+    last DM_METRICS_MAX_AGE seconds. Older files are deleted.
+    """
+    snapshots = [process_snapshot(app)]
+    if not app.config['DM_METRICS_DIR']:
+        return snapshots
+
+    own_path = _snapshot_path(app)
+    oldest = time.time() - app.config['DM_METRICS_MAX_AGE']
+    for path in glob.glob(os.path.join(app.config['DM_METRICS_DIR'], 'metrics-*.json')):
+        if path == own_path:
+            continue
+        try:
+            if os.path.getmtime(path) < oldest:
+                _remove(path)
+                continue
+            with open(path) as snapshot_file:
+                snapshots.append(json.load(snapshot_file))
+        except (IOError, OSError, ValueError):
+            app.logger.warning('Could not read metrics file {path}', extra={'path': path})
+    return snapshots
+
+
+def init_metrics(app, data_api_client):
+    if not app.config['DM_METRICS_ENABLED']:
+        return
+
+    metrics = Metrics()
+    app.extensions['metrics'] = state = _MetricsState(app, metrics)
+    instrument_data_api_client(data_api_client)
+    instrument_templates(metrics, app)
+
+    if app.config['DM_METRICS_DIR']:
+        if not os.path.isdir(app.config['DM_METRICS_DIR']):
+            os.makedirs(app.config['DM_METRICS_DIR'])
+
+        @app.before_first_request
+        def start_metrics_writer():
+            state.writer.start()
+
+    def record(status_code):
+        started_at = g.pop('metrics_started_at', None)
+        if started_at is None:
+            return
+        endpoint = request.endpoint or 'none'
+        metrics.observe('dm_request_duration_seconds', {'endpoint': endpoint}, time.time() - started_at)
+        metrics.increment('dm_responses_total', {'endpoint': endpoint, 'status': status_code})
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started_at = time.time()
+
+    @app.after_request
+    def record_response(response):
+        record(response.status_code)
+        return response
+
+    @app.teardown_request
+    def record_unhandled_error(exception=None):
+        # Responses to unhandled errors don't go through after_request
+        record(500)
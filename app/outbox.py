@@ -0,0 +1,451 @@
+from __future__ import print_function
+
+import hashlib
+import json
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import closing
+
+import six
+from flask import current_app
+from flask_script import Manager
+
+from dmutils import email
+
+from app.metrics import upstream_call
+from app.workers import Worker, WorkerHandle
+
+
+# Emails sent from requests are written to an outbox and delivered by a background thread, so a slow or failing
+# mail provider does not hold up (or fail) the request.
+#
+# The outbox is a SQLite database at DM_EMAIL_OUTBOX_PATH, so queued emails survive restarts. If it is not set,
+# emails are sent during the request as before. Every web process runs a delivery thread, which delivers whatever is
+# due as soon as it starts, then every DM_EMAIL_OUTBOX_POLL_INTERVAL seconds or when an email is queued. Messages are
+# claimed before they are sent, so each is delivered by one process. Failed deliveries are retried with exponential
+# backoff, and given up on (and logged) after DM_EMAIL_OUTBOX_MAX_ATTEMPTS.
+#
+# Emails that many suppliers are sent at once, like "application started", can be sent in batches instead, so that
+# a spike of them is queued together rather than from each request. Each call waits in the outbox for up to
+# DM_EMAIL_BATCH_WINDOW seconds, or until DM_EMAIL_BATCH_SIZE recipients are waiting, and is then queued as one email
+# to the recipients it was called with, as it would have been sent without batching. Anyone already sent the same
+# email by an earlier call in the batch is left out. Each recipient's status (waiting, queued, sent or failed) is kept
+# for DM_EMAIL_BATCH_RETENTION seconds.
+#
+# To see what is queued and what has failed:
+# $ python application.py outbox status
+#
+# To deliver everything that is due now, or to queue failed emails again:
+# $ python application.py outbox deliver
+# $ python application.py outbox retry
+#
+# Run this for more docs:
+# $ python application.py outbox -?
+
+PENDING = 'pending'
+SENDING = 'sending'
+FAILED = 'failed'
+WAITING = 'waiting'
+QUEUED = 'queued'
+SENT = 'sent'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    message TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    claimed_at REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+CREATE TABLE IF NOT EXISTS batch_recipients (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_key TEXT NOT NULL,
+    call_key TEXT NOT NULL,
+    message TEXT NOT NULL,
+    email_address TEXT NOT NULL,
+    status TEXT NOT NULL,
+    outbox_id INTEGER,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS batch_recipients_waiting ON batch_recipients (status, batch_key, created_at);
+CREATE INDEX IF NOT EXISTS batch_recipients_outbox ON batch_recipients (outbox_id);
+'''
+
+
+class Outbox(object):
+    """
+    A durable queue of emails, stored in SQLite.
+
+    Each operation uses its own connection, so an outbox can be shared by threads and by processes.
+    """
+    def __init__(self, path, claim_timeout=600, timer=time.time):
+        self.path = path
+        # A message claimed longer ago than this was lost by a process that died while sending it
+        self.claim_timeout = claim_timeout
+        self._timer = timer
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.path, timeout=30, isolation_level=None))
+
+    def enqueue(self, message):
+        now = self._timer()
+        with self._connect() as connection:
+            return connection.execute(
+                'INSERT INTO outbox (message, status, next_attempt_at, created_at) VALUES (?, ?, ?, ?)',
+                (json.dumps(message), PENDING, now, now)
+            ).lastrowid
+
+    def claim_due(self, limit=10):
+        """Claims up to `limit` messages that are due for delivery, returning (id, attempts, message) tuples."""
+        now = self._timer()
+        due = '((status = ? AND next_attempt_at <= ?) OR (status = ? AND claimed_at <= ?))'
+        due_parameters = (PENDING, now, SENDING, now - self.claim_timeout)
+        claimed = []
+        with self._connect() as connection:
+            candidates = connection.execute(
+                'SELECT id, attempts, message FROM outbox WHERE ' + due + ' ORDER BY next_attempt_at LIMIT ?',
+                due_parameters + (limit,)
+            ).fetchall()
+            for message_id, attempts, message in candidates:
+                # Another process may have claimed the message since it was selected
+                updated = connection.execute(
+                    'UPDATE outbox SET status = ?, claimed_at = ? WHERE id = ? AND ' + due,
+                    (SENDING, now, message_id) + due_parameters
+                ).rowcount
+                if updated:
+                    claimed.append((message_id, attempts, json.loads(message)))
+
+        return claimed
+
+    def add_to_batch(self, message, email_addresses):
+        """
+        Adds `message`, which has no `to_email_addresses`, to the batch for that message. It will be sent as one email
+        to `email_addresses`.
+        """
+        now = self._timer()
+        encoded = json.dumps(message, sort_keys=True)
+        batch_key = hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+        call_key = uuid.uuid4().hex
+        with self._connect() as connection:
+            connection.executemany(
+                'INSERT INTO batch_recipients (batch_key, call_key, message, email_address, status, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [(batch_key, call_key, encoded, email_address, WAITING, now) for email_address in email_addresses]
+            )
+
+    def close_batches(self, window, size):
+        """
+        Queues the emails in each batch that has `size` recipients, or whose first recipient has waited `window`
+        seconds. Each call to `add_to_batch` is queued as one email to its recipients, leaving out anyone an earlier
+        email in the batch is already going to. Those recipients follow the status of the earlier email.
+
+        Returns the number of emails queued.
+        """
+        now = self._timer()
+        queued = 0
+        with self._connect() as connection:
+            # Stops two processes closing the same batch
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                batches = connection.execute(
+                    'SELECT batch_key, message, COUNT(*), MIN(created_at) FROM batch_recipients '
+                    'WHERE status = ? GROUP BY batch_key',
+                    (WAITING,)
+                ).fetchall()
+                for batch_key, message, count, oldest in batches:
+                    if count < size and oldest > now - window:
+                        continue
+
+                    calls = OrderedDict()
+                    for recipient_id, call_key, email_address in connection.execute(
+                        'SELECT id, call_key, email_address FROM batch_recipients '
+                        'WHERE status = ? AND batch_key = ? ORDER BY id',
+                        (WAITING, batch_key)
+                    ).fetchall():
+                        calls.setdefault(call_key, []).append((recipient_id, email_address))
+
+                    outbox_ids = {}
+                    for recipients in calls.values():
+                        new_addresses = []
+                        for _, email_address in recipients:
+                            if email_address.lower() not in outbox_ids:
+                                outbox_ids[email_address.lower()] = None
+                                new_addresses.append(email_address)
+
+                        if new_addresses:
+                            outbox_id = connection.execute(
+                                'INSERT INTO outbox (message, status, next_attempt_at, created_at) VALUES (?, ?, ?, ?)',
+                                (json.dumps(dict(json.loads(message), to_email_addresses=new_addresses)),
+                                 PENDING, now, now)
+                            ).lastrowid
+                            outbox_ids.update((email_address.lower(), outbox_id) for email_address in new_addresses)
+                            queued += 1
+
+                        connection.executemany(
+                            'UPDATE batch_recipients SET status = ?, outbox_id = ? WHERE id = ?',
+                            [(QUEUED, outbox_ids[email_address.lower()], recipient_id)
+                             for recipient_id, email_address in recipients]
+                        )
+
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+
+        return queued
+
+    def prune_recipients(self, retention):
+        with self._connect() as connection:
+            connection.execute(
+                'DELETE FROM batch_recipients WHERE status IN (?, ?) AND created_at < ?',
+                (SENT, FAILED, self._timer() - retention)
+            )
+
+    def recipient_counts(self):
+        with self._connect() as connection:
+            return dict(connection.execute(
+                'SELECT status, COUNT(*) FROM batch_recipients GROUP BY status'
+            ).fetchall())
+
+    def mark_sent(self, message_id):
+        with self._connect() as connection:
+            connection.execute('DELETE FROM outbox WHERE id = ?', (message_id,))
+            connection.execute('UPDATE batch_recipients SET status = ? WHERE outbox_id = ?', (SENT, message_id))
+
+    def mark_retry(self, message_id, error, delay):
+        with self._connect() as connection:
+            connection.execute(
+                'UPDATE outbox SET status = ?, attempts = attempts + 1, next_attempt_at = ?, last_error = ? '
+                'WHERE id = ?',
+                (PENDING, self._timer() + delay, error, message_id)
+            )
+
+    def mark_failed(self, message_id, error):
+        with self._connect() as connection:
+            connection.execute(
+                'UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = ? WHERE id = ?',
+                (FAILED, error, message_id)
+            )
+            connection.execute('UPDATE batch_recipients SET status = ? WHERE outbox_id = ?', (FAILED, message_id))
+
+    def retry_failed(self):
+        with self._connect() as connection:
+            retried = connection.execute(
+                'UPDATE outbox SET status = ?, attempts = 0, next_attempt_at = ? WHERE status = ?',
+                (PENDING, self._timer(), FAILED)
+            ).rowcount
+            connection.execute(
+                'UPDATE batch_recipients SET status = ? WHERE status = ? AND outbox_id IN '
+                '(SELECT id FROM outbox WHERE status = ?)',
+                (QUEUED, FAILED, PENDING)
+            )
+            return retried
+
+    def counts(self):
+        with self._connect() as connection:
+            return dict(connection.execute('SELECT status, COUNT(*) FROM outbox GROUP BY status').fetchall())
+
+    def failed(self):
+        with self._connect() as connection:
+            return connection.execute(
+                'SELECT id, attempts, last_error, message, created_at FROM outbox WHERE status = ? ORDER BY id',
+                (FAILED,)
+            ).fetchall()
+
+
+def retry_delay(app, attempts):
+    return min(
+        app.config['DM_EMAIL_OUTBOX_RETRY_DELAY'] * 2 ** attempts,
+        app.config['DM_EMAIL_OUTBOX_MAX_RETRY_DELAY']
+    )
+
+
+def deliver_due(app, outbox):
+    """Sends the messages that are due, returning the number that were sent."""
+    sent = 0
+    while True:
+        claimed = outbox.claim_due()
+        if not claimed:
+            return sent
+
+        for message_id, attempts, message in claimed:
+            try:
+                with app.app_context(), upstream_call('email', 'send_email'):
+                    email.send_email(**message)
+            except Exception as e:
+                # Anything else going wrong is retried the same way, so it can't leave the message claimed or stop
+                # the rest being sent
+                error = six.text_type(e) if isinstance(e, email.EmailError) else u'{}: {}'.format(type(e).__name__, e)
+                if attempts + 1 >= app.config['DM_EMAIL_OUTBOX_MAX_ATTEMPTS']:
+                    outbox.mark_failed(message_id, error)
+                    app.logger.error(
+                        'Email {message_id} failed to send after {attempts} attempts: {error}',
+                        extra={'message_id': message_id, 'attempts': attempts + 1, 'error': error}
+                    )
+                else:
+                    outbox.mark_retry(message_id, error, retry_delay(app, attempts))
+                    app.logger.warning(
+                        'Email {message_id} failed to send, will retry: {error}',
+                        extra={'message_id': message_id, 'error': error}
+                    )
+            else:
+                outbox.mark_sent(message_id)
+                sent += 1
+
+
+def close_batches(app, outbox):
+    outbox.prune_recipients(app.config['DM_EMAIL_BATCH_RETENTION'])
+    return outbox.close_batches(app.config['DM_EMAIL_BATCH_WINDOW'], app.config['DM_EMAIL_BATCH_SIZE'])
+
+
+class OutboxWorker(Worker):
+    """Delivers due messages every DM_EMAIL_OUTBOX_POLL_INTERVAL seconds, or as soon as one is queued."""
+    error_message = 'Email outbox delivery failed'
+
+    def __init__(self, app, outbox):
+        super(OutboxWorker, self).__init__(app, 'email-outbox', app.config['DM_EMAIL_OUTBOX_POLL_INTERVAL'])
+        self.outbox = outbox
+
+    def work(self):
+        close_batches(self.app, self.outbox)
+        deliver_due(self.app, self.outbox)
+
+
+class _OutboxState(object):
+    def __init__(self, app, outbox):
+        self.outbox = outbox
+        self.worker = WorkerHandle(lambda: OutboxWorker(app, outbox))
+
+
+def _get_state(app):
+    return app.extensions.get('email_outbox')
+
+
+def start_worker(app):
+    state = _get_state(app)
+    if state is None or not app.config['DM_EMAIL_OUTBOX_WORKER']:
+        return None
+
+    return state.worker.start()
+
+
+def send_email(to_email_addresses, email_body, subject, from_email, from_name, tags=None):
+    """
+    Queues an email in the outbox, with the same arguments as `dmutils.email.send_email`.
+
+    Without an outbox the email is sent straight away, and `EmailError` is raised if that fails.
+    """
+    message = {
+        'to_email_addresses': to_email_addresses,
+        'email_body': email_body,
+        'subject': subject,
+        'from_email': from_email,
+        'from_name': from_name,
+        'tags': tags,
+    }
+
+    app = current_app._get_current_object()
+    state = _get_state(app)
+    if state is None:
+        with upstream_call('email', 'send_email'):
+            return email.send_email(**message)
+
+    state.outbox.enqueue(message)
+    worker = start_worker(app)
+    if worker is not None:
+        worker.wake.set()
+
+
+def send_batched_email(to_email_addresses, email_body, subject, from_email, from_name, tags=None):
+    """
+    Like `send_email`, but the email is queued in a batch with the same email sent to anyone else within
+    DM_EMAIL_BATCH_WINDOW seconds, and isn't sent again to recipients it is already going to. Only use it for emails
+    that are the same for every recipient.
+    """
+    app = current_app._get_current_object()
+    state = _get_state(app)
+    if state is None:
+        return send_email(to_email_addresses, email_body, subject, from_email, from_name, tags)
+
+    state.outbox.add_to_batch(
+        {
+            'email_body': email_body,
+            'subject': subject,
+            'from_email': from_email,
+            'from_name': from_name,
+            'tags': tags,
+        },
+        to_email_addresses
+    )
+    start_worker(app)
+
+
+def init_outbox(app):
+    if not app.config.get('DM_EMAIL_OUTBOX_PATH'):
+        return
+
+    app.extensions['email_outbox'] = _OutboxState(app, Outbox(app.config['DM_EMAIL_OUTBOX_PATH']))
+
+    @app.before_first_request
+    def start_outbox_worker():
+        # Delivers anything left in the outbox by a previous process
+        start_worker(app)
+
+
+def _outbox():
+    state = _get_state(current_app)
+    if state is None:
+        raise SystemExit('DM_EMAIL_OUTBOX_PATH is not set')
+    return state.outbox
+
+
+def status():
+    """Show how many emails are queued and list those that failed to send."""
+    outbox = _outbox()
+    for message_status, count in sorted(outbox.counts().items()):
+        print('{}: {}'.format(message_status, count))
+    for recipient_status, count in sorted(outbox.recipient_counts().items()):
+        print('batched recipients {}: {}'.format(recipient_status, count))
+
+    for message_id, attempts, last_error, message, created_at in outbox.failed():
+        print('{} queued {} to {!r} "{}" after {} attempts: {}'.format(
+            message_id, time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(created_at)),
+            json.loads(message)['to_email_addresses'], json.loads(message)['subject'], attempts, last_error
+        ))
+
+
+def deliver():
+    """Send every email that is due now, including batches that are ready to go."""
+    app = current_app._get_current_object()
+    close_batches(app, _outbox())
+    sent = deliver_due(app, _outbox())
+    print('Sent {} emails'.format(sent))
+
+
+def retry():
+    """Queue emails that failed to send to be sent again."""
+    print('Queued {} failed emails again'.format(_outbox().retry_failed()))
+
+
+def init_manager(manager):
+    """Adds email outbox management commands to the Flask Script manager.
+
+    These can be run from the command line.
+    """
+    sub_manager = Manager(
+        description='Commands for managing the email outbox',
+        usage='Run "python application.py outbox -?" to see subcommand list'
+    )
+
+    sub_manager.command(status)
+    sub_manager.command(deliver)
+    sub_manager.command(retry)
+    manager.add_command('outbox', sub_manager)
@@ -0,0 +1,107 @@
+import cProfile
+import errno
+import os
+import random
+import re
+import tempfile
+from datetime import datetime
+
+from flask import g, request
+
+
+# Requests can be profiled in production, to see where slow pages spend their time with real data:
+# - one in every DM_PROFILE_SAMPLE_RATE requests, picked at random
+# - any request with the DM_PROFILE_HEADER header from one of DM_PROFILE_ALLOWED_IPS
+#
+# Each profile covers the whole response, including streamed bodies, and is written to DM_PROFILE_DIR once the response
+# has been sent, as <time>-<endpoint>-<request id>.prof, which can be read with pstats or snakeviz. Only the newest
+# DM_PROFILE_KEEP profiles are kept. Requests that aren't profiled only pay for the check.
+
+PROFILE_NAME_PATTERN = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+def _profile_directory(app):
+    return app.config['DM_PROFILE_DIR'] or os.path.join(tempfile.gettempdir(), 'dm-profiles')
+
+
+def should_profile(app):
+    if request.headers.get(app.config['DM_PROFILE_HEADER']) is not None:
+        # Behind a proxy this is the proxy's address, so only requests from inside the network can ask to be profiled
+        return request.remote_addr in app.config['DM_PROFILE_ALLOWED_IPS']
+
+    sample_rate = app.config['DM_PROFILE_SAMPLE_RATE']
+    return bool(sample_rate) and random.randrange(sample_rate) == 0
+
+
+def profile_name(app):
+    request_id = request.headers.get(app.config['DM_DOWNSTREAM_REQUEST_ID_HEADER']) or 'no-request-id'
+    name = '{}-{}-{}.prof'.format(
+        datetime.utcnow().strftime('%Y%m%dT%H%M%S.%f'), request.endpoint or 'none', request_id
+    )
+    return PROFILE_NAME_PATTERN.sub('_', name)
+
+
+def rotate_profiles(directory, keep):
+    """Removes all but the newest `keep` profiles, whose names start with when they were taken."""
+    profiles = sorted(name for name in os.listdir(directory) if name.endswith('.prof'))
+    for name in profiles[:max(len(profiles) - keep, 0)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            # Another process has already removed it
+            pass
+
+
+def write_profile(app, profile, name):
+    directory = _profile_directory(app)
+    try:
+        os.makedirs(directory)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+    path = os.path.join(directory, name)
+    profile.dump_stats(path)
+    rotate_profiles(directory, app.config['DM_PROFILE_KEEP'])
+    return path
+
+
+def init_profiling(app):
+    if not (app.config['DM_PROFILE_SAMPLE_RATE'] or app.config['DM_PROFILE_ALLOWED_IPS']):
+        return
+
+    def finish_profile(profile, name, endpoint):
+        profile.disable()
+        try:
+            path = write_profile(app, profile, name)
+            app.logger.info('Profiled {endpoint} to {path}', extra={'endpoint': endpoint, 'path': path})
+        except (IOError, OSError) as e:
+            app.logger.warning('Could not write profile: {error}', extra={'error': str(e)})
+
+    def finish_request_profile():
+        profile = g.pop('profile', None)
+        if profile is None:
+            return None
+        name, endpoint = profile_name(app), request.endpoint
+        return lambda: finish_profile(profile, name, endpoint)
+
+    @app.before_request
+    def start_profile():
+        if should_profile(app):
+            g.profile = cProfile.Profile()
+            g.profile.enable()
+
+    @app.after_request
+    def stop_profile(response):
+        # Streamed bodies are rendered after this, so the profile is written once the response has been sent
+        finish = finish_request_profile()
+        if finish is not None:
+            response.call_on_close(finish)
+        return response
+
+    @app.teardown_request
+    def stop_profile_after_error(exception=None):
+        # Responses to unhandled errors don't go through after_request
+        finish = finish_request_profile()
+        if finish is not None:
+            finish()
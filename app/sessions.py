@@ -0,0 +1,302 @@
+import binascii
+import os
+import re
+import sqlite3
+import time
+from contextlib import closing
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+from flask import session as current_session
+from flask.helpers import total_seconds
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from werkzeug.datastructures import CallbackDict
+
+from app.cache import TTLCache
+
+
+# Sessions can be kept on the server, with only a random session ID in the dm_session cookie, instead of signing and
+# sending the whole session with every request. DM_SESSION_STORE picks where they are kept:
+# - None: in the signed cookie, as before
+# - 'memory': in this process, so only for a single process
+# - 'sqlite': in the SQLite database at DM_SESSION_STORE_PATH, shared by the processes on a machine
+# - 'filesystem': as files in the DM_SESSION_STORE_PATH directory
+# - 'kv': in the redis server at DM_SESSION_KV_URL, or in this process if it is not set. The redis package is not
+#   in requirements.txt, and has to be installed to use a redis server.
+#
+# Stores have the same interface as app.cache.TTLCache: get(key), set(key, value, ttl) and delete(key).
+#
+# A session is given a new ID, and its old one deleted, whenever the user logged in with it changes.
+
+SESSION_ID_BYTES = 32
+SESSION_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+def _new_session_id():
+    return binascii.hexlify(os.urandom(SESSION_ID_BYTES)).decode('ascii')
+
+
+class SQLiteSessionStore(object):
+    """Each operation uses its own connection, so a store can be shared by threads and by processes."""
+
+    # Expired sessions are deleted every this many writes
+    PRUNE_INTERVAL = 100
+
+    def __init__(self, path, timer=time.time):
+        self.path = path
+        self._timer = timer
+        self._writes = 0
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)'
+            )
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.path, timeout=30, isolation_level=None))
+
+    def get(self, key, default=None):
+        with self._connect() as connection:
+            row = connection.execute(
+                'SELECT value FROM sessions WHERE id = ? AND expires > ?', (key, self._timer())
+            ).fetchone()
+        return row[0] if row else default
+
+    def set(self, key, value, ttl):
+        now = self._timer()
+        self._writes += 1
+        with self._connect() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO sessions (id, value, expires) VALUES (?, ?, ?)', (key, value, now + ttl)
+            )
+            if self._writes % self.PRUNE_INTERVAL == 0:
+                connection.execute('DELETE FROM sessions WHERE expires <= ?', (now,))
+
+    def delete(self, key):
+        with self._connect() as connection:
+            connection.execute('DELETE FROM sessions WHERE id = ?', (key,))
+
+
+class FileSystemSessionStore(object):
+    """One file per session, whose modification time is set to when it expires."""
+
+    # Expired sessions are deleted every this many writes
+    PRUNE_INTERVAL = 100
+
+    def __init__(self, directory, timer=time.time):
+        self.directory = directory
+        self._timer = timer
+        self._writes = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key, default=None):
+        try:
+            if os.path.getmtime(self._path(key)) <= self._timer():
+                self.delete(key)
+                return default
+            with open(self._path(key)) as session_file:
+                return session_file.read()
+        except (IOError, OSError):
+            return default
+
+    def set(self, key, value, ttl):
+        temporary_path = '{}.{}.tmp'.format(self._path(key), os.getpid())
+        with open(temporary_path, 'w') as session_file:
+            session_file.write(value)
+        expires = self._timer() + ttl
+        os.utime(temporary_path, (expires, expires))
+        os.rename(temporary_path, self._path(key))
+
+        self._writes += 1
+        if self._writes % self.PRUNE_INTERVAL == 0:
+            self.prune()
+
+    def prune(self):
+        """Deletes expired sessions, including those of users who never came back to have them deleted by `get`."""
+        now = self._timer()
+        for name in os.listdir(self.directory):
+            if not SESSION_ID_PATTERN.match(name):
+                continue
+            try:
+                if os.path.getmtime(self._path(name)) <= now:
+                    self.delete(name)
+            except OSError:
+                # Another process has already deleted it
+                pass
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+
+class KeyValueSessionStore(object):
+    """Keeps sessions in a key-value store with a redis-like client: get(key), setex(key, ttl, value), delete(key)."""
+
+    def __init__(self, client, prefix='session:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key, default=None):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            return default
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    def set(self, key, value, ttl):
+        self.client.setex(self.prefix + key, int(ttl), value)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+class LocalKeyValueClient(object):
+    """Stands in for a key-value store in this process, for development and tests."""
+
+    def __init__(self, maxsize=10000):
+        self._cache = TTLCache(maxsize)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def setex(self, key, ttl, value):
+        self._cache.set(key, value, ttl)
+
+    def delete(self, key):
+        self._cache.delete(key)
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+
+    def __init__(self, initial=None, sid=None, new=False, expires=None):
+        def on_update(self):
+            self.modified = True
+
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires = expires
+        self.modified = False
+        # The stored session to delete when the session is given a new ID
+        self.previous_sid = None
+        self.opened_user_id = self.get('user_id')
+
+    def regenerate(self):
+        """Gives the session a new ID, so an ID someone else knew before the user logged in or out is useless."""
+        if self.previous_sid is None and not self.new:
+            self.previous_sid = self.sid
+        self.sid = _new_session_id()
+        self.modified = True
+
+    @property
+    def permanent(self):
+        return self.get('_permanent', False)
+
+    @permanent.setter
+    def permanent(self, value):
+        # Marking an already permanent session permanent shouldn't make it be written again
+        if bool(value) != self.permanent:
+            self['_permanent'] = bool(value)
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    Keeps sessions in `store`, with only their ID in the session cookie.
+
+    Unchanged sessions are only written back to the store once half of their lifetime has passed.
+    """
+
+    serializer = session_json_serializer
+    session_class = ServerSideSession
+
+    def __init__(self, store, timer=time.time):
+        self.store = store
+        self._timer = timer
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(app.session_cookie_name)
+        if sid and SESSION_ID_PATTERN.match(sid):
+            stored = self.store.get(sid)
+            if stored is not None:
+                try:
+                    record = self.serializer.loads(stored)
+                    return self.session_class(record['data'], sid=sid, expires=record['expires'])
+                except (ValueError, KeyError, TypeError):
+                    pass
+
+        # Only IDs the store knows are used, so a client can't choose its own
+        return self.session_class(sid=_new_session_id(), new=True)
+
+    def save_session(self, app, session, response):
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        # Logging in or out by any other route than regenerate_session still changes the session ID
+        if not session.new and session.previous_sid is None and session.get('user_id') != session.opened_user_id:
+            session.regenerate()
+        if session.previous_sid is not None:
+            self.store.delete(session.previous_sid)
+
+        if not session:
+            if not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(app.session_cookie_name, domain=domain, path=path)
+            return
+
+        lifetime = total_seconds(app.permanent_session_lifetime)
+        now = self._timer()
+        if not (session.new or session.modified or session.expires - now < lifetime / 2):
+            return
+
+        self.store.set(session.sid, self.serializer.dumps({'expires': now + lifetime, 'data': dict(session)}), lifetime)
+        response.set_cookie(
+            app.session_cookie_name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+        )
+
+
+def regenerate_session():
+    """Gives a server-side session a new ID. Call this when a user logs in or out, to prevent session fixation."""
+    if isinstance(current_session._get_current_object(), ServerSideSession):
+        current_session.regenerate()
+
+
+def _key_value_client(app):
+    url = app.config['DM_SESSION_KV_URL']
+    if not url:
+        return LocalKeyValueClient(app.config['DM_SESSION_MEMORY_SIZE'])
+
+    if redis is None:
+        raise RuntimeError('DM_SESSION_KV_URL is set, but the redis package is not installed')
+    return redis.StrictRedis.from_url(url)
+
+
+def make_session_store(app):
+    store_type = app.config['DM_SESSION_STORE']
+    if store_type == 'memory':
+        return TTLCache(app.config['DM_SESSION_MEMORY_SIZE'])
+    if store_type == 'sqlite':
+        return SQLiteSessionStore(app.config['DM_SESSION_STORE_PATH'])
+    if store_type == 'filesystem':
+        return FileSystemSessionStore(app.config['DM_SESSION_STORE_PATH'])
+    if store_type == 'kv':
+        return KeyValueSessionStore(_key_value_client(app))
+
+    raise ValueError('Unknown DM_SESSION_STORE {!r}'.format(store_type))
+
+
+def init_sessions(app):
+    if app.config['DM_SESSION_STORE']:
+        app.session_interface = ServerSideSessionInterface(make_session_store(app))
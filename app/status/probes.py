@@ -0,0 +1,107 @@
+import threading
+import time
+
+import six
+from dmutils import s3
+
+from .. import data_api_client
+from ..workers import Worker, WorkerHandle
+
+
+# /_status reports the last result of checking the app's dependencies, which a background thread refreshes every
+# DM_STATUS_PROBE_INTERVAL seconds, so health checks never wait for (or add load to) the API, S3 or email.
+# Without an interval the dependencies are checked during the request.
+
+BUCKET_SETTINGS = ['DM_AGREEMENTS_BUCKET', 'DM_COMMUNICATIONS_BUCKET', 'DM_DOCUMENTS_BUCKET', 'DM_SUBMISSIONS_BUCKET']
+
+
+def probe_api():
+    try:
+        return data_api_client.get_status()
+    except Exception as e:
+        return {'status': 'error', 'message': six.text_type(e)}
+
+
+def probe_buckets(app):
+    statuses = {}
+    for setting in BUCKET_SETTINGS:
+        bucket_name = app.config.get(setting)
+        if not bucket_name:
+            continue
+        try:
+            # Connecting fetches the bucket, so fails if it can't be reached
+            s3.S3(bucket_name)
+            statuses[bucket_name] = 'ok'
+        except Exception as e:
+            app.logger.warning(
+                'Status check of S3 bucket {bucket} failed: {error}',
+                extra={'bucket': bucket_name, 'error': six.text_type(e)}
+            )
+            statuses[bucket_name] = 'error'
+    return statuses
+
+
+def probe_email(app):
+    """Emails are sent from the outbox, so its queue shows whether the email provider is accepting them."""
+    state = app.extensions.get('email_outbox')
+    if state is None:
+        return None
+
+    counts = state.outbox.counts()
+    return {'status': 'error' if counts.get('failed') else 'ok', 'messages': counts}
+
+
+def probe_dependencies(app):
+    return {
+        'api_status': probe_api(),
+        's3_status': probe_buckets(app),
+        'email_status': probe_email(app),
+        'checked_at': time.time(),
+    }
+
+
+class StatusProber(Worker):
+    """Checks the app's dependencies every DM_STATUS_PROBE_INTERVAL seconds, keeping the last result."""
+    error_message = 'Status check failed'
+
+    def __init__(self, app):
+        super(StatusProber, self).__init__(app, 'status-prober', app.config['DM_STATUS_PROBE_INTERVAL'])
+        self.result = None
+        self.probed = threading.Event()
+
+    def work(self):
+        self.result = probe_dependencies(self.app)
+        self.probed.set()
+
+
+def start_prober(app):
+    handle = app.extensions.setdefault('status_prober', WorkerHandle(lambda: StatusProber(app)))
+    return handle.start()
+
+
+def stop_prober(app):
+    if 'status_prober' in app.extensions:
+        app.extensions['status_prober'].stop()
+
+
+def current_status(app):
+    """
+    Returns the last result of checking the app's dependencies, or None if they haven't been checked yet.
+
+    A new process waits up to DM_STATUS_FIRST_PROBE_WAIT seconds for its first check.
+    """
+    if not app.config['DM_STATUS_PROBE_INTERVAL']:
+        return probe_dependencies(app)
+
+    prober = start_prober(app)
+    prober.probed.wait(app.config['DM_STATUS_FIRST_PROBE_WAIT'])
+    return prober.result
+
+
+def init_status_prober(app):
+    if not app.config['DM_STATUS_PROBE_INTERVAL']:
+        return
+
+    @app.before_first_request
+    def start_status_prober():
+        start_prober(app)
@@ -1,7 +1,10 @@
-from flask import jsonify, current_app, request
+import time
+
+from flask import abort, jsonify, current_app, request, Response
 
 from . import status
-from .. import data_api_client
+from .probes import current_status
+from ..metrics import all_snapshots, exposition, merge_snapshots
 from dmutils.status import get_flags
 
 
@@ -13,21 +16,62 @@ def status():
             status="ok",
         ), 200
 
-    api_status = data_api_client.get_status()
+    dependencies = current_status(current_app)
     version = current_app.config['VERSION']
 
-    if api_status['status'] == "ok":
+    if dependencies is None:
         return jsonify(
-            status="ok",
+            status="error",
             version=version,
-            api_status=api_status,
+            message="Dependencies have not been checked yet.",
             flags=get_flags(current_app)
+        ), 503
+
+    age = round(time.time() - dependencies['checked_at'], 1)
+    api_status = dependencies['api_status']
+    details = dict(
+        version=version,
+        api_status=api_status,
+        s3_status=dependencies['s3_status'],
+        email_status=dependencies['email_status'],
+        age=age,
+        flags=get_flags(current_app)
+    )
+
+    if age > current_app.config['DM_STATUS_MAX_AGE']:
+        return jsonify(
+            status="error",
+            message="Dependencies have not been checked for {} seconds.".format(age),
+            **details
+        ), 500
+
+    if api_status['status'] == "ok":
+        return jsonify(
+            status="ok",
+            **details
         )
 
     return jsonify(
         status="error",
-        version=version,
-        api_status=api_status,
         message="Error connecting to the (Data) API.",
-        flags=get_flags(current_app)
+        **details
     ), 500
+
+
+@status.route('/_status/live')
+def liveness():
+    """For checks that the app is up, without looking at its dependencies."""
+    return jsonify(
+        status="ok",
+    ), 200
+
+
+@status.route('/_metrics')
+def metrics():
+    if 'metrics' not in current_app.extensions:
+        abort(404)
+
+    return Response(
+        exposition(merge_snapshots(all_snapshots(current_app))),
+        mimetype='text/plain; version=0.0.4',
+    )
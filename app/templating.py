@@ -0,0 +1,267 @@
+import errno
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import jinja2
+from jinja2 import nodes
+from jinja2.ext import Extension
+from flask import (
+    current_app, get_flashed_messages, make_response, request, session, Response, stream_with_context
+)
+from flask_login import current_user
+from flask_script import Manager
+from dmutils.forms import DmForm
+
+from app.cache import TTLCache
+
+
+class SharedFileSystemBytecodeCache(jinja2.FileSystemBytecodeCache):
+    """
+    A filesystem bytecode cache that can be shared by several worker processes.
+
+    Entries are written to a temporary file and renamed into place, so workers compiling the same template
+    at the same time never read or leave behind a partially written entry.
+    """
+    def __init__(self, directory=None, pattern='__jinja2_%s.cache'):
+        if directory is not None:
+            try:
+                os.makedirs(directory)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+        super(SharedFileSystemBytecodeCache, self).__init__(directory, pattern)
+
+    def dump_bytecode(self, bucket):
+        fd, temp_filename = tempfile.mkstemp(dir=self.directory, prefix='.__jinja2_')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                bucket.write_bytecode(f)
+            os.rename(temp_filename, self._get_cache_filename(bucket))
+        except (IOError, OSError):
+            # The cache is only an optimisation; the compiled template is still used for this request
+            try:
+                os.remove(temp_filename)
+            except OSError:
+                pass
+
+
+class FragmentCacheExtension(Extension):
+    """
+    Caches the rendered output of a template block, keyed by the values passed to the tag::
+
+        {% cache 'guidance-links', framework.slug, framework.status %}
+          ...
+        {% endcache %}
+
+    Every input the block depends on must be part of the key. `ttl=<seconds>` after the keys overrides
+    the default expiry for that block. The cache is bounded and shared by all requests to the application.
+    """
+    tags = set(['cache'])
+
+    def __init__(self, environment):
+        super(FragmentCacheExtension, self).__init__(environment)
+        environment.extend(fragment_cache=TTLCache(0))
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+
+        keys = [parser.parse_expression()]
+        ttl = nodes.Const(None)
+        while parser.stream.skip_if('comma'):
+            if parser.stream.current.test('name:ttl') and parser.stream.look().test('assign'):
+                parser.stream.skip(2)
+                ttl = parser.parse_expression()
+            else:
+                keys.append(parser.parse_expression())
+
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        key = nodes.List([nodes.Const(parser.name), nodes.Const(lineno)] + keys)
+
+        return nodes.CallBlock(
+            self.call_method('_cache_support', [key, ttl]), [], [], body
+        ).set_lineno(lineno)
+
+    def _cache_support(self, key, ttl, caller):
+        cache_key = json.dumps(key, sort_keys=True, default=str)
+        rendered = self.environment.fragment_cache.get(cache_key)
+        if rendered is None:
+            rendered = caller()
+            self.environment.fragment_cache.set(cache_key, rendered, ttl)
+
+        return rendered
+
+
+def init_fragment_cache(app):
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.fragment_cache = TTLCache(
+        app.config['DM_FRAGMENT_CACHE_SIZE'], app.config['DM_FRAGMENT_CACHE_TTL']
+    )
+
+
+def init_bytecode_cache(app):
+    if not app.config.get('DM_TEMPLATE_BYTECODE_CACHE'):
+        return
+
+    app.jinja_env.bytecode_cache = SharedFileSystemBytecodeCache(app.config.get('DM_TEMPLATE_BYTECODE_CACHE_DIR'))
+
+
+PRECOMPILED_TEMPLATES_FILENAME = 'compiled_templates.zip'
+STREAM_BUFFER_SIZE = 4096
+WARM_UP_MACROS = ['macros/forms.html', 'macros/submission.html', 'macros/toolkit_forms.html']
+
+
+def _is_template(name):
+    return name.endswith('.html')
+
+
+def compile_templates(app, target):
+    """Compiles every template the application can load into a module archive for `jinja2.ModuleLoader`.
+
+    Raises `jinja2.TemplateSyntaxError` for the first template that does not compile.
+    """
+    environment = app.jinja_env.overlay(loader=app.create_global_jinja_loader())
+    environment.compile_templates(target, filter_func=_is_template, zip='deflated', ignore_errors=False)
+
+
+def init_precompiled_templates(app):
+    """Loads templates from the precompiled archive, falling back to the template folders."""
+    archive = app.config.get('DM_PRECOMPILED_TEMPLATES')
+    if not archive:
+        return
+
+    if not os.path.exists(archive):
+        app.logger.warning('Precompiled templates not found at {archive}', extra={'archive': archive})
+        return
+
+    app.jinja_env.loader = jinja2.ChoiceLoader([jinja2.ModuleLoader(archive), app.jinja_env.loader])
+
+
+def warm_up_templates(app):
+    """Loads every template, and the macro modules pages import, so no request pays for compiling them."""
+    for name in app.create_global_jinja_loader().list_templates():
+        if _is_template(name):
+            app.jinja_env.get_template(name)
+
+    for name in WARM_UP_MACROS:
+        # Building the module once means importing pages reuse it
+        app.jinja_env.get_template(name).module
+
+
+def _buffered(chunks, size):
+    buffered, buffered_length = [], 0
+    for chunk in chunks:
+        buffered.append(chunk)
+        buffered_length += len(chunk)
+        if buffered_length >= size:
+            yield u''.join(buffered)
+            buffered, buffered_length = [], 0
+
+    if buffered:
+        yield u''.join(buffered)
+
+
+def stream_template(template_name, status_code=200, **context):
+    """
+    Renders a template as a streamed response, sending the page in chunks as it is rendered.
+
+    The request context stays available to the template until the last chunk has been sent, but the session is
+    saved before the first chunk, so anything the page changes in the session must be changed here.
+    """
+    # Takes the flashed messages out of the session now. The template's get_flashed_messages calls get them from
+    # the request context, where Flask keeps them for the rest of the request.
+    get_flashed_messages()
+
+    app = current_app._get_current_object()
+    app.update_template_context(context)
+    template = app.jinja_env.get_or_select_template(template_name)
+
+    return Response(
+        stream_with_context(_buffered(template.generate(context), STREAM_BUFFER_SIZE)),
+        status=status_code
+    )
+
+
+def stream_template_with_csrf(template_name, status_code=200, **context):
+    """Streaming version of `dmutils.forms.render_template_with_csrf`."""
+    if 'form' not in context:
+        # Creating the form generates the CSRF token, so the session is updated before headers are sent
+        context['form'] = DmForm()
+
+    response = stream_template(template_name, status_code, **context)
+    # CSRF tokens are user-specific
+    response.cache_control.private = True
+    response.cache_control.max_age = min(
+        current_app.config['DM_DEFAULT_CACHE_MAX_AGE'], current_app.config['CSRF_TIME_LIMIT']
+    )
+    return response
+
+
+def page_etag(inputs, csrf=False):
+    """
+    Returns a strong ETag for a page rendered from `inputs`, the data the view fetched, for the current user.
+
+    The release version (and so the templates), pending flash messages and, for pages with a CSRF token, the
+    token's lifetime window are part of the ETag, so a revalidated page never shows stale messages or carries
+    an expired token. Returns None if conditional pages are disabled.
+    """
+    if not current_app.config['DM_CONDITIONAL_PAGES']:
+        return None
+
+    key = [current_app.config['VERSION'], current_user.get_id(), session.get('_flashes'), inputs]
+    if csrf:
+        key.append(int(time.time() // current_app.config['CSRF_TIME_LIMIT']))
+
+    return hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def conditional_response(etag, render):
+    """
+    Answers a GET with 304 Not Modified, without calling `render`, when the client already has the page tagged
+    `etag`. Otherwise returns the response from `render()` tagged with `etag`.
+
+    The ETag is always weak. It is worked out from what the page shows, not from its bytes, and a compressed page is
+    sent with a weak ETag, which its 304s have to match.
+    """
+    if etag is None:
+        return render()
+
+    # If-None-Match uses weak comparison, so clients that were sent a strong ETag before still match
+    if request.method in ('GET', 'HEAD') and request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = make_response(render())
+
+    response.set_etag(etag, weak=True)
+    # The page depends on who is logged in
+    response.cache_control.private = True
+    return response
+
+
+def precompile(target=None):
+    """
+    Compile every template into a module archive, failing on the first template syntax error.
+
+    Defaults to DM_PRECOMPILED_TEMPLATES, or app/compiled_templates.zip.
+    """
+    target = target or current_app.config.get('DM_PRECOMPILED_TEMPLATES') or os.path.join(
+        current_app.root_path, PRECOMPILED_TEMPLATES_FILENAME
+    )
+    compile_templates(current_app, target)
+    current_app.logger.info('Templates compiled to {target}', extra={'target': target})
+
+
+def init_manager(manager):
+    """Adds template management commands to the Flask Script manager.
+
+    These can be run from the command line.
+    """
+    sub_manager = Manager(
+        description='Commands for managing templates',
+        usage='Run "python application.py templates -?" to see subcommand list'
+    )
+
+    sub_manager.command(precompile)
+    manager.add_command('templates', sub_manager)
@@ -0,0 +1,60 @@
+import threading
+
+
+class Worker(threading.Thread):
+    """
+    A daemon thread that calls `work` in an app context every `interval` seconds, and as soon as `wake` is set,
+    until it is stopped.
+    """
+    error_message = 'Background work failed'
+
+    def __init__(self, app, name, interval, wake=None):
+        super(Worker, self).__init__(name=name)
+        self.daemon = True
+        self.app = app
+        self.interval = interval
+        self.wake = wake if wake is not None else threading.Event()
+        self._stopped = threading.Event()
+
+    def work(self):
+        raise NotImplementedError
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                with self.app.app_context():
+                    self.work()
+            except Exception:
+                self.app.logger.exception(self.error_message)
+            self.wake.wait(self.interval)
+            self.wake.clear()
+
+    def stop(self):
+        self._stopped.set()
+        self.wake.set()
+
+
+class WorkerHandle(object):
+    """Starts the worker made by `factory` when it is first needed, and again in each process forked after that."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self.worker = None
+
+    def start(self):
+        with self._lock:
+            # Threads do not survive a fork, so a process started from a preloaded app starts its own
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = self._factory()
+                self.worker.start()
+
+        return self.worker
+
+    def stop(self, timeout=5):
+        with self._lock:
+            worker, self.worker = self.worker, None
+
+        if worker is not None:
+            worker.stop()
+            worker.join(timeout)
@@ -7,7 +7,11 @@ from flask_featureflags import FeatureFlag
 
 from app import create_app
 from dmutils import init_manager
+import app.assets
+import app.declarations
 import app.invites
+import app.outbox
+import app.templating
 
 
 port = int(os.getenv('PORT', '5003'))
@@ -20,7 +24,11 @@ application.jinja_options = {
 }
 
 manager = init_manager(application, port, ['./app/content/frameworks'])
+app.assets.init_manager(manager)
 app.invites.init_manager(manager)
+app.declarations.init_manager(manager)
+app.outbox.init_manager(manager)
+app.templating.init_manager(manager)
 
 application.logger.info('Command line: {}'.format(sys.argv))
 
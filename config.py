@@ -19,6 +19,12 @@ class Config(object):
     CSRF_TIME_LIMIT = 8*3600
 
     PERMANENT_SESSION_LIFETIME = 4*3600
+    # Where sessions are kept, see app/sessions.py. None keeps them in the signed cookie.
+    DM_SESSION_STORE = None
+    DM_SESSION_STORE_PATH = None
+    DM_SESSION_KV_URL = None
+    DM_SESSION_MEMORY_SIZE = 10000
+
     DM_DEFAULT_CACHE_MAX_AGE = 48*3600
 
     DM_DATA_API_URL = None
@@ -51,6 +57,9 @@ class Config(object):
     INVITE_EMAIL_SUBJECT = 'Your Digital Marketplace invitation'
 
     NEW_SUPPLIER_INVITE_SUBJECT = 'Digital Marketplace - invitation to create seller account'
+    # Threads sending supplier invites, and the most invite emails they send a second between them
+    DM_SUPPLIER_INVITE_WORKERS = 4
+    DM_SUPPLIER_INVITE_RATE = 10
 
     CLARIFICATION_EMAIL_NAME = DM_GENERIC_ADMIN_NAME
     CLARIFICATION_EMAIL_FROM = 'no-reply@marketplace.digital.gov.au'
@@ -60,12 +69,37 @@ class Config(object):
     FRAMEWORK_AGREEMENT_RETURNED_NAME = DM_GENERIC_ADMIN_NAME
 
     CREATE_USER_SUBJECT = 'Create your Digital Marketplace account'
+
+    # Emails are queued in this SQLite database and sent in the background. Sent during the request if not set.
+    DM_EMAIL_OUTBOX_PATH = None
+    DM_EMAIL_OUTBOX_WORKER = True
+    DM_EMAIL_OUTBOX_POLL_INTERVAL = 5
+    DM_EMAIL_OUTBOX_MAX_ATTEMPTS = 8
+    # Seconds before the first retry, doubled for each one after that
+    DM_EMAIL_OUTBOX_RETRY_DELAY = 30
+    DM_EMAIL_OUTBOX_MAX_RETRY_DELAY = 3600
+    # Batched emails wait this many seconds for others, or until DM_EMAIL_BATCH_SIZE recipients are waiting
+    DM_EMAIL_BATCH_WINDOW = 30
+    DM_EMAIL_BATCH_SIZE = 500
+    DM_EMAIL_BATCH_RETENTION = 7 * 24 * 3600
+    # Audit events are sent to the API in the background, see app/audit.py
+    DM_AUDIT_ASYNC = True
+    DM_AUDIT_BUFFER_SIZE = 1000
+    DM_AUDIT_BATCH_SIZE = 50
+    DM_AUDIT_SPILL_PATH = None
+    # What to do with events that don't fit in the buffer without a spill file: 'inline' or 'drop'
+    DM_AUDIT_OVERFLOW = 'inline'
+    DM_AUDIT_MAX_ATTEMPTS = 5
+    DM_AUDIT_RETRY_DELAY = 10
+    DM_AUDIT_POLL_INTERVAL = 5
     SECRET_KEY = None
     SHARED_EMAIL_KEY = None
     RESET_PASSWORD_SALT = 'ResetPasswordSalt'
     SUPPLIER_INVITE_TOKEN_SALT = 'SupplierInviteEmail'
 
     ASSET_PATH = URL_PREFIX + '/static'
+    # Content-hashed static files built by `python application.py assets compress` never change
+    DM_STATIC_IMMUTABLE_MAX_AGE = 365*24*3600
 
     # List all you feature flags below
     FEATURE_FLAGS = {
@@ -79,6 +113,52 @@ class Config(object):
     DM_APP_NAME = 'supplier-frontend'
     DM_DOWNSTREAM_REQUEST_ID_HEADER = 'X-Amz-Cf-Id'
 
+    # /_status reports dependencies checked in the background this often, see app/status/probes.py
+    DM_STATUS_PROBE_INTERVAL = 15
+    DM_STATUS_FIRST_PROBE_WAIT = 2
+    # /_status is an error if the last check is older than this
+    DM_STATUS_MAX_AGE = 60
+    # Request, upstream, template and cache metrics served from /_metrics, see app/metrics.py. With a directory set,
+    # each process writes its metrics there every DM_METRICS_WRITE_INTERVAL seconds, and /_metrics adds them all up.
+    # Files not written for DM_METRICS_MAX_AGE seconds are from processes that have exited, and are deleted.
+    DM_METRICS_ENABLED = True
+    DM_METRICS_DIR = None
+    DM_METRICS_WRITE_INTERVAL = 10
+    DM_METRICS_MAX_AGE = 300
+    # Profile one in this many requests, and requests with DM_PROFILE_HEADER from these addresses, see app/profiling.py
+    DM_PROFILE_SAMPLE_RATE = 0
+    DM_PROFILE_HEADER = 'X-DM-Profile'
+    DM_PROFILE_ALLOWED_IPS = []
+    # Defaults to a directory in the temp directory. Only the newest DM_PROFILE_KEEP profiles are kept.
+    DM_PROFILE_DIR = None
+    DM_PROFILE_KEEP = 100
+
+    # Compiled templates are cached on disk and shared between workers. Defaults to a per-user temp directory.
+    DM_TEMPLATE_BYTECODE_CACHE = True
+    DM_TEMPLATE_BYTECODE_CACHE_DIR = None
+    # Module archive built by `python application.py templates precompile`
+    DM_PRECOMPILED_TEMPLATES = None
+    DM_TEMPLATE_WARM_UP = False
+    # Rendered {% cache %} template fragments
+    DM_FRAGMENT_CACHE_SIZE = 1000
+    DM_FRAGMENT_CACHE_TTL = 300
+    # Summaries of draft services, see app.main.helpers.services.get_draft_summary
+    DM_DRAFT_SUMMARY_CACHE_SIZE = 2000
+    # Logged in users, see app.main.helpers.users.load_user. A ttl of 0 fetches the user on every request. Each
+    # process has its own cache, so other processes can use a deactivated user for up to the ttl.
+    DM_USER_CACHE_SIZE = 5000
+    DM_USER_CACHE_TTL = 30
+    # Decoded supplier invitation tokens, kept until the token expires, and whether the invited user exists
+    DM_INVITE_TOKEN_CACHE_SIZE = 2000
+    DM_INVITED_USER_CACHE_TTL = 60
+    # Answer conditional GETs for supplier pages with 304 Not Modified when the page has not changed
+    DM_CONDITIONAL_PAGES = True
+    # gzip responses of these types once they are at least DM_COMPRESS_MIN_SIZE bytes
+    DM_COMPRESS_RESPONSES = True
+    DM_COMPRESS_MIN_SIZE = 1024
+    DM_COMPRESS_LEVEL = 6
+    DM_COMPRESS_MIMETYPES = ['text/html', 'text/plain', 'text/css', 'application/json', 'application/javascript']
+
     @staticmethod
     def init_app(app):
         repo_root = os.path.abspath(os.path.dirname(__file__))
@@ -95,6 +175,11 @@ class Test(Config):
     CSRF_FAKED = True
     DM_LOG_LEVEL = 'CRITICAL'
     SERVER_NAME = 'localhost'
+    DM_TEMPLATE_BYTECODE_CACHE = False
+    DM_AUDIT_ASYNC = False
+    DM_USER_CACHE_TTL = 0
+    DM_STATUS_PROBE_INTERVAL = None
+    DM_METRICS_ENABLED = False
 
     # Throw an exception in dev when a feature flag is used in code but not defined. Otherwise it is assumed False.
     RAISE_ERROR_ON_MISSING_FEATURES = True
@@ -117,6 +202,8 @@ class Test(Config):
 class Development(Config):
     DEBUG = True
     SESSION_COOKIE_SECURE = False
+    # Templates change without a new release version
+    DM_CONDITIONAL_PAGES = False
 
     # Throw an exception in dev when a feature flag is used in code but not defined. Otherwise it is assumed False.
     RAISE_ERROR_ON_MISSING_FEATURES = True
@@ -149,6 +236,9 @@ class Live(Config):
 
     DM_FRAMEWORK_AGREEMENTS_EMAIL = 'no-reply@marketplace.digital.gov.au'
 
+    DM_PRECOMPILED_TEMPLATES = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'app/compiled_templates.zip')
+    DM_TEMPLATE_WARM_UP = True
+
 
 class Preview(Live):
     pass
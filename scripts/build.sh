@@ -4,9 +4,12 @@ set -e
 
 npm install 1>&2
 npm run frontend-build:production 1>&2
+python application.py assets compress 1>&2
+python application.py templates precompile 1>&2
 
 # Non-Git paths that should be included when deploying
 echo "app/static"
 echo "app/templates/toolkit"
 echo "app/templates/govuk"
 echo "app/content"
+echo "app/compiled_templates.zip"
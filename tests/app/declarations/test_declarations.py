@@ -0,0 +1,107 @@
+import json
+
+import mock
+
+from app import declarations
+from app.main import content_loader
+
+from tests.app.helpers import BaseApplicationTest
+from tests.app.main.helpers.validation.test_g8_declaration import FULL_G8_SUBMISSION
+
+
+class TestValidateDeclarations(BaseApplicationTest):
+
+    def _export(self, tmpdir, records):
+        export = tmpdir.join('declarations.jsonl')
+        export.write('\n'.join(json.dumps(record) for record in records))
+        return str(export)
+
+    def _report(self, tmpdir):
+        return [json.loads(line) for line in tmpdir.join('report.jsonl').read().splitlines()]
+
+    def test_validate_declaration_ignores_valid_complete_declaration(self):
+        content = content_loader.get_manifest('g-cloud-8', 'declaration')
+        assert declarations.validate_declaration(
+            {'slug': 'g-cloud-8'}, content, 1, FULL_G8_SUBMISSION
+        ) is None
+
+    def test_validate_declaration_reports_inconsistent_status(self):
+        content = content_loader.get_manifest('g-cloud-8', 'declaration')
+        declaration = dict(FULL_G8_SUBMISSION)
+        del declaration['primaryContact']
+
+        report = declarations.validate_declaration({'slug': 'g-cloud-8'}, content, 1, declaration)
+        assert report['supplierCode'] == 1
+        assert report['status'] == 'complete'
+        assert report['expectedStatus'] == 'started'
+        assert list(report['errors']) == ['primaryContact']
+
+    def test_validate_declaration_reports_started_declaration_without_errors(self):
+        content = content_loader.get_manifest('g-cloud-8', 'declaration')
+        declaration = dict(FULL_G8_SUBMISSION, status='started')
+
+        report = declarations.validate_declaration({'slug': 'g-cloud-8'}, content, 1, declaration)
+        assert report['expectedStatus'] == 'complete'
+        assert report['errors'] == {}
+
+    def test_validate_declaration_ignores_errors_the_declaration_pages_do_not_show(self):
+        content = content_loader.get_manifest('g-cloud-8', 'declaration')
+        validator = mock.Mock()
+        validator.errors.return_value = {'notAQuestion': 'answer_required'}
+        validator.get_error_messages.return_value = []
+
+        with mock.patch('app.declarations.get_validator', return_value=validator):
+            assert declarations.validate_declaration(
+                {'slug': 'g-cloud-8'}, content, 1, FULL_G8_SUBMISSION
+            ) is None
+
+    def test_validate_from_export(self, tmpdir):
+        invalid = dict(FULL_G8_SUBMISSION, dunsNumber='123')
+        source = self._export(tmpdir, [
+            {'supplierCode': 1, 'declaration': FULL_G8_SUBMISSION},
+            {'supplierCode': 2, 'declaration': invalid},
+            {'supplierCode': 3, 'declaration': {}},
+        ])
+
+        with self.app.app_context():
+            summary = declarations.validate(
+                'g-cloud-8', source=source, output=str(tmpdir.join('report.jsonl')), processes=1, chunksize=2
+            )
+
+        assert summary == {'checked': 3, 'invalid': 1, 'failed': 0}
+        report = self._report(tmpdir)
+        assert [(entry['supplierCode'], entry['expectedStatus']) for entry in report] == [(2, 'started')]
+        assert list(report[0]['errors']) == ['dunsNumber']
+
+    @mock.patch('app.declarations.data_api_client')
+    def test_validate_from_api(self, data_api_client, tmpdir):
+        data_api_client.get_interested_suppliers.return_value = {'interestedSuppliers': [1, 2]}
+        data_api_client.get_supplier_declaration.side_effect = [
+            {'declaration': FULL_G8_SUBMISSION},
+            {'declaration': dict(FULL_G8_SUBMISSION, status='started')},
+        ]
+
+        with self.app.app_context():
+            summary = declarations.validate('g-cloud-8', output=str(tmpdir.join('report.jsonl')), processes=1)
+
+        assert summary == {'checked': 2, 'invalid': 1, 'failed': 0}
+        data_api_client.get_supplier_declaration.assert_has_calls([
+            mock.call(1, 'g-cloud-8'),
+            mock.call(2, 'g-cloud-8'),
+        ])
+        assert [entry['supplierCode'] for entry in self._report(tmpdir)] == [2]
+
+    def test_validate_reports_unreadable_records(self, tmpdir):
+        source = tmpdir.join('declarations.jsonl')
+        source.write('not json\n')
+
+        with self.app.app_context():
+            summary = declarations.validate(
+                'g-cloud-8', source=str(source), output=str(tmpdir.join('report.jsonl')), processes=1
+            )
+
+        assert summary == {'checked': 1, 'invalid': 0, 'failed': 1}
+        assert 'failure' in self._report(tmpdir)[0]
+
+    def test_batches(self):
+        assert list(declarations._batches(range(5), 2)) == [[0, 1], [2, 3], [4]]
@@ -114,6 +114,15 @@ def empty_g7_draft():
     }
 
 
+class FakeTimer(object):
+    """Stands in for time.time, for code that takes a timer, with the time moved on by changing `now`."""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
 class BaseApplicationTest(object):
     def setup(self):
         self.app = create_app('test')
@@ -1,7 +1,9 @@
 from StringIO import StringIO
+import gzip
 import textwrap
 
 import mock
+from dmutils.email import EmailError
 
 from app import invites
 
@@ -41,11 +43,56 @@ class TestSupplierInvites(BaseApplicationTest):
             send_email.assert_has_calls([
                 mock.call('me@example.com', mock.ANY, mock.ANY, mock.ANY, mock.ANY),
                 mock.call('someone.else@example.com', mock.ANY, mock.ANY, mock.ANY, mock.ANY),
-            ])
+            ], any_order=True)
             data_api_client.record_supplier_invite.assert_has_calls([
                 mock.call(supplier_code=123, email_address='me@example.com'),
                 mock.call(supplier_code=456, email_address='someone.else@example.com'),
-            ])
+            ], any_order=True)
+
+    @mock.patch('app.invites.data_api_client')
+    @mock.patch('app.invites.send_email')
+    def test_send_skips_invites_in_checkpoint(self, send_email, data_api_client, tmpdir):
+        checkpoint = tmpdir.join('invites.sent')
+        checkpoint.write('["recorded", "me@example.com", 123]\n["emailed", "someone.else@example.com", 456]\n')
+        data = textwrap.dedent("""\
+            Me,me@example.com,123,Example Supplier
+            Someone Else,someone.else@example.com,456,Another Example Supplier
+            New,new@example.com,789,New Supplier
+        """)
+        with self.app.app_context():
+            summary = invites.send(StringIO(data), checkpoint=str(checkpoint))
+
+        send_email.assert_called_once_with('new@example.com', mock.ANY, mock.ANY, mock.ANY, mock.ANY)
+        data_api_client.record_supplier_invite.assert_has_calls([
+            mock.call(supplier_code=456, email_address='someone.else@example.com'),
+            mock.call(supplier_code=789, email_address='new@example.com'),
+        ], any_order=True)
+        assert (summary.sent, summary.recorded, summary.skipped, summary.failed) == (1, 1, 1, 0)
+        assert invites.Checkpoint(str(checkpoint)).stage('new@example.com', 789) == invites.Checkpoint.RECORDED
+
+    @mock.patch('app.invites.data_api_client')
+    @mock.patch('app.invites.send_email', side_effect=EmailError('rejected'))
+    def test_failed_invites_are_sent_again(self, send_email, data_api_client, tmpdir):
+        checkpoint = str(tmpdir.join('invites.sent'))
+        with self.app.app_context():
+            summary = invites.send(StringIO('Me,me@example.com,123,Example Supplier\n'), checkpoint=checkpoint)
+
+        assert not data_api_client.record_supplier_invite.called
+        assert summary.failed == 1
+        assert invites.Checkpoint(checkpoint).stage('me@example.com', 123) is None
+
+    def test_rate_limiter_spaces_out_calls(self):
+        now = [100.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+
+        rate_limiter = invites.RateLimiter(4, timer=lambda: now[0], sleep=sleep)
+        for _ in range(3):
+            rate_limiter.wait()
+
+        assert sleeps == [0.25, 0.5]
 
     @mock.patch('app.invites.data_api_client')
     @mock.patch('app.invites.send_email')
@@ -90,3 +137,45 @@ class TestSupplierInvites(BaseApplicationTest):
 
             # Should be able to handle this data without errors
             invites.send(pipe)
+
+    @mock.patch('app.invites.data_api_client')
+    def test_list_candidates_follows_pages(self, data_api_client):
+        first, second = self.contact_data
+        data_api_client.list_supplier_account_invite_candidates.side_effect = [
+            {'results': [first], 'links': {'next': 'http://localhost/suppliers/invite-candidates?page=2'}},
+            {'results': [second], 'links': {}},
+        ]
+        pipe = StringIO()
+
+        with self.app.app_context():
+            invites.list_candidates(pipe)
+
+        data_api_client.list_supplier_account_invite_candidates.assert_has_calls([mock.call(), mock.call(page=2)])
+        assert pipe.getvalue().splitlines() == [
+            'Kris Kringle,info@alpha.com.au,11,Mu Digital Consulting Group',
+            'Kris Kringle,info@alpha.com.au,6,Eta Digital Consulting Group',
+        ]
+
+    @mock.patch('app.invites.data_api_client')
+    def test_list_unclaimed_leaves_out_repeated_contacts(self, data_api_client):
+        repeated = dict(self.contact_data[0], contact=dict(self.contact_data[0]['contact'], email='INFO@alpha.com.au'))
+        data_api_client.list_unclaimed_supplier_account_invites.return_value = {
+            'results': self.contact_data + [repeated]
+        }
+        pipe = StringIO()
+
+        with self.app.app_context():
+            invites.list_unclaimed(pipe)
+
+        assert len(pipe.getvalue().splitlines()) == 2
+
+    @mock.patch('app.invites.data_api_client')
+    def test_list_candidates_can_be_gzipped(self, data_api_client):
+        data_api_client.list_supplier_account_invite_candidates.return_value = {'results': self.contact_data}
+        pipe = StringIO()
+
+        with self.app.app_context():
+            invites.list_candidates(pipe, gzip=True)
+
+        csv_data = gzip.GzipFile(fileobj=StringIO(pipe.getvalue())).read()
+        assert csv_data.splitlines()[0] == 'Kris Kringle,info@alpha.com.au,11,Mu Digital Consulting Group'
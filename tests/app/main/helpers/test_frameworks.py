@@ -5,6 +5,7 @@ from nose.tools import assert_equal
 from werkzeug.exceptions import HTTPException
 
 from app.main.helpers.frameworks import get_statuses_for_lot, return_supplier_framework_info_if_on_framework_or_abort
+from app.main.helpers.services import DraftsByLot
 
 
 def get_lot_status_examples():
@@ -295,14 +296,23 @@ def test_get_status_for_lot(parameters, expected_result):
     ]):
         print(label, parameters[index])
 
+    has_one_service_limit, drafts_count, complete_drafts_count, declaration_status, framework_status = parameters
+    lot = {
+        'slug': 'user-research-studios',
+        'oneServiceLimit': has_one_service_limit,
+        'name': 'user research studios',
+        'unitSingular': 'lab',
+        'unitPlural': 'labs',
+    }
+    drafts = DraftsByLot(
+        [{'lotSlug': 'user-research-studios', 'status': 'not-submitted'}] * drafts_count +
+        [{'lotSlug': 'user-research-studios', 'status': 'submitted'}] * complete_drafts_count +
+        [{'lotSlug': 'user-research-participants', 'status': 'submitted'}]
+    )
+
     assert_equal(
         expected_result,
-        get_statuses_for_lot(
-            *parameters,
-            lot_name='user research studios',
-            unit='lab',
-            unit_plural='labs'
-        )
+        get_statuses_for_lot(lot, drafts, declaration_status, framework_status)
     )
 
 
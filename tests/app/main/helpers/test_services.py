@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import mock
+
+from app.main.helpers.services import DraftsByLot, get_draft_summary
+from tests.app.helpers import BaseApplicationTest
+
+DRAFTS = [
+    {'id': 1, 'lotSlug': 'digital-outcomes', 'status': 'not-submitted'},
+    {'id': 2, 'lotSlug': 'digital-specialists', 'status': 'submitted'},
+    {'id': 3, 'lotSlug': 'digital-outcomes', 'status': 'submitted'},
+    {'id': 4, 'lotSlug': 'digital-outcomes', 'status': 'not-submitted'},
+    {'id': 5, 'lotSlug': 'digital-outcomes', 'status': 'failed'},
+]
+
+
+def _ids(drafts):
+    return [draft['id'] for draft in drafts]
+
+
+class TestDraftsByLot(object):
+
+    def test_groups_drafts_by_status_in_order(self):
+        drafts = DraftsByLot(DRAFTS)
+
+        assert _ids(drafts.with_status('not-submitted')) == [1, 4]
+        assert _ids(drafts.with_status('submitted')) == [2, 3]
+
+    def test_groups_drafts_by_lot_and_status(self):
+        drafts = DraftsByLot(DRAFTS)
+
+        assert _ids(drafts.for_lot('digital-outcomes', 'not-submitted')) == [1, 4]
+        assert _ids(drafts.for_lot('digital-outcomes', 'submitted')) == [3]
+        assert drafts.for_lot('user-research-studios', 'submitted') == []
+
+    def test_counts(self):
+        drafts = DraftsByLot(DRAFTS)
+
+        assert drafts.count('digital-outcomes') == 3
+        assert drafts.count('digital-outcomes', 'submitted') == 1
+        assert drafts.count('digital-specialists', 'not-submitted') == 0
+        assert drafts.count('user-research-studios') == 0
+
+
+@mock.patch('app.main.helpers.services.count_unanswered_questions', return_value=(1, 2))
+@mock.patch('app.main.helpers.services.format_service_price', return_value=u'£1 per unit')
+class TestGetDraftSummary(BaseApplicationTest):
+
+    def setup(self):
+        super(TestGetDraftSummary, self).setup()
+        self.content = mock.MagicMock()
+        self.content.__iter__.return_value = [mock.Mock(id='section')]
+        self.draft = {'id': 1, 'updatedAt': '2016-08-01T10:00:00.000000Z', 'serviceName': 'Draft'}
+
+    def test_summarises_draft(self, format_service_price, count_unanswered_questions):
+        with self.app.app_context():
+            summary = get_draft_summary(self.content, self.draft)
+
+        self.content.filter.assert_called_once_with(self.draft)
+        assert summary.sections == self.content.filter.return_value.summary.return_value
+        assert summary.price_string == u'£1 per unit'
+        assert (summary.unanswered_required, summary.unanswered_optional) == (1, 2)
+
+    def test_unchanged_draft_is_summarised_once(self, format_service_price, count_unanswered_questions):
+        with self.app.app_context():
+            summary = get_draft_summary(self.content, self.draft)
+            assert get_draft_summary(self.content, dict(self.draft)) is summary
+
+        assert self.content.filter.call_count == 1
+
+    def test_updated_draft_is_summarised_again(self, format_service_price, count_unanswered_questions):
+        with self.app.app_context():
+            get_draft_summary(self.content, self.draft)
+            get_draft_summary(self.content, dict(self.draft, updatedAt='2016-08-02T10:00:00.000000Z'))
+
+        assert self.content.filter.call_count == 2
+
+    def test_draft_without_updated_at_is_not_cached(self, format_service_price, count_unanswered_questions):
+        draft = {'id': 1}
+        with self.app.app_context():
+            get_draft_summary(self.content, draft)
+            get_draft_summary(self.content, draft)
+
+        assert self.content.filter.call_count == 2
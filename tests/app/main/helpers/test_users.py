@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta
+
+import mock
+import pytest
+from dmutils.email import decode_token, InvalidToken
+from flask import session
+from freezegun import freeze_time
+
+from app.main.helpers.users import (
+    decode_supplier_invitation_token, forget_invited_user, forget_user, generate_supplier_invitation_token,
+    get_invited_user, load_user, login_user, SUPPLIER_INVITE_TOKEN_MAX_AGE, USER_VERSION_KEY
+)
+from tests.app.helpers import BaseApplicationTest
+
+
+@mock.patch('app.main.helpers.users.User.load_user')
+class TestLoadUser(BaseApplicationTest):
+
+    def setup(self):
+        super(TestLoadUser, self).setup()
+        self.app.config['DM_USER_CACHE_TTL'] = 60
+        self.data_api_client = mock.Mock()
+
+    def test_user_is_loaded_once_per_session(self, load_api_user):
+        with self.app.test_request_context():
+            user = load_user(self.data_api_client, u'123')
+            assert load_user(self.data_api_client, u'123') is user
+
+        load_api_user.assert_called_once_with(self.data_api_client, u'123')
+
+    def test_user_is_loaded_again_for_a_new_login(self, load_api_user):
+        with self.app.test_request_context():
+            load_user(self.data_api_client, u'123')
+            session[USER_VERSION_KEY] = 'another login'
+            load_user(self.data_api_client, u'123')
+
+        assert load_api_user.call_count == 2
+
+    def test_forgotten_user_is_loaded_again(self, load_api_user):
+        with self.app.test_request_context():
+            load_user(self.data_api_client, u'123')
+            forget_user(123)
+            load_user(self.data_api_client, u'123')
+
+        assert load_api_user.call_count == 2
+
+    def test_sessions_of_the_same_user_are_cached_separately(self, load_api_user):
+        for _ in range(2):
+            for version in ['first login', 'second login']:
+                with self.app.test_request_context():
+                    session[USER_VERSION_KEY] = version
+                    load_user(self.data_api_client, u'123')
+
+        assert load_api_user.call_count == 2
+
+    def test_forgotten_user_is_loaded_again_for_every_session(self, load_api_user):
+        for version in ['first login', 'second login']:
+            with self.app.test_request_context():
+                session[USER_VERSION_KEY] = version
+                load_user(self.data_api_client, u'123')
+
+        with self.app.test_request_context():
+            forget_user(123)
+
+        for version in ['first login', 'second login']:
+            with self.app.test_request_context():
+                session[USER_VERSION_KEY] = version
+                load_user(self.data_api_client, u'123')
+
+        assert load_api_user.call_count == 4
+
+    def test_missing_user_is_not_cached(self, load_api_user):
+        load_api_user.return_value = None
+        with self.app.test_request_context():
+            assert load_user(self.data_api_client, u'123') is None
+            load_user(self.data_api_client, u'123')
+
+        assert load_api_user.call_count == 2
+
+    def test_cache_can_be_turned_off(self, load_api_user):
+        self.app.config['DM_USER_CACHE_TTL'] = 0
+        with self.app.test_request_context():
+            load_user(self.data_api_client, u'123')
+            load_user(self.data_api_client, u'123')
+
+        assert load_api_user.call_count == 2
+
+    @mock.patch('app.main.helpers.users.flask_login.login_user')
+    def test_login_starts_a_new_session_version(self, flask_login_user, load_api_user):
+        user = mock.Mock()
+        user.get_id.return_value = u'123'
+        with self.app.test_request_context():
+            load_user(self.data_api_client, u'123')
+            login_user(user)
+            load_user(self.data_api_client, u'123')
+
+        flask_login_user.assert_called_once_with(user)
+        assert load_api_user.call_count == 2
+
+
+class TestInvitationTokens(BaseApplicationTest):
+
+    def _token(self):
+        with self.app.app_context():
+            return generate_supplier_invitation_token('Me', 'me@example.com', 1234, 'Supplier Name').encode()
+
+    @mock.patch('app.main.helpers.users.decode_token', wraps=decode_token)
+    def test_decoded_tokens_are_cached(self, decode):
+        token = self._token()
+        with self.app.app_context():
+            data = decode_supplier_invitation_token(token)
+            assert decode_supplier_invitation_token(token) == data
+
+        assert data['emailAddress'] == 'me@example.com'
+        assert decode.call_count == 1
+
+    @mock.patch('app.main.helpers.users.TTLCache.set', autospec=True)
+    def test_cached_tokens_expire_with_the_token(self, cache_set):
+        token = self._token()
+        with self.app.app_context():
+            decode_supplier_invitation_token(token)
+
+        assert SUPPLIER_INVITE_TOKEN_MAX_AGE - 60 < cache_set.call_args[1]['ttl'] <= SUPPLIER_INVITE_TOKEN_MAX_AGE
+
+    def test_expired_tokens_are_rejected(self):
+        with freeze_time(datetime.utcnow() - timedelta(days=7, seconds=1)):
+            token = self._token()
+
+        with self.app.app_context():
+            with pytest.raises(InvalidToken):
+                decode_supplier_invitation_token(token)
+
+    def test_invited_user_lookups_are_cached_until_forgotten(self):
+        data_api_client = mock.Mock()
+        data_api_client.get_user.return_value = None
+        with self.app.app_context():
+            assert get_invited_user(data_api_client, 'me@example.com') is None
+            assert get_invited_user(data_api_client, 'ME@example.com') is None
+            forget_invited_user('me@example.com')
+            get_invited_user(data_api_client, 'me@example.com')
+
+        assert data_api_client.get_user.call_count == 2
@@ -0,0 +1,93 @@
+import pytest
+
+from app.main.helpers.validation import (
+    get_validator, get_validation_rules, G7Validator, G8Validator, DOSValidator, ConditionalRequirements,
+    required_if, any_answered, answered_no, answer_equals, answer_is, answer_in, answer_contains_any, all_of
+)
+from app.main import content_loader
+
+
+def test_rules_are_cached_per_validator_and_manifest():
+    content = content_loader.get_manifest('g-cloud-8', 'declaration')
+    other_copy = content_loader.get_manifest('g-cloud-8', 'declaration')
+
+    assert get_validation_rules(G8Validator, content) is get_validation_rules(G8Validator, other_copy)
+    assert get_validation_rules(G8Validator, content) is not get_validation_rules(DOSValidator, content)
+
+
+def test_get_validator_binds_rules():
+    content = content_loader.get_manifest('g-cloud-8', 'declaration')
+    validator = get_validator({"slug": "g-cloud-8"}, content, {})
+
+    assert validator.rules is get_validation_rules(G8Validator, content)
+
+
+def test_rules_keep_manifest_question_order():
+    content = content_loader.get_manifest('g-cloud-7', 'declaration')
+    rules = get_validation_rules(G7Validator, content)
+
+    expected = [question_id for section in content for question_id in section.get_question_ids()]
+    assert list(rules.field_order) == expected
+    assert all(rules.field_positions[question_id] == index for index, question_id in enumerate(expected))
+
+
+def test_cached_rules_cannot_be_changed():
+    content = content_loader.get_manifest('g-cloud-7', 'declaration')
+    rules = get_validation_rules(G7Validator, content)
+
+    with pytest.raises(TypeError):
+        rules.field_positions[rules.field_order[0]] = 1
+    with pytest.raises(TypeError):
+        rules.conditional_requirements.triggers.clear()
+
+
+def test_default_required_fields_exclude_optional_fields():
+    content = content_loader.get_manifest('g-cloud-7', 'declaration')
+    rules = get_validation_rules(G7Validator, content)
+
+    assert not rules.default_required_fields & G7Validator.optional_fields
+    assert rules.default_required_fields | G7Validator.optional_fields >= set(rules.field_order)
+
+
+def test_number_string_patterns_are_compiled():
+    content = content_loader.get_manifest('g-cloud-8', 'declaration')
+    rules = get_validation_rules(G8Validator, content)
+
+    assert [field for field, pattern in rules.number_string_patterns] == ['dunsNumber']
+    assert get_validation_rules(DOSValidator, content).number_string_patterns == ()
+
+
+def test_any_answered_requirements_are_indexed_by_trigger_field():
+    requirements = ConditionalRequirements([
+        required_if(any_answered('a', 'b'), 'x'),
+        required_if(any_answered('b'), 'y'),
+    ])
+
+    assert requirements.trigger_fields == {'a', 'b'}
+    assert requirements.required_fields({'a': True}) == {'x'}
+    assert requirements.required_fields({'b': 'yes'}) == {'x', 'y'}
+    assert requirements.required_fields({'a': False, 'b': ''}) == set()
+
+
+def test_conditional_requirements():
+    requirements = ConditionalRequirements([
+        required_if(answered_no('uk'), 'registers'),
+        required_if(answer_equals('status', 'other'), 'statusOther'),
+        required_if(answer_is('flag', True), 'flagDetails'),
+        required_if(answer_in('licence', ['licensed', 'member']), 'licenceDetails'),
+        required_if(answer_contains_any('types', ['licensed']), 'typeDetails'),
+        required_if(all_of(answered_no('uk'), answer_is('flag', True)), 'both'),
+    ])
+
+    assert requirements.required_fields({}) == set()
+    assert requirements.required_fields({'uk': False}) == {'registers'}
+    assert requirements.required_fields({'status': 'other'}) == {'statusOther'}
+    assert requirements.required_fields({'flag': 1}) == set()
+    assert requirements.required_fields({'flag': True}) == {'flagDetails'}
+    assert requirements.required_fields({'licence': 'member'}) == {'licenceDetails'}
+    assert requirements.required_fields({'types': ['other', 'licensed']}) == {'typeDetails'}
+    assert requirements.required_fields({'uk': False, 'flag': True}) == {'registers', 'flagDetails', 'both'}
+
+
+def test_g8_shares_dos_conditional_requirements():
+    assert G8Validator.conditionally_required is DOSValidator.conditionally_required
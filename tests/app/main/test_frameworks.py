@@ -88,6 +88,32 @@ class TestFrameworksDashboard(BaseApplicationTest):
         assert_equal(
             len(doc.xpath('//h1[contains(text(), "Your G-Cloud 7 documents")]')), 1)
 
+    def test_framework_dashboard_answers_conditional_get_with_not_modified(self, data_api_client, s3):
+        with self.app.test_client():
+            self.login()
+
+        data_api_client.get_framework.return_value = self.framework(status='open')
+        data_api_client.get_supplier_framework_info.return_value = self.supplier_framework()
+        url = self.url_for('main.framework_dashboard', framework_slug='g-cloud-7')
+        res = self.client.get(url)
+        etag = res.headers['ETag']
+
+        assert_equal(res.status_code, 200)
+        assert_true(res.cache_control.private)
+
+        with mock.patch('app.main.views.frameworks.render_template') as render_template:
+            res = self.client.get(url, headers={'If-None-Match': etag})
+
+            assert_equal(res.status_code, 304)
+            assert_equal(res.headers['ETag'], etag)
+            assert not render_template.called
+
+        data_api_client.get_framework.return_value = self.framework(status='pending')
+        res = self.client.get(url, headers={'If-None-Match': etag})
+
+        assert_equal(res.status_code, 200)
+        assert_true(res.headers['ETag'] != etag)
+
     def test_does_not_show_for_live_if_no_declaration(self, data_api_client, s3):
         with self.app.test_client():
             self.login()
@@ -98,8 +124,8 @@ class TestFrameworksDashboard(BaseApplicationTest):
 
         assert_equal(res.status_code, 404)
 
-    @mock.patch('app.main.views.frameworks.send_email')
-    def test_interest_registered_in_framework_on_post(self, send_email, data_api_client, s3):
+    @mock.patch('app.main.views.frameworks.send_batched_email')
+    def test_interest_registered_in_framework_on_post(self, send_batched_email, data_api_client, s3):
         with self.app.test_client():
             self.login()
 
@@ -117,8 +143,8 @@ class TestFrameworksDashboard(BaseApplicationTest):
                 "email@email.com"
             )
 
-    @mock.patch('app.main.views.frameworks.send_email')
-    def test_email_sent_when_interest_registered_in_framework(self, send_email, data_api_client, s3):
+    @mock.patch('app.main.views.frameworks.send_batched_email')
+    def test_email_sent_when_interest_registered_in_framework(self, send_batched_email, data_api_client, s3):
         with self.app.test_client():
             self.login()
 
@@ -135,7 +161,7 @@ class TestFrameworksDashboard(BaseApplicationTest):
             )
 
             assert_equal(res.status_code, 200)
-            send_email.assert_called_once_with(
+            send_batched_email.assert_called_once_with(
                 ['email1', 'email2'],
                 mock.ANY,
                 'You have started your G-Cloud 7 application',
@@ -182,7 +208,7 @@ class TestFrameworksDashboard(BaseApplicationTest):
             data_api_client.get_framework_interest.return_value = {'frameworks': ['g-cloud-7']}
             data_api_client.find_draft_services.return_value = {
                 "services": [
-                    {'serviceName': 'A service', 'status': 'not-submitted'}
+                    {'serviceName': 'A service', 'status': 'not-submitted', 'lotSlug': 'iaas'}
                 ]
             }
             data_api_client.get_supplier_framework_info.return_value = self.supplier_framework()
@@ -415,7 +441,7 @@ class TestFrameworksDashboard(BaseApplicationTest):
             data_api_client.get_framework.return_value = self.framework(status='standstill')
             data_api_client.find_draft_services.return_value = {
                 "services": [
-                    {'serviceName': 'A service', 'status': 'not-submitted'}
+                    {'serviceName': 'A service', 'status': 'not-submitted', 'lotSlug': 'iaas'}
                 ]
             }
             data_api_client.get_supplier_framework_info.return_value = self.supplier_framework()
@@ -1542,7 +1568,7 @@ class TestSendClarificationQuestionEmail(BaseApplicationTest):
 
 
 @mock.patch('app.main.views.frameworks.data_api_client', autospec=True)
-@mock.patch('app.main.views.frameworks.count_unanswered_questions')
+@mock.patch('app.main.helpers.services.count_unanswered_questions')
 class TestG7ServicesList(BaseApplicationTest):
 
     def test_404_when_g7_pending_and_no_complete_services(self, count_unanswered, data_api_client):
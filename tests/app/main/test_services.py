@@ -39,7 +39,7 @@ class TestListServices(BaseApplicationTest):
             res = self.client.get(self.url_for('main.list_services'))
             assert_equal(res.status_code, 200)
             data_api_client.find_services.assert_called_once_with(
-                supplier_code=1234)
+                supplier_code=1234, page=1)
             assert_in(
                 "You don&#39;t have any services on the Digital Marketplace",
                 res.get_data(as_text=True)
@@ -65,7 +65,7 @@ class TestListServices(BaseApplicationTest):
             res = self.client.get(self.url_for('main.list_services'))
             assert_equal(res.status_code, 200)
             data_api_client.find_services.assert_called_once_with(
-                supplier_code=1234)
+                supplier_code=1234, page=1)
             assert_true("Service name 123" in res.get_data(as_text=True))
             assert_true("Software as a Service" in res.get_data(as_text=True))
             assert_true("G-Cloud 1" in res.get_data(as_text=True))
@@ -97,7 +97,7 @@ class TestListServices(BaseApplicationTest):
             res = self.client.get(self.url_for('main.list_services'))
             assert_equal(res.status_code, 200)
             data_api_client.find_services.assert_called_once_with(
-                supplier_code=1234)
+                supplier_code=1234, page=1)
             assert_true(
                 self.url_for('main.edit_service', service_id=123) in res.get_data(as_text=True))
 
@@ -117,7 +117,7 @@ class TestListServices(BaseApplicationTest):
 
             res = self.client.get(self.url_for('main.list_services'))
             assert_equal(res.status_code, 200)
-            data_api_client.find_services.assert_called_once_with(supplier_code=1234)
+            data_api_client.find_services.assert_called_once_with(supplier_code=1234, page=1)
 
             assert "Special Lot Name" in res.get_data(as_text=True)
 
@@ -138,11 +138,73 @@ class TestListServices(BaseApplicationTest):
 
             res = self.client.get(self.url_for('main.list_services'))
             assert_equal(res.status_code, 200)
-            data_api_client.find_services.assert_called_once_with(supplier_code=1234)
+            data_api_client.find_services.assert_called_once_with(supplier_code=1234, page=1)
 
             assert "Service name 123" in res.get_data(as_text=True)
             assert self.url_for('main.edit_service', service_id=123) not in res.get_data(as_text=True)
 
+    @mock.patch('app.main.views.services.data_api_client')
+    def test_services_on_page_are_sorted_by_framework(self, data_api_client):
+        with self.app.test_client():
+            self.login()
+
+            data_api_client.find_services.return_value = {
+                'services': [
+                    {'serviceName': 'Old service', 'status': 'published', 'id': '1', 'frameworkSlug': 'g-cloud-6'},
+                    {'serviceName': 'New service', 'status': 'published', 'id': '2', 'frameworkSlug': 'g-cloud-8'},
+                ]
+            }
+
+            res = self.client.get(self.url_for('main.list_services'))
+            assert_equal(res.status_code, 200)
+
+            page = res.get_data(as_text=True)
+            assert page.index('New service') < page.index('Old service')
+
+    @mock.patch('app.main.views.services.data_api_client')
+    def test_requests_page_and_framework(self, data_api_client):
+        with self.app.test_client():
+            self.login()
+            data_api_client.find_services.return_value = {'services': []}
+
+            res = self.client.get(self.url_for('main.list_services', page=3, framework='g-cloud-8'))
+            assert_equal(res.status_code, 200)
+            data_api_client.find_services.assert_called_once_with(
+                supplier_code=1234, page=3, framework='g-cloud-8')
+
+    @mock.patch('app.main.views.services.data_api_client')
+    def test_shows_page_links(self, data_api_client):
+        with self.app.test_client():
+            self.login()
+            data_api_client.find_services.return_value = {
+                'services': [],
+                'links': {
+                    'prev': 'http://localhost/services?supplier_code=1234&page=1',
+                    'next': 'http://localhost/services?supplier_code=1234&page=3',
+                    'last': 'http://localhost/services?supplier_code=1234&page=5',
+                }
+            }
+
+            res = self.client.get(self.url_for('main.list_services', page=2, framework='g-cloud-8'))
+            assert_equal(res.status_code, 200)
+
+            document = html.fromstring(res.get_data(as_text=True))
+            hrefs = document.xpath('//ul[@class="previous-next-navigation"]//a/@href')
+            assert len(hrefs) == 2
+            assert 'page=1' in hrefs[0] and 'framework=g-cloud-8' in hrefs[0]
+            assert 'page=3' in hrefs[1] and 'framework=g-cloud-8' in hrefs[1]
+            assert 'Page 3 of 5' in res.get_data(as_text=True)
+
+    @mock.patch('app.main.views.services.data_api_client')
+    def test_invalid_page_is_a_bad_request(self, data_api_client):
+        with self.app.test_client():
+            self.login()
+
+            for page in ('two', '0'):
+                res = self.client.get(self.url_for('main.list_services', page=page))
+                assert_equal(res.status_code, 400)
+            assert not data_api_client.find_services.called
+
 
 class TestListServicesLogin(BaseApplicationTest):
     @mock.patch('app.main.views.services.data_api_client')
@@ -1,20 +1,24 @@
 import json
+import time
 from ..helpers import BaseApplicationTest
 
 import mock
 from nose.tools import assert_equal, assert_in, assert_false
 
+from app.status import probes
 
+
+@mock.patch('app.status.probes.s3')
 class TestStatus(BaseApplicationTest):
 
-    @mock.patch('app.status.views.data_api_client')
-    def test_should_return_200_from_elb_status_check(self, data_api_client):
+    @mock.patch('app.status.probes.data_api_client')
+    def test_should_return_200_from_elb_status_check(self, data_api_client, s3):
         status_response = self.client.get(self.url_for('status.status') + '?ignore-dependencies')
         assert_equal(200, status_response.status_code)
         assert_false(data_api_client.called)
 
-    @mock.patch('app.status.views.data_api_client')
-    def test_status_ok(self, data_api_client):
+    @mock.patch('app.status.probes.data_api_client')
+    def test_status_ok(self, data_api_client, s3):
         data_api_client.get_status.return_value = {
             "status": "ok"
         }
@@ -28,8 +32,8 @@ class TestStatus(BaseApplicationTest):
         assert_equal(
             "ok", "{}".format(json_data['api_status']['status']))
 
-    @mock.patch('app.status.views.data_api_client')
-    def test_status_error(self, data_api_client):
+    @mock.patch('app.status.probes.data_api_client')
+    def test_status_error(self, data_api_client, s3):
 
         data_api_client.get_status.return_value = {
             'status': 'error',
@@ -47,3 +51,72 @@ class TestStatus(BaseApplicationTest):
             "error", "{}".format(json_data['api_status']['status']))
         assert_in(
             "Error connecting to", "{}".format(json_data['message']))
+
+    @mock.patch('app.status.probes.data_api_client')
+    def test_liveness_does_not_check_dependencies(self, data_api_client, s3):
+        status_response = self.client.get(self.url_for('status.liveness'))
+
+        assert_equal(200, status_response.status_code)
+        assert_false(data_api_client.get_status.called)
+        assert_false(s3.S3.called)
+
+    @mock.patch('app.status.probes.data_api_client')
+    def test_status_reports_buckets(self, data_api_client, s3):
+        data_api_client.get_status.return_value = {'status': 'ok'}
+        s3.S3.side_effect = lambda bucket_name: None if 'submissions' in bucket_name else 1 / 0
+
+        status_response = self.client.get(self.url_for('status.status'))
+
+        json_data = json.loads(status_response.get_data().decode('utf-8'))
+        assert_equal(json_data['s3_status'], {
+            'digitalmarketplace-submissions-dev-dev': 'ok',
+            'digitalmarketplace-communications-dev-dev': 'error',
+        })
+
+    @mock.patch('app.status.views.current_status')
+    def test_status_serves_last_result_with_its_age(self, current_status, s3):
+        current_status.return_value = {
+            'api_status': {'status': 'ok'}, 's3_status': {}, 'email_status': None, 'checked_at': time.time() - 10,
+        }
+
+        status_response = self.client.get(self.url_for('status.status'))
+
+        assert_equal(200, status_response.status_code)
+        json_data = json.loads(status_response.get_data().decode('utf-8'))
+        assert 10 <= json_data['age'] < 15
+
+    @mock.patch('app.status.views.current_status')
+    def test_status_error_when_result_is_stale(self, current_status, s3):
+        current_status.return_value = {
+            'api_status': {'status': 'ok'}, 's3_status': {}, 'email_status': None,
+            'checked_at': time.time() - self.app.config['DM_STATUS_MAX_AGE'] - 1,
+        }
+
+        status_response = self.client.get(self.url_for('status.status'))
+
+        assert_equal(500, status_response.status_code)
+
+    @mock.patch('app.status.views.current_status', return_value=None)
+    def test_status_unavailable_before_first_check(self, current_status, s3):
+        assert_equal(503, self.client.get(self.url_for('status.status')).status_code)
+
+
+class TestStatusProber(BaseApplicationTest):
+
+    def teardown(self):
+        probes.stop_prober(self.app)
+        super(TestStatusProber, self).teardown()
+
+    @mock.patch('app.status.probes.probe_dependencies', return_value={'checked_at': 0})
+    def test_serves_result_of_background_check(self, probe_dependencies):
+        self.app.config['DM_STATUS_PROBE_INTERVAL'] = 60
+
+        assert_equal(probes.current_status(self.app), {'checked_at': 0})
+        assert_equal(probes.current_status(self.app), {'checked_at': 0})
+        assert_equal(probe_dependencies.call_count, 1)
+
+    @mock.patch('app.status.probes.data_api_client')
+    def test_api_errors_are_reported(self, data_api_client):
+        data_api_client.get_status.side_effect = ValueError('timed out')
+
+        assert_equal(probes.probe_api(), {'status': 'error', 'message': 'timed out'})
@@ -0,0 +1,94 @@
+import gzip
+import json
+import os
+
+from app.assets import build_assets, init_static_assets, hashed_name, MANIFEST_FILENAME
+from .helpers import BaseApplicationTest
+
+CSS = 'body { color: black; }\n' * 100
+
+
+def _static_folder(tmpdir):
+    tmpdir.join('stylesheets', 'application.css').write(CSS, ensure=True)
+    tmpdir.join('images', 'logo.png').write(b'\x89PNG', 'wb', ensure=True)
+    return str(tmpdir)
+
+
+class TestBuildAssets(object):
+
+    def test_writes_hashed_copies_and_manifest(self, tmpdir):
+        static_folder = _static_folder(tmpdir)
+        manifest = build_assets(static_folder)
+
+        assert sorted(manifest) == ['images/logo.png', 'stylesheets/application.css']
+        assert manifest['stylesheets/application.css'].startswith('stylesheets/application-')
+        with open(os.path.join(static_folder, MANIFEST_FILENAME)) as f:
+            assert json.load(f) == manifest
+        assert tmpdir.join(manifest['stylesheets/application.css']).read() == CSS
+
+    def test_compresses_text_files(self, tmpdir):
+        static_folder = _static_folder(tmpdir)
+        manifest = build_assets(static_folder)
+
+        for path in ('stylesheets/application.css', manifest['stylesheets/application.css']):
+            compressed = gzip.open(os.path.join(static_folder, path + '.gz'))
+            assert compressed.read().decode('utf-8') == CSS
+            compressed.close()
+        assert not tmpdir.join('images', 'logo.png.gz').exists()
+
+    def test_rebuild_ignores_generated_files(self, tmpdir):
+        static_folder = _static_folder(tmpdir)
+        manifest = build_assets(static_folder)
+
+        assert build_assets(static_folder) == manifest
+
+    def test_hashed_name(self):
+        assert hashed_name('javascripts/app.js', '0123456789abcdef') == 'javascripts/app-0123456789ab.js'
+
+
+class TestStaticAssets(BaseApplicationTest):
+
+    def _init(self, tmpdir, build=True):
+        self.app.static_folder = _static_folder(tmpdir)
+        self.manifest = build_assets(self.app.static_folder) if build else {}
+        init_static_assets(self.app)
+
+    def _get(self, path, **headers):
+        return self.client.get(self.app.static_url_path + '/' + path, headers=headers)
+
+    def test_serves_gzip_to_browsers_that_accept_it(self, tmpdir):
+        self._init(tmpdir)
+        res = self._get('stylesheets/application.css', **{'Accept-Encoding': 'gzip, deflate'})
+
+        assert res.status_code == 200
+        assert res.headers['Content-Encoding'] == 'gzip'
+        assert res.mimetype == 'text/css'
+        assert 'Accept-Encoding' in res.headers['Vary']
+        assert len(res.data) < len(CSS)
+
+    def test_serves_uncompressed_file_otherwise(self, tmpdir):
+        self._init(tmpdir)
+        res = self._get('stylesheets/application.css')
+
+        assert res.status_code == 200
+        assert 'Content-Encoding' not in res.headers
+        assert res.get_data(as_text=True) == CSS
+
+    def test_hashed_files_are_immutable(self, tmpdir):
+        self._init(tmpdir)
+        res = self._get(self.manifest['stylesheets/application.css'])
+
+        assert res.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+        assert 'immutable' not in self._get('stylesheets/application.css').headers['Cache-Control']
+
+    def test_pages_link_to_hashed_files(self, tmpdir):
+        self._init(tmpdir)
+        res = self.client.get(self.url_for('main.create_new_supplier'))
+
+        assert self.manifest['stylesheets/application.css'] in res.get_data(as_text=True)
+
+    def test_missing_file_is_not_found(self, tmpdir):
+        self._init(tmpdir, build=False)
+
+        assert self._get('stylesheets/missing.css').status_code == 404
+        assert self._get('../config.py').status_code == 404
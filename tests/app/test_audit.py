@@ -0,0 +1,164 @@
+import threading
+
+import mock
+import pytest
+from dmapiclient import APIError
+from dmapiclient.audit import AuditTypes
+
+from app import audit
+from .helpers import BaseApplicationTest, FakeTimer
+
+
+def _event(object_id, invited_email='invited@example.com'):
+    return {
+        'audit_type': AuditTypes.invite_user,
+        'object_type': 'suppliers',
+        'object_id': object_id,
+        'data': {'invitedEmail': invited_email},
+    }
+
+
+class TestAuditSink(object):
+
+    def setup(self):
+        self.api_client = mock.Mock()
+        self.logger = mock.Mock()
+        self.timer = FakeTimer()
+
+    def _sink(self, **kwargs):
+        return audit.AuditSink(self.api_client, self.logger, timer=self.timer, **kwargs)
+
+    def _sent(self):
+        return [kwargs['data']['invitedEmail'] for _, kwargs in self.api_client.create_audit_event.call_args_list]
+
+    def test_events_are_sent_in_batches(self):
+        sink = self._sink(batch_size=2)
+        for object_id in range(3):
+            sink.put(_event(object_id))
+
+        assert not self.api_client.create_audit_event.called
+        assert sink.flush() == 2
+        assert sink.flush() == 1
+        self.api_client.create_audit_event.assert_called_with(**_event(2))
+
+    def test_failed_events_hold_back_later_events_for_the_same_object(self):
+        self.api_client.create_audit_event.side_effect = [APIError(), None, None, None]
+        sink = self._sink(retry_delay=10)
+        sink.put(_event(1, 'first@example.com'))
+        sink.put(_event(2, 'other@example.com'))
+        sink.put(_event(1, 'second@example.com'))
+
+        assert sink.flush() == 1
+        assert self._sent() == ['first@example.com', 'other@example.com']
+
+        assert sink.flush() == 0
+        self.timer.now += 10
+        assert sink.flush() == 2
+        assert self._sent()[2:] == ['first@example.com', 'second@example.com']
+
+    def test_events_are_dropped_after_max_attempts(self):
+        self.api_client.create_audit_event.side_effect = APIError()
+        sink = self._sink(max_attempts=2, retry_delay=0)
+        sink.put(_event(1))
+
+        sink.flush()
+        sink.flush()
+        assert sink.dropped == 1
+        assert sink.flush() == 0
+
+    def test_unexpected_errors_count_as_attempts(self):
+        self.api_client.create_audit_event.side_effect = [ValueError('bad event'), None, None]
+        sink = self._sink(retry_delay=0)
+        sink.put(_event(1))
+        sink.put(_event(2))
+
+        assert sink.flush() == 1
+        assert sink.flush() == 1
+        assert self.api_client.create_audit_event.call_count == 3
+
+    def test_interrupted_batch_is_put_back(self):
+        self.api_client.create_audit_event.side_effect = [None, KeyboardInterrupt(), None, None]
+        sink = self._sink()
+        for object_id in range(3):
+            sink.put(_event(object_id))
+
+        with pytest.raises(KeyboardInterrupt):
+            sink.flush()
+        assert sink.flush() == 2
+        assert [kwargs['object_id'] for _, kwargs in self.api_client.create_audit_event.call_args_list] == [0, 1, 1, 2]
+
+    def test_overflow_is_sent_inline_without_spill_file(self):
+        sink = self._sink(buffer_size=1)
+        sink.put(_event(1))
+        sink.put(_event(2))
+
+        self.api_client.create_audit_event.assert_called_once_with(**_event(2))
+
+    def test_overflow_can_be_dropped(self):
+        sink = self._sink(buffer_size=1, overflow='drop')
+        sink.put(_event(1))
+        sink.put(_event(2))
+
+        assert sink.dropped == 1
+        assert not self.api_client.create_audit_event.called
+
+    def test_overflow_is_spilled_and_sent_in_order(self, tmpdir):
+        sink = self._sink(buffer_size=1, spill_path=str(tmpdir.join('audit.spill')))
+        for invited_email in ['one@example.com', 'two@example.com', 'three@example.com']:
+            sink.put(_event(1, invited_email))
+
+        assert not self.api_client.create_audit_event.called
+        while sink.flush():
+            pass
+        assert self._sent() == ['one@example.com', 'two@example.com', 'three@example.com']
+
+    def test_queued_events_survive_restart_with_spill_file(self, tmpdir):
+        spill_path = str(tmpdir.join('audit.spill'))
+        sink = self._sink(spill_path=spill_path)
+        sink.put(_event(1))
+        sink.close()
+
+        assert not self.api_client.create_audit_event.called
+        assert self._sink(spill_path=spill_path).flush() == 1
+        self.api_client.create_audit_event.assert_called_once_with(**_event(1))
+
+
+class TestCreateAuditEvent(BaseApplicationTest):
+
+    def test_sends_straight_away_without_queue(self):
+        api_client = mock.Mock()
+        with self.app.app_context():
+            audit.create_audit_event(api_client, **_event(1))
+
+        api_client.create_audit_event.assert_called_once_with(**_event(1))
+
+    @mock.patch('app.audit.start_worker')
+    def test_queues_event(self, start_worker):
+        self.app.config['DM_AUDIT_ASYNC'] = True
+        api_client = mock.Mock()
+        audit.init_audit(self.app, api_client)
+
+        with self.app.app_context():
+            audit.create_audit_event(api_client, **_event(1))
+
+        assert not api_client.create_audit_event.called
+        assert self.app.extensions['audit_events'].sink.flush() == 1
+        api_client.create_audit_event.assert_called_once_with(**_event(1))
+
+    def test_worker_sends_queued_events_as_soon_as_it_starts(self):
+        self.app.config.update(DM_AUDIT_ASYNC=True, DM_AUDIT_POLL_INTERVAL=60)
+        api_client = mock.Mock()
+        sent = threading.Event()
+        api_client.create_audit_event.side_effect = lambda **event: sent.set()
+        audit.init_audit(self.app, api_client)
+        state = self.app.extensions['audit_events']
+        state.sink.put(_event(1))
+        # Only starting the worker should send the event, as it does for events spilled by a previous process
+        state.sink.wake.clear()
+
+        try:
+            audit.start_worker(self.app)
+            assert sent.wait(5)
+        finally:
+            state.worker.stop()
+        api_client.create_audit_event.assert_called_once_with(**_event(1))
@@ -0,0 +1,55 @@
+from app.cache import TTLCache
+from .helpers import FakeTimer
+
+
+class TestTTLCache(object):
+
+    def test_get_and_set(self):
+        cache = TTLCache(2)
+        cache.set('a', 1)
+
+        assert cache.get('a') == 1
+        assert cache.get('b') is None
+        assert cache.get('b', 'default') == 'default'
+        assert (cache.hits, cache.misses) == (1, 2)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TTLCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        assert 'a' in cache
+        assert 'b' not in cache
+        assert 'c' in cache
+        assert len(cache) == 2
+
+    def test_entries_expire(self):
+        timer = FakeTimer()
+        cache = TTLCache(10, ttl=60, timer=timer)
+        cache.set('a', 1)
+        cache.set('b', 2, ttl=120)
+
+        timer.now += 61
+        assert cache.get('a') is None
+        assert cache.get('b') == 2
+
+        timer.now += 60
+        assert cache.get('b') is None
+
+    def test_zero_size_cache_stores_nothing(self):
+        cache = TTLCache(0)
+        cache.set('a', 1)
+
+        assert cache.get('a') is None
+
+    def test_delete_and_clear(self):
+        cache = TTLCache(10)
+        cache.set('a', 1)
+        cache.set('b', 2)
+
+        cache.delete('a')
+        assert 'a' not in cache
+        cache.clear()
+        assert len(cache) == 0
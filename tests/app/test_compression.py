@@ -0,0 +1,97 @@
+import gzip
+import io
+
+from flask import Response, stream_with_context
+
+from app.templating import conditional_response
+from .helpers import BaseApplicationTest
+
+PAGE = u'<p>Services</p>' * 200
+
+
+def _gunzip(data):
+    return gzip.GzipFile(fileobj=io.BytesIO(data)).read().decode('utf-8')
+
+
+class TestCompression(BaseApplicationTest):
+
+    def setup(self):
+        super(TestCompression, self).setup()
+
+        @self.app.route('/compression/page')
+        def page():
+            return Response(PAGE, headers={'ETag': '"abc"'})
+
+        @self.app.route('/compression/conditional')
+        def conditional():
+            return conditional_response('abc', lambda: PAGE)
+
+        @self.app.route('/compression/small')
+        def small():
+            return u'<p>Small</p>'
+
+        @self.app.route('/compression/stream')
+        def stream():
+            return Response(stream_with_context(iter([PAGE, PAGE])))
+
+        @self.app.route('/compression/encoded')
+        def encoded():
+            return Response(PAGE, headers={'Content-Encoding': 'br'})
+
+        @self.app.route('/compression/image')
+        def image():
+            return Response(PAGE, mimetype='image/svg+xml')
+
+    def _get(self, path, encoding='gzip, deflate'):
+        return self.client.get('/compression/' + path, headers={'Accept-Encoding': encoding})
+
+    def test_compresses_large_pages(self):
+        res = self._get('page')
+
+        assert res.headers['Content-Encoding'] == 'gzip'
+        assert int(res.headers['Content-Length']) == len(res.data) < len(PAGE)
+        assert _gunzip(res.data) == PAGE
+        assert 'Accept-Encoding' in res.headers['Vary']
+
+    def test_etag_becomes_weak(self):
+        assert self._get('page').headers['ETag'] == 'W/"abc"'
+
+    def test_not_modified_has_the_etag_of_the_compressed_page(self):
+        etag = self._get('conditional').headers['ETag']
+        res = self.client.get(
+            '/compression/conditional', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag}
+        )
+
+        assert res.status_code == 304
+        assert res.headers['ETag'] == etag == 'W/"abc"'
+
+    def test_compresses_streamed_pages(self):
+        res = self._get('stream')
+
+        assert res.headers['Content-Encoding'] == 'gzip'
+        assert 'Content-Length' not in res.headers
+        assert _gunzip(res.data) == PAGE * 2
+
+    def test_does_not_compress_without_accept_encoding(self):
+        res = self._get('page', encoding='identity')
+
+        assert 'Content-Encoding' not in res.headers
+        assert res.get_data(as_text=True) == PAGE
+        assert 'Accept-Encoding' in res.headers['Vary']
+
+    def test_does_not_compress_small_responses(self):
+        assert 'Content-Encoding' not in self._get('small').headers
+
+    def test_does_not_compress_other_content_types(self):
+        assert 'Content-Encoding' not in self._get('image').headers
+
+    def test_does_not_compress_encoded_responses(self):
+        res = self._get('encoded')
+
+        assert res.headers['Content-Encoding'] == 'br'
+        assert res.get_data(as_text=True) == PAGE
+
+    def test_can_be_disabled(self):
+        self.app.config['DM_COMPRESS_RESPONSES'] = False
+
+        assert 'Content-Encoding' not in self._get('page').headers
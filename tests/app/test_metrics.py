@@ -0,0 +1,160 @@
+import json
+import time
+
+import mock
+import pytest
+
+from app import metrics
+from app.cache import TTLCache
+from .helpers import BaseApplicationTest
+
+
+class TestMetrics(object):
+
+    def test_histogram_counts_values_into_buckets(self):
+        registry = metrics.Metrics(buckets=[0.1, 1.0])
+        for value in [0.05, 0.5, 0.5, 5.0]:
+            registry.observe('duration', {'endpoint': 'main.index'}, value)
+
+        histogram = registry.snapshot()['histograms']['duration'][metrics._key({'endpoint': 'main.index'})]
+        assert histogram[0] == [1, 2, 1]
+        assert histogram[1] == pytest.approx(6.05)
+        assert histogram[2] == 4
+
+    def test_snapshots_from_processes_are_added_up(self):
+        first, second = metrics.Metrics(buckets=[1.0]), metrics.Metrics(buckets=[1.0])
+        first.increment('responses', {'status': 200})
+        second.increment('responses', {'status': 200}, 2)
+        second.increment('responses', {'status': 404})
+        first.observe('duration', {}, 0.5)
+        second.observe('duration', {}, 2.0)
+
+        merged = metrics.merge_snapshots([first.snapshot(), second.snapshot()])
+        assert merged['counters']['responses'] == {
+            metrics._key({'status': 200}): 3,
+            metrics._key({'status': 404}): 1,
+        }
+        assert merged['histograms']['duration'][metrics._key({})] == [[1, 1], 2.5, 2]
+
+    def test_exposition_format(self):
+        registry = metrics.Metrics(buckets=[0.1, 1.0])
+        registry.increment('dm_responses_total', {'endpoint': 'main.index', 'status': 200})
+        registry.observe('dm_request_duration_seconds', {'endpoint': 'main.index'}, 0.5)
+
+        lines = metrics.exposition(registry.snapshot(), buckets=[0.1, 1.0]).splitlines()
+        assert '# TYPE dm_responses_total counter' in lines
+        assert 'dm_responses_total{endpoint="main.index",status="200"} 1' in lines
+        assert '# TYPE dm_request_duration_seconds histogram' in lines
+        assert 'dm_request_duration_seconds_bucket{endpoint="main.index",le="0.1"} 0' in lines
+        assert 'dm_request_duration_seconds_bucket{endpoint="main.index",le="1.0"} 1' in lines
+        assert 'dm_request_duration_seconds_bucket{endpoint="main.index",le="+Inf"} 1' in lines
+        assert 'dm_request_duration_seconds_count{endpoint="main.index"} 1' in lines
+
+
+@mock.patch('app.metrics.instrument_data_api_client')
+class TestMetricsEndpoint(BaseApplicationTest):
+
+    def teardown(self):
+        state = self.app.extensions.get('metrics')
+        if state is not None:
+            state.writer.stop()
+        super(TestMetricsEndpoint, self).teardown()
+
+    def _init_metrics(self, **config):
+        self.app.config['DM_METRICS_ENABLED'] = True
+        self.app.config.update(config)
+        metrics.init_metrics(self.app, mock.Mock())
+
+    def _snapshot(self):
+        with self.app.app_context():
+            return metrics.process_snapshot(self.app)
+
+    def test_not_found_when_disabled(self, instrument_data_api_client):
+        response = self.client.get(self.url_for('status.metrics'))
+        assert response.status_code == 404
+
+    def test_reports_requests_and_caches(self, instrument_data_api_client):
+        self._init_metrics()
+        cache = self.app.extensions['users'] = TTLCache(10)
+        cache.get('missing')
+
+        self.client.get(self.url_for('status.liveness'))
+        response = self.client.get(self.url_for('status.metrics'))
+
+        assert response.status_code == 200
+        body = response.get_data(as_text=True)
+        assert 'dm_responses_total{endpoint="status.liveness",status="200"} 1' in body
+        assert 'dm_request_duration_seconds_count{endpoint="status.liveness"} 1' in body
+        assert 'dm_cache_requests_total{cache="users",result="miss"} 1' in body
+
+    def test_upstream_calls_record_time_and_errors(self, instrument_data_api_client):
+        self._init_metrics()
+        bucket = metrics.timed_client('s3', mock.Mock(**{'list.side_effect': ValueError}))
+
+        with self.app.app_context():
+            with pytest.raises(ValueError):
+                bucket.list('g-cloud-7')
+            with metrics.upstream_call('email', 'send_email'):
+                pass
+
+        snapshot = self._snapshot()
+        s3_list = metrics._key({'service': 's3', 'operation': 'list'})
+        send_email = metrics._key({'service': 'email', 'operation': 'send_email'})
+        assert snapshot['counters']['dm_upstream_errors_total'] == {s3_list: 1}
+        assert snapshot['histograms']['dm_upstream_duration_seconds'][s3_list][2] == 1
+        assert snapshot['histograms']['dm_upstream_duration_seconds'][send_email][2] == 1
+
+    def test_timed_client_passes_calls_through(self, instrument_data_api_client):
+        bucket = mock.Mock(bucket_name='documents', **{'get_key.return_value': {'size': 1}})
+        timed_bucket = metrics.timed_client('s3', bucket)
+
+        with self.app.app_context():
+            assert timed_bucket.get_key('path') == {'size': 1}
+        assert timed_bucket.bucket_name == 'documents'
+        bucket.get_key.assert_called_once_with('path')
+
+    def test_streamed_templates_are_timed(self, instrument_data_api_client):
+        self._init_metrics()
+
+        with self.app.test_request_context('/'):
+            template = self.app.jinja_env.from_string('{% for i in items %}{{ i }}{% endfor %}')
+            assert ''.join(template.generate(items=[1, 2, 3])) == '123'
+
+        histogram = self._snapshot()['histograms']['dm_template_render_seconds']
+        assert [count for _, _, count in histogram.values()] == [1]
+
+    def test_adds_up_metrics_written_by_other_processes(self, instrument_data_api_client, tmpdir):
+        registry = metrics.Metrics()
+        registry.increment('dm_responses_total', {'endpoint': 'status.liveness', 'status': 200}, 5)
+        tmpdir.join('metrics-1-abcdef12.json').write(json.dumps(registry.snapshot()))
+        self._init_metrics(DM_METRICS_DIR=str(tmpdir))
+
+        self.client.get(self.url_for('status.liveness'))
+        with self.app.app_context():
+            metrics.write_snapshot(self.app)
+        response = self.client.get(self.url_for('status.metrics'))
+
+        assert 'dm_responses_total{endpoint="status.liveness",status="200"} 6' in response.get_data(as_text=True)
+        assert len(tmpdir.listdir('metrics-*.json')) == 2
+
+    def test_deletes_metrics_of_processes_that_have_stopped(self, instrument_data_api_client, tmpdir):
+        registry = metrics.Metrics()
+        registry.increment('dm_responses_total', {'endpoint': 'status.liveness', 'status': 200}, 5)
+        stopped = tmpdir.join('metrics-1-abcdef12.json')
+        stopped.write(json.dumps(registry.snapshot()))
+        stopped.setmtime(time.time() - 600)
+        self._init_metrics(DM_METRICS_DIR=str(tmpdir), DM_METRICS_MAX_AGE=300)
+
+        response = self.client.get(self.url_for('status.metrics'))
+
+        assert 'dm_responses_total{endpoint="status.liveness",status="200"} 5' not in response.get_data(as_text=True)
+        assert not stopped.check()
+
+    def test_new_process_with_the_same_pid_writes_its_own_file(self, instrument_data_api_client, tmpdir):
+        self._init_metrics(DM_METRICS_DIR=str(tmpdir))
+        state = self.app.extensions['metrics']
+        first_id = state.process_id
+        assert state.process_id == first_id
+
+        with mock.patch('app.metrics.os.getpid', return_value=-1):
+            assert state.process_id != first_id
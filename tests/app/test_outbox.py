@@ -0,0 +1,249 @@
+import threading
+
+import mock
+from dmutils.email import EmailError
+
+from app import outbox
+from .helpers import BaseApplicationTest, FakeTimer
+
+MESSAGE = {
+    'to_email_addresses': ['supplier@example.com'],
+    'email_body': '<p>Hello</p>',
+    'subject': 'Hello',
+    'from_email': 'no-reply@example.com',
+    'from_name': 'Digital Marketplace Admin',
+    'tags': ['hello'],
+}
+BATCHED = dict((key, value) for key, value in MESSAGE.items() if key != 'to_email_addresses')
+
+
+class TestOutbox(object):
+
+    def setup(self):
+        self.timer = FakeTimer()
+
+    def _outbox(self, tmpdir):
+        return outbox.Outbox(str(tmpdir.join('outbox.db')), claim_timeout=60, timer=self.timer)
+
+    def test_messages_survive_reopening(self, tmpdir):
+        self._outbox(tmpdir).enqueue(MESSAGE)
+
+        (message_id, attempts, message), = self._outbox(tmpdir).claim_due()
+        assert attempts == 0
+        assert message == MESSAGE
+
+    def test_claimed_messages_are_not_claimed_again(self, tmpdir):
+        box = self._outbox(tmpdir)
+        box.enqueue(MESSAGE)
+
+        assert len(box.claim_due()) == 1
+        assert box.claim_due() == []
+
+    def test_messages_of_dead_processes_are_claimed_again(self, tmpdir):
+        box = self._outbox(tmpdir)
+        box.enqueue(MESSAGE)
+        box.claim_due()
+
+        self.timer.now += 61
+        assert len(box.claim_due()) == 1
+
+    def test_retried_messages_wait_for_delay(self, tmpdir):
+        box = self._outbox(tmpdir)
+        box.enqueue(MESSAGE)
+        (message_id, _, _), = box.claim_due()
+        box.mark_retry(message_id, 'timed out', 30)
+
+        assert box.claim_due() == []
+        self.timer.now += 30
+        (_, attempts, _), = box.claim_due()
+        assert attempts == 1
+
+    def test_failed_messages_can_be_retried(self, tmpdir):
+        box = self._outbox(tmpdir)
+        box.enqueue(MESSAGE)
+        (message_id, _, _), = box.claim_due()
+        box.mark_failed(message_id, 'rejected')
+
+        assert box.counts() == {'failed': 1}
+        assert box.failed()[0][:3] == (message_id, 1, 'rejected')
+        assert box.retry_failed() == 1
+        assert box.counts() == {'pending': 1}
+
+
+class TestBatches(object):
+
+    def setup(self):
+        self.timer = FakeTimer()
+
+    def _outbox(self, tmpdir):
+        return outbox.Outbox(str(tmpdir.join('outbox.db')), timer=self.timer)
+
+    def test_recipients_wait_for_window(self, tmpdir):
+        box = self._outbox(tmpdir)
+        box.add_to_batch(BATCHED, ['one@example.com'])
+        self.timer.now += 10
+        box.add_to_batch(BATCHED, ['two@example.com'])
+
+        assert box.close_batches(window=30, size=10) == 0
+        self.timer.now += 20
+        assert box.close_batches(window=30, size=10) == 2
+        assert box.recipient_counts() == {'queued': 2}
+
+    def test_each_call_is_sent_as_one_email(self, tmpdir):
+        box = self._outbox(tmpdir)
+        box.add_to_batch(BATCHED, ['one@example.com', 'two@example.com'])
+        box.add_to_batch(BATCHED, ['three@example.com'])
+
+        assert box.close_batches(window=0, size=10) == 2
+        assert [message for _, _, message in box.claim_due()] == [
+            dict(BATCHED, to_email_addresses=['one@example.com', 'two@example.com']),
+            dict(BATCHED, to_email_addresses=['three@example.com']),
+        ]
+
+    def test_recipients_are_only_sent_the_email_once(self, tmpdir):
+        box = self._outbox(tmpdir)
+        box.add_to_batch(BATCHED, ['one@example.com', 'two@example.com', 'one@example.com'])
+        box.add_to_batch(BATCHED, ['ONE@example.com'])
+        box.add_to_batch(BATCHED, ['two@example.com', 'three@example.com'])
+
+        assert box.close_batches(window=0, size=10) == 2
+        (first, _, first_message), (_, _, second_message) = box.claim_due()
+        assert first_message['to_email_addresses'] == ['one@example.com', 'two@example.com']
+        assert second_message['to_email_addresses'] == ['three@example.com']
+
+        box.mark_sent(first)
+        assert box.recipient_counts() == {'sent': 5, 'queued': 1}
+
+    def test_full_batches_are_sent_straight_away(self, tmpdir):
+        box = self._outbox(tmpdir)
+        box.add_to_batch(BATCHED, ['one@example.com', 'two@example.com'])
+
+        assert box.close_batches(window=30, size=2) == 1
+        assert box.recipient_counts() == {'queued': 2}
+
+    def test_different_emails_are_batched_separately(self, tmpdir):
+        box = self._outbox(tmpdir)
+        box.add_to_batch(BATCHED, ['one@example.com'])
+        box.add_to_batch(dict(BATCHED, subject='Goodbye'), ['two@example.com'])
+        self.timer.now += 30
+
+        assert box.close_batches(window=30, size=10) == 2
+        assert sorted(message['subject'] for _, _, message in box.claim_due()) == ['Goodbye', 'Hello']
+
+    def test_recipient_status_follows_delivery(self, tmpdir):
+        box = self._outbox(tmpdir)
+        box.add_to_batch(BATCHED, ['one@example.com'])
+        box.add_to_batch(BATCHED, ['two@example.com'])
+        box.close_batches(window=0, size=1)
+        (sent, _, _), (failed, _, _) = box.claim_due()
+
+        box.mark_sent(sent)
+        box.mark_failed(failed, 'rejected')
+        assert box.recipient_counts() == {'sent': 1, 'failed': 1}
+
+        box.retry_failed()
+        assert box.recipient_counts() == {'sent': 1, 'queued': 1}
+
+        self.timer.now += 60
+        box.prune_recipients(retention=30)
+        assert box.recipient_counts() == {'queued': 1}
+
+
+class TestDeliverDue(BaseApplicationTest):
+
+    def setup(self):
+        super(TestDeliverDue, self).setup()
+        self.outbox = mock.Mock()
+
+    def _claimed(self, attempts=0):
+        self.outbox.claim_due.side_effect = [[(1, attempts, MESSAGE)], []]
+
+    @mock.patch('app.outbox.email.send_email')
+    def test_sent_messages_are_removed(self, send_email):
+        self._claimed()
+
+        assert outbox.deliver_due(self.app, self.outbox) == 1
+        send_email.assert_called_once_with(**MESSAGE)
+        self.outbox.mark_sent.assert_called_once_with(1)
+
+    @mock.patch('app.outbox.email.send_email', side_effect=EmailError('timed out'))
+    def test_failures_are_retried_with_backoff(self, send_email):
+        self._claimed(attempts=2)
+
+        assert outbox.deliver_due(self.app, self.outbox) == 0
+        self.outbox.mark_retry.assert_called_once_with(1, 'timed out', 120)
+
+    @mock.patch('app.outbox.email.send_email', side_effect=EmailError('rejected'))
+    def test_gives_up_after_max_attempts(self, send_email):
+        self._claimed(attempts=self.app.config['DM_EMAIL_OUTBOX_MAX_ATTEMPTS'] - 1)
+
+        outbox.deliver_due(self.app, self.outbox)
+        self.outbox.mark_failed.assert_called_once_with(1, 'rejected')
+
+    @mock.patch('app.outbox.email.send_email', side_effect=[ValueError('bad address'), None])
+    def test_unexpected_errors_are_retried_without_stopping_delivery(self, send_email):
+        self.outbox.claim_due.side_effect = [[(1, 0, MESSAGE), (2, 0, MESSAGE)], []]
+
+        assert outbox.deliver_due(self.app, self.outbox) == 1
+        self.outbox.mark_retry.assert_called_once_with(1, 'ValueError: bad address', 30)
+        self.outbox.mark_sent.assert_called_once_with(2)
+
+    def test_retry_delay_is_capped(self):
+        assert outbox.retry_delay(self.app, 20) == self.app.config['DM_EMAIL_OUTBOX_MAX_RETRY_DELAY']
+
+
+class TestSendEmail(BaseApplicationTest):
+
+    @mock.patch('app.outbox.email.send_email')
+    def test_sends_straight_away_without_outbox(self, send_email):
+        with self.app.app_context():
+            outbox.send_email(**MESSAGE)
+
+        send_email.assert_called_once_with(**MESSAGE)
+
+    @mock.patch('app.outbox.email.send_email')
+    def test_queues_email_in_outbox(self, send_email, tmpdir):
+        self.app.config['DM_EMAIL_OUTBOX_PATH'] = str(tmpdir.join('outbox.db'))
+        self.app.config['DM_EMAIL_OUTBOX_WORKER'] = False
+        outbox.init_outbox(self.app)
+
+        with self.app.app_context():
+            outbox.send_email(**MESSAGE)
+
+        assert not send_email.called
+        (_, _, message), = self.app.extensions['email_outbox'].outbox.claim_due()
+        assert message == MESSAGE
+
+    @mock.patch('app.outbox.email.send_email')
+    def test_batched_email_sends_straight_away_without_outbox(self, send_email):
+        with self.app.app_context():
+            outbox.send_batched_email(**MESSAGE)
+
+        send_email.assert_called_once_with(**MESSAGE)
+
+    def test_batched_email_waits_in_outbox(self, tmpdir):
+        self.app.config['DM_EMAIL_OUTBOX_PATH'] = str(tmpdir.join('outbox.db'))
+        self.app.config['DM_EMAIL_OUTBOX_WORKER'] = False
+        outbox.init_outbox(self.app)
+
+        with self.app.app_context():
+            outbox.send_batched_email(**MESSAGE)
+
+        assert self.app.extensions['email_outbox'].outbox.recipient_counts() == {'waiting': 1}
+
+    @mock.patch('app.outbox.email.send_email')
+    def test_worker_delivers_queued_email_as_soon_as_it_starts(self, send_email, tmpdir):
+        self.app.config['DM_EMAIL_OUTBOX_PATH'] = str(tmpdir.join('outbox.db'))
+        self.app.config['DM_EMAIL_OUTBOX_POLL_INTERVAL'] = 60
+        outbox.init_outbox(self.app)
+        state = self.app.extensions['email_outbox']
+        state.outbox.enqueue(MESSAGE)
+        sent = threading.Event()
+        send_email.side_effect = lambda **message: sent.set()
+
+        try:
+            outbox.start_worker(self.app)
+            assert sent.wait(5)
+        finally:
+            state.worker.stop()
+        send_email.assert_called_once_with(**MESSAGE)
@@ -0,0 +1,74 @@
+import mock
+
+from app import profiling
+from .helpers import BaseApplicationTest
+
+
+class TestRotateProfiles(object):
+
+    def test_keeps_newest_profiles(self, tmpdir):
+        for name in ['20161001T100000.000000-a.prof', '20161002T100000.000000-b.prof', '20161003T100000.000000-c.prof']:
+            tmpdir.join(name).write('')
+        tmpdir.join('notes.txt').write('')
+
+        profiling.rotate_profiles(str(tmpdir), 2)
+
+        assert sorted(path.basename for path in tmpdir.listdir()) == [
+            '20161002T100000.000000-b.prof', '20161003T100000.000000-c.prof', 'notes.txt'
+        ]
+
+
+class TestProfiling(BaseApplicationTest):
+
+    def _init_profiling(self, tmpdir, **config):
+        self.app.config['DM_PROFILE_DIR'] = str(tmpdir)
+        self.app.config.update(config)
+        profiling.init_profiling(self.app)
+
+    def test_sampled_request_is_profiled(self, tmpdir):
+        self._init_profiling(tmpdir, DM_PROFILE_SAMPLE_RATE=1)
+
+        self.client.get(self.url_for('status.liveness'), headers={'X-Amz-Cf-Id': 'abc/123=='}, buffered=True)
+
+        profiles = [path.basename for path in tmpdir.listdir()]
+        assert len(profiles) == 1
+        assert profiles[0].endswith('-status.liveness-abc_123__.prof')
+
+    def test_profile_is_written_once_the_response_has_been_sent(self, tmpdir):
+        self._init_profiling(tmpdir, DM_PROFILE_SAMPLE_RATE=1)
+
+        response = self.client.get(self.url_for('status.liveness'))
+        assert tmpdir.listdir() == []
+
+        response.close()
+        assert len(tmpdir.listdir()) == 1
+
+    @mock.patch('app.profiling.random.randrange')
+    def test_requests_not_sampled_are_not_profiled(self, randrange, tmpdir):
+        randrange.return_value = 3
+        self._init_profiling(tmpdir, DM_PROFILE_SAMPLE_RATE=10)
+
+        self.client.get(self.url_for('status.liveness'), buffered=True)
+
+        randrange.assert_called_once_with(10)
+        assert tmpdir.listdir() == []
+
+    def test_request_with_header_from_allowed_address_is_profiled(self, tmpdir):
+        self._init_profiling(tmpdir, DM_PROFILE_ALLOWED_IPS=['10.0.0.1'])
+
+        self.client.get(
+            self.url_for('status.liveness'), headers={'X-DM-Profile': '1'}, environ_base={'REMOTE_ADDR': '10.0.0.1'},
+            buffered=True
+        )
+
+        assert len(tmpdir.listdir()) == 1
+
+    def test_request_with_header_from_other_address_is_not_profiled(self, tmpdir):
+        self._init_profiling(tmpdir, DM_PROFILE_ALLOWED_IPS=['10.0.0.1'])
+
+        self.client.get(
+            self.url_for('status.liveness'), headers={'X-DM-Profile': '1'}, environ_base={'REMOTE_ADDR': '10.0.0.2'},
+            buffered=True
+        )
+
+        assert tmpdir.listdir() == []
@@ -0,0 +1,153 @@
+import mock
+import pytest
+from flask import session
+
+from app.cache import TTLCache
+from app.sessions import (
+    FileSystemSessionStore, KeyValueSessionStore, LocalKeyValueClient, SQLiteSessionStore, ServerSideSessionInterface,
+    make_session_store, regenerate_session
+)
+from .helpers import BaseApplicationTest, FakeTimer
+
+
+@pytest.fixture(params=['sqlite', 'filesystem', 'kv'])
+def store_and_timer(request, tmpdir):
+    timer = FakeTimer()
+    if request.param == 'sqlite':
+        return SQLiteSessionStore(str(tmpdir.join('sessions.db')), timer=timer), timer
+    if request.param == 'filesystem':
+        return FileSystemSessionStore(str(tmpdir.join('sessions')), timer=timer), timer
+    return KeyValueSessionStore(LocalKeyValueClient()), None
+
+
+def test_store_sets_gets_and_deletes(store_and_timer):
+    store, _ = store_and_timer
+    store.set('abc', 'value', 60)
+
+    assert store.get('abc') == 'value'
+    store.delete('abc')
+    assert store.get('abc') is None
+
+
+def test_store_expires_sessions(store_and_timer):
+    store, timer = store_and_timer
+    if timer is None:
+        pytest.skip('expiry is left to the key-value store')
+    store.set('abc', 'value', 60)
+
+    timer.now += 60
+    assert store.get('abc') is None
+
+
+def test_filesystem_store_deletes_abandoned_sessions(tmpdir):
+    timer = FakeTimer()
+    store = FileSystemSessionStore(str(tmpdir), timer=timer)
+    store.PRUNE_INTERVAL = 2
+    abandoned, current = 'a' * 64, 'b' * 64
+
+    store.set(abandoned, 'value', 60)
+    timer.now += 60
+    store.set(current, 'value', 60)
+
+    assert [path.basename for path in tmpdir.listdir()] == [current]
+
+
+class TestMakeSessionStore(BaseApplicationTest):
+
+    @mock.patch('app.sessions.redis', None)
+    def test_kv_store_needs_redis_for_a_url(self):
+        self.app.config.update(DM_SESSION_STORE='kv', DM_SESSION_KV_URL='redis://localhost:6379/0')
+
+        with pytest.raises(RuntimeError):
+            make_session_store(self.app)
+
+    def test_kv_store_is_in_process_without_a_url(self):
+        self.app.config.update(DM_SESSION_STORE='kv', DM_SESSION_KV_URL=None)
+
+        assert isinstance(make_session_store(self.app).client, LocalKeyValueClient)
+
+
+class TestServerSideSessions(BaseApplicationTest):
+
+    def setup(self):
+        super(TestServerSideSessions, self).setup()
+        self.timer = FakeTimer()
+        self.store = TTLCache(100)
+        self.app.session_interface = ServerSideSessionInterface(self.store, timer=self.timer)
+
+        @self.app.route('/session/set/<value>')
+        def set_value(value):
+            session['company_name'] = value
+            return ''
+
+        @self.app.route('/session/get')
+        def get_value():
+            return session.get('company_name', '')
+
+        @self.app.route('/session/clear')
+        def clear():
+            session.clear()
+            return ''
+
+        @self.app.route('/session/regenerate')
+        def regenerate():
+            regenerate_session()
+            return ''
+
+        @self.app.route('/session/user/<user_id>')
+        def set_user(user_id):
+            session['user_id'] = user_id
+            return ''
+
+    def _session_cookie(self, res):
+        cookies = [header for header in res.headers.getlist('Set-Cookie') if header.startswith('dm_session=')]
+        return cookies[0].split(';')[0].split('=', 1)[1] if cookies else None
+
+    def test_cookie_holds_only_session_id(self):
+        res = self.client.get('/session/set/Example')
+
+        session_id = self._session_cookie(res)
+        assert len(session_id) == 64
+        assert 'Example' not in res.headers['Set-Cookie']
+        assert self.store.get(session_id) is not None
+        assert self.client.get('/session/get').get_data(as_text=True) == 'Example'
+
+    def test_unchanged_sessions_are_not_written(self):
+        self.client.get('/session/set/Example')
+        res = self.client.get('/session/get')
+
+        assert self._session_cookie(res) is None
+
+    def test_sessions_are_refreshed_after_half_their_lifetime(self):
+        self.client.get('/session/set/Example')
+        self.timer.now += self.app.config['PERMANENT_SESSION_LIFETIME'] / 2 + 1
+
+        assert self._session_cookie(self.client.get('/session/get')) is not None
+
+    def test_cleared_sessions_are_deleted(self):
+        session_id = self._session_cookie(self.client.get('/session/set/Example'))
+        res = self.client.get('/session/clear')
+
+        assert self._session_cookie(res) == ''
+        assert self.store.get(session_id) is None
+
+    def test_unknown_session_ids_are_replaced(self):
+        self.client.set_cookie('localhost', 'dm_session', 'a' * 64)
+        res = self.client.get('/session/set/Example')
+
+        assert self._session_cookie(res) != 'a' * 64
+
+    def test_regenerated_session_gets_new_id(self):
+        session_id = self._session_cookie(self.client.get('/session/set/Example'))
+        new_session_id = self._session_cookie(self.client.get('/session/regenerate'))
+
+        assert new_session_id not in (None, session_id)
+        assert self.store.get(session_id) is None
+        assert self.client.get('/session/get').get_data(as_text=True) == 'Example'
+
+    def test_logging_in_gets_new_session_id(self):
+        session_id = self._session_cookie(self.client.get('/session/set/Example'))
+        new_session_id = self._session_cookie(self.client.get('/session/user/123'))
+
+        assert new_session_id not in (None, session_id)
+        assert self.store.get(session_id) is None
@@ -0,0 +1,223 @@
+import os
+import time
+
+import jinja2
+import mock
+import pytest
+from flask import get_flashed_messages, session
+
+from app.cache import TTLCache
+from app.templating import (
+    SharedFileSystemBytecodeCache, FragmentCacheExtension, init_bytecode_cache, compile_templates,
+    init_precompiled_templates, warm_up_templates, stream_template, stream_template_with_csrf, _buffered,
+    page_etag, conditional_response
+)
+from .helpers import BaseApplicationTest
+
+
+def _environment(cache_dir):
+    return jinja2.Environment(
+        loader=jinja2.DictLoader({'page.html': 'Hello {{ name }}'}),
+        bytecode_cache=SharedFileSystemBytecodeCache(cache_dir)
+    )
+
+
+class TestSharedFileSystemBytecodeCache(object):
+
+    def test_creates_cache_directory(self, tmpdir):
+        cache_dir = str(tmpdir.join('jinja', 'cache'))
+        SharedFileSystemBytecodeCache(cache_dir)
+
+        assert os.path.isdir(cache_dir)
+
+    def test_compiled_templates_are_shared_between_environments(self, tmpdir):
+        cache_dir = str(tmpdir)
+        assert _environment(cache_dir).get_template('page.html').render(name='one') == 'Hello one'
+
+        cache_files = os.listdir(cache_dir)
+        assert len(cache_files) == 1
+        assert cache_files[0].startswith('__jinja2_')
+
+        assert _environment(cache_dir).get_template('page.html').render(name='two') == 'Hello two'
+        assert os.listdir(cache_dir) == cache_files
+
+
+class TestInitBytecodeCache(BaseApplicationTest):
+
+    def test_no_cache_when_disabled(self):
+        assert self.app.jinja_env.bytecode_cache is None
+
+    def test_cache_dir_is_configurable(self, tmpdir):
+        self.app.config['DM_TEMPLATE_BYTECODE_CACHE'] = True
+        self.app.config['DM_TEMPLATE_BYTECODE_CACHE_DIR'] = str(tmpdir)
+        init_bytecode_cache(self.app)
+
+        assert isinstance(self.app.jinja_env.bytecode_cache, SharedFileSystemBytecodeCache)
+        assert self.app.jinja_env.bytecode_cache.directory == str(tmpdir)
+
+
+class TestFragmentCacheExtension(object):
+
+    def setup(self):
+        self.environment = jinja2.Environment(extensions=[FragmentCacheExtension], autoescape=True)
+        self.environment.fragment_cache = TTLCache(10, 60)
+        self.renders = []
+
+    def render(self, source, **context):
+        def count():
+            self.renders.append(1)
+            return len(self.renders)
+
+        return self.environment.from_string(source).render(count=count, **context)
+
+    def test_block_is_rendered_once_per_key(self):
+        source = '{% cache "block", slug %}{{ count() }} {{ slug }}{% endcache %}'
+
+        assert self.render(source, slug='g-cloud-8') == '1 g-cloud-8'
+        assert self.render(source, slug='g-cloud-8') == '1 g-cloud-8'
+        assert self.render(source, slug='g-cloud-7') == '2 g-cloud-7'
+
+    def test_keys_can_be_unhashable(self):
+        source = '{% cache "block", lots %}{{ count() }}{% endcache %}'
+
+        assert self.render(source, lots=[{'slug': 'a'}]) == '1'
+        assert self.render(source, lots=[{'slug': 'a'}]) == '1'
+        assert self.render(source, lots=[{'slug': 'b'}]) == '2'
+
+    def test_ttl_overrides_default(self):
+        self.render('{% cache "block", ttl=5 %}{{ count() }}{% endcache %}')
+
+        (value, expires), = self.environment.fragment_cache._entries.values()
+        assert expires <= time.time() + 5
+
+    def test_cached_output_stays_escaped(self):
+        source = '{% cache "block" %}<b>{{ name }}</b>{% endcache %}'
+
+        assert self.render(source, name='<i>') == '<b>&lt;i&gt;</b>'
+        assert self.render(source, name='<i>') == '<b>&lt;i&gt;</b>'
+
+
+class TestPrecompiledTemplates(BaseApplicationTest):
+
+    def test_precompiled_templates_are_loaded_from_archive(self, tmpdir):
+        archive = str(tmpdir.join('compiled_templates.zip'))
+        compile_templates(self.app, archive)
+
+        self.app.config['DM_PRECOMPILED_TEMPLATES'] = archive
+        init_precompiled_templates(self.app)
+
+        assert isinstance(self.app.jinja_env.loader, jinja2.ChoiceLoader)
+        assert self.app.jinja_env.get_template('errors/404.html').filename.startswith(archive)
+
+    def test_missing_archive_keeps_template_folders(self, tmpdir):
+        loader = self.app.jinja_env.loader
+        self.app.config['DM_PRECOMPILED_TEMPLATES'] = str(tmpdir.join('missing.zip'))
+        init_precompiled_templates(self.app)
+
+        assert self.app.jinja_env.loader is loader
+
+    def test_compile_fails_on_template_syntax_error(self, tmpdir):
+        tmpdir.join('broken.html').write('{% if %}')
+        self.app.jinja_loader = jinja2.FileSystemLoader(str(tmpdir))
+
+        with pytest.raises(jinja2.TemplateSyntaxError):
+            compile_templates(self.app, str(tmpdir.join('compiled_templates.zip')))
+
+
+class TestWarmUpTemplates(BaseApplicationTest):
+
+    def test_warm_up_loads_every_template_and_macro_module(self):
+        with mock.patch.object(self.app.jinja_env, 'get_template', wraps=self.app.jinja_env.get_template) as get:
+            warm_up_templates(self.app)
+
+        loaded = set(call[0][0] for call in get.call_args_list)
+        assert 'frameworks/dashboard.html' in loaded
+        assert 'macros/forms.html' in loaded
+        assert 'macros/toolkit_forms.html' in loaded
+
+
+class TestStreamTemplate(BaseApplicationTest):
+
+    def test_buffered_joins_small_chunks(self):
+        assert list(_buffered(['ab', 'c', 'def', 'g'], 3)) == ['abc', 'def', 'g']
+
+    def test_stream_template_streams_rendered_page(self):
+        with self.app.test_request_context('/'):
+            response = stream_template('errors/404.html', status_code=404)
+
+            assert response.is_streamed
+            assert response.status_code == 404
+            assert 'Page could not be found' in response.get_data(as_text=True)
+
+    def test_stream_template_takes_flashed_messages_out_of_session(self):
+        with self.app.test_request_context('/'):
+            session['_flashes'] = [('service_deleted', {'service_name': 'Cloud'})]
+            stream_template('errors/404.html')
+
+            assert '_flashes' not in session
+            assert get_flashed_messages(with_categories=True) == [('service_deleted', {'service_name': 'Cloud'})]
+
+    def test_stream_template_with_csrf_is_private(self):
+        with self.app.test_request_context('/'):
+            response = stream_template_with_csrf('errors/404.html')
+
+            assert response.cache_control.private
+            assert response.status_code == 200
+
+
+class TestConditionalResponse(BaseApplicationTest):
+
+    def test_etag_depends_on_inputs_and_flashed_messages(self):
+        with self.app.test_request_context('/'):
+            etag = page_etag([{'id': 1}])
+
+            assert page_etag([{'id': 1}]) == etag
+            assert page_etag([{'id': 2}]) != etag
+
+            session['_flashes'] = [('success', 'Saved')]
+            assert page_etag([{'id': 1}]) != etag
+
+    def test_csrf_pages_change_etag_when_token_window_ends(self):
+        with self.app.test_request_context('/'):
+            with mock.patch('app.templating.time.time', return_value=0):
+                etag = page_etag([], csrf=True)
+            with mock.patch('app.templating.time.time', return_value=self.app.config['CSRF_TIME_LIMIT']):
+                assert page_etag([], csrf=True) != etag
+
+    def test_no_etag_when_disabled(self):
+        self.app.config['DM_CONDITIONAL_PAGES'] = False
+        with self.app.test_request_context('/'):
+            assert page_etag([]) is None
+            assert conditional_response(None, lambda: 'page') == 'page'
+
+    def test_matching_etag_is_not_rendered(self):
+        render = mock.Mock(return_value='page')
+        with self.app.test_request_context('/', headers={'If-None-Match': '"abc"'}):
+            response = conditional_response('abc', render)
+
+        assert response.status_code == 304
+        assert response.headers['ETag'] == 'W/"abc"'
+        assert not render.called
+
+    def test_weak_etag_matches(self):
+        render = mock.Mock(return_value='page')
+        with self.app.test_request_context('/', headers={'If-None-Match': 'W/"abc"'}):
+            response = conditional_response('abc', render)
+
+        assert response.status_code == 304
+        assert not render.called
+
+    def test_other_etag_is_rendered(self):
+        with self.app.test_request_context('/', headers={'If-None-Match': '"xyz"'}):
+            response = conditional_response('abc', lambda: 'page')
+
+        assert response.status_code == 200
+        assert response.get_data(as_text=True) == 'page'
+        assert response.headers['ETag'] == 'W/"abc"'
+        assert response.cache_control.private
+
+    def test_post_is_always_rendered(self):
+        with self.app.test_request_context('/', method='POST', headers={'If-None-Match': '"abc"'}):
+            response = conditional_response('abc', lambda: 'page')
+
+        assert response.status_code == 200
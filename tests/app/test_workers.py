@@ -0,0 +1,29 @@
+import threading
+
+from app.workers import Worker, WorkerHandle
+from .helpers import BaseApplicationTest
+
+
+class CountingWorker(Worker):
+
+    def __init__(self, app):
+        super(CountingWorker, self).__init__(app, 'counting', 60)
+        self.worked = threading.Event()
+
+    def work(self):
+        self.worked.set()
+
+
+class TestWorkerHandle(BaseApplicationTest):
+
+    def test_starts_one_worker_until_stopped(self):
+        handle = WorkerHandle(lambda: CountingWorker(self.app))
+
+        worker = handle.start()
+        assert handle.start() is worker
+        assert worker.worked.wait(5)
+
+        handle.stop()
+        assert not worker.is_alive()
+        assert handle.start() is not worker
+        handle.stop()
@@ -0,0 +1,48 @@
+import mock
+
+from tests.benchmarks.validation import compare, generate_declarations, main, FRAMEWORKS
+
+
+def test_generate_declarations():
+    for framework_slug in FRAMEWORKS:
+        cases = generate_declarations(framework_slug)
+
+        assert sorted(cases) == ['empty', 'full', 'partial', 'pathological']
+        assert cases['empty'] == {}
+        assert len(cases['partial']) < len(cases['full'])
+
+
+def test_compare_reports_benchmarks_over_threshold():
+    baseline = {'a': {'seconds': 1.0, 'peak_bytes': None}, 'b': {'seconds': 1.0, 'peak_bytes': None}}
+    results = {
+        'a': {'seconds': 1.2, 'peak_bytes': 100},
+        'b': {'seconds': 1.3, 'peak_bytes': 100},
+        'c': {'seconds': 5.0, 'peak_bytes': 100},
+    }
+
+    assert compare(results, baseline, 1.25) == [('b', 'seconds', 1.0, 1.3)]
+
+
+def test_compare_reports_benchmarks_allocating_more_than_threshold():
+    baseline = {'a': {'seconds': 1.0, 'peak_bytes': 1000}, 'b': {'seconds': 1.0, 'peak_bytes': 1000}}
+    results = {'a': {'seconds': 1.0, 'peak_bytes': 1050}, 'b': {'seconds': 1.0, 'peak_bytes': 1200}}
+
+    assert compare(results, baseline, 1.25, memory_threshold=1.1) == [('b', 'peak_bytes', 1000, 1200)]
+
+
+@mock.patch('tests.benchmarks.validation.run')
+def test_main_fails_without_baseline(run, tmpdir):
+    run.return_value = {'a': {'seconds': 1.0, 'peak_bytes': None}}
+
+    assert main(['--baseline', str(tmpdir.join('missing.json'))]) == 2
+
+
+@mock.patch('tests.benchmarks.validation.run')
+def test_main_compares_against_saved_baseline(run, tmpdir):
+    baseline = str(tmpdir.join('baseline.json'))
+    run.return_value = {'a': {'seconds': 1.0, 'peak_bytes': None}}
+    assert main(['--baseline', baseline, '--save-baseline']) == 0
+    assert main(['--baseline', baseline]) == 0
+
+    run.return_value = {'a': {'seconds': 2.0, 'peak_bytes': None}}
+    assert main(['--baseline', baseline]) == 1
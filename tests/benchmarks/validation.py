@@ -0,0 +1,196 @@
+"""
+Benchmarks for the declaration validators.
+
+Generates synthetic G-Cloud 7, DOS and G-Cloud 8 declarations from the declaration manifests, times the
+validator entry points used by the declaration pages and the dashboard, records allocations (where
+tracemalloc is available) and compares the results against the committed baseline.
+
+Run from the repository root:
+$ python -m tests.benchmarks.validation                  # compare against the baseline
+$ python -m tests.benchmarks.validation --save-baseline  # record a new baseline
+
+Timings are machine dependent, so only record a baseline on the machine that runs the comparison. Every CI build
+records one as the validation_baseline.json artifact, which is the one to commit. Comparing without a baseline
+fails, so a missing baseline can't pass for a run without regressions.
+
+Peak allocations are compared too, when both the baseline and the run recorded them.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from app.main import content_loader
+from app.main.helpers.validation import VALIDATORS, compile_validation_rules, get_validation_rules
+
+FRAMEWORKS = ['g-cloud-7', 'digital-outcomes-and-specialists', 'g-cloud-8']
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'validation_baseline.json')
+DEFAULT_THRESHOLD = 1.25
+# Allocations don't depend on how busy the machine is, so they are held to a tighter threshold than timings
+DEFAULT_MEMORY_THRESHOLD = 1.1
+PATHOLOGICAL_ANSWER_LENGTH = 5000
+
+
+def _option_value(option):
+    return option.get('value', option.get('label'))
+
+
+def _answer_for(question_id, question, validator_cls, length=None):
+    question_type = question.get('type')
+    options = question.get('options') or []
+    if question_type == 'boolean':
+        return True
+    if question_type == 'radios' and options:
+        return _option_value(options[0])
+    if question_type == 'checkboxes' and options:
+        return [_option_value(options[0])]
+    if question_type == 'list':
+        return ['a' * (length or 1)]
+
+    if length:
+        return 'a' * length
+    if question_id in (validator_cls.email_validation_fields or []):
+        return 'supplier@example.com'
+    number_string_fields = dict(validator_cls.number_string_fields or [])
+    if question_id in number_string_fields:
+        return '1' * number_string_fields[question_id]
+    return 'a'
+
+
+def generate_declarations(framework_slug):
+    """Returns {case name: answers} for a framework's declaration manifest."""
+    content = content_loader.get_manifest(framework_slug, 'declaration')
+    validator_cls = VALIDATORS[framework_slug]
+    question_ids = [question_id for section in content for question_id in section.get_question_ids()]
+    questions = [content.get_question(question_id) for question_id in question_ids]
+
+    full = dict(
+        (question_id, _answer_for(question_id, question, validator_cls))
+        for question_id, question in zip(question_ids, questions)
+    )
+    return {
+        'empty': {},
+        'partial': dict((question_id, full[question_id]) for question_id in question_ids[:len(question_ids) // 2]),
+        'full': dict(full, status='complete'),
+        'pathological': dict(
+            (question_id, _answer_for(question_id, question, validator_cls, PATHOLOGICAL_ANSWER_LENGTH))
+            for question_id, question in zip(question_ids, questions)
+        ),
+    }
+
+
+def _operations(framework_slug, answers):
+    content = content_loader.get_manifest(framework_slug, 'declaration')
+    validator_cls = VALIDATORS[framework_slug]
+    rules = get_validation_rules(validator_cls, content)
+    last_section = content.sections[-1]
+
+    return {
+        'get_error_messages': lambda: validator_cls(content, answers, rules=rules).get_error_messages(),
+        'get_error_messages_for_page': lambda: validator_cls(
+            content, answers, rules=rules
+        ).get_error_messages_for_page(last_section),
+        'get_required_fields': lambda: validator_cls(content, answers, rules=rules).get_required_fields(),
+    }
+
+
+def _measure(operation, repeat, number):
+    seconds = min(timeit.repeat(operation, repeat=repeat, number=number)) / number
+    peak_bytes = None
+    if tracemalloc is not None:
+        tracemalloc.start()
+        operation()
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {'seconds': seconds, 'peak_bytes': peak_bytes}
+
+
+def run(repeat=5, number=200):
+    results = {}
+    for framework_slug in FRAMEWORKS:
+        content = content_loader.get_manifest(framework_slug, 'declaration')
+        results['{}/compile_validation_rules'.format(framework_slug)] = _measure(
+            lambda: compile_validation_rules(VALIDATORS[framework_slug], content), repeat, max(number // 10, 1)
+        )
+        for case, answers in sorted(generate_declarations(framework_slug).items()):
+            for name, operation in sorted(_operations(framework_slug, answers).items()):
+                results['{}/{}/{}'.format(framework_slug, case, name)] = _measure(operation, repeat, number)
+
+    return results
+
+
+def compare(results, baseline, threshold, memory_threshold=DEFAULT_MEMORY_THRESHOLD):
+    """
+    Returns a list of (benchmark, measure, baseline value, value) for benchmarks that are slower than `threshold`
+    times, or allocate more than `memory_threshold` times, their baseline.
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        if result['seconds'] > baseline[name]['seconds'] * threshold:
+            regressions.append((name, 'seconds', baseline[name]['seconds'], result['seconds']))
+
+        baseline_bytes, peak_bytes = baseline[name].get('peak_bytes'), result['peak_bytes']
+        if None not in (baseline_bytes, peak_bytes) and peak_bytes > baseline_bytes * memory_threshold:
+            regressions.append((name, 'peak_bytes', baseline_bytes, peak_bytes))
+    return regressions
+
+
+def _format_measure(measure, value):
+    if measure == 'seconds':
+        return '{:.1f}us'.format(value * 1e6)
+    return '{}B'.format(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the declaration validators.')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='record the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='fail if a benchmark is this many times slower than the baseline')
+    parser.add_argument('--memory-threshold', type=float, default=DEFAULT_MEMORY_THRESHOLD,
+                        help='fail if a benchmark allocates this many times more than the baseline at its peak')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    results = run(args.repeat, args.number)
+    for name, result in sorted(results.items()):
+        print('{:<90} {:>10.1f}us {:>10}'.format(
+            name, result['seconds'] * 1e6,
+            '{}B'.format(result['peak_bytes']) if result['peak_bytes'] is not None else '-'
+        ))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+        print('Baseline written to {}'.format(args.baseline))
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('No baseline at {}; run with --save-baseline to record one'.format(args.baseline), file=sys.stderr)
+        return 2
+
+    with open(args.baseline) as baseline_file:
+        regressions = compare(results, json.load(baseline_file), args.threshold, args.memory_threshold)
+
+    for name, measure, baseline_value, value in regressions:
+        print('REGRESSION {} {}: {} -> {}'.format(
+            name, measure, _format_measure(measure, baseline_value), _format_measure(measure, value)
+        ))
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())